@@ -0,0 +1,65 @@
+from collections import deque
+
+"""
+  Aho-Corasick automaton: finds every occurrence of many patterns in one pass over a text,
+  in time linear in the text length plus the number of matches.
+"""
+
+class AhoCorasick:
+  def __init__(self, patterns: list[str]) -> None:
+    self.patterns = patterns
+    # per state: transitions, failure link and the patterns ending here (own and via failure links)
+    self.goto = [{}]
+    self.fail = [0]
+    self.output = [[]]
+    for index, pattern in enumerate(patterns):
+      if not pattern:
+        continue
+      state = 0
+      for char in pattern:
+        next_state = self.goto[state].get(char)
+        if next_state is None:
+          next_state = len(self.goto)
+          self.goto[state][char] = next_state
+          self.goto.append({})
+          self.fail.append(0)
+          self.output.append([])
+        state = next_state
+      self.output[state].append(index)
+    queue = deque(self.goto[0].values())
+    while queue:
+      state = queue.popleft()
+      for char, next_state in self.goto[state].items():
+        queue.append(next_state)
+        fallback = self.fail[state]
+        while fallback and char not in self.goto[fallback]:
+          fallback = self.fail[fallback]
+        self.fail[next_state] = self.goto[fallback].get(char, 0)
+        self.output[next_state] = self.output[next_state] + self.output[self.fail[next_state]]
+
+  def iter(self, text: str):
+    """ Yields (end, pattern index) for every occurrence, <end> is the index past its last char """
+    goto = self.goto
+    fail = self.fail
+    output = self.output
+    state = 0
+    for position, char in enumerate(text):
+      while state and char not in goto[state]:
+        state = fail[state]
+      state = goto[state].get(char, 0)
+      for index in output[state]:
+        yield position + 1, index
+
+  def counts(self, text: str) -> list[int]:
+    """
+      Non-overlapping occurrences of each pattern, as len(re.findall(re.escape(pattern), text)).
+      An empty pattern occurs len(text) + 1 times.
+    """
+    counts = [0 if pattern else len(text) + 1 for pattern in self.patterns]
+    # matches of the same pattern can't overlap, the next one has to start after the last one ended
+    last_end = [0] * len(self.patterns)
+    for end, index in self.iter(text):
+      if end - len(self.patterns[index]) >= last_end[index]:
+        counts[index] += 1
+        last_end[index] = end
+    return counts
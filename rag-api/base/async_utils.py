@@ -8,4 +8,18 @@ def async_wrapper(func):
       loop = asyncio.get_event_loop()
     pfunc = partial(func, *args, **kwargs)
     return await loop.run_in_executor(executor, pfunc)
-  return run
\ No newline at end of file
+  return run
+
+async def gather_limited(aws, limit: int, return_exceptions: bool = False) -> list:
+  """ Same as asyncio.gather but awaits at most <limit> awaitables at a time. Results keep the input order. """
+  semaphore = asyncio.Semaphore(limit)
+  async def run(aw):
+    async with semaphore:
+      return await aw
+  return await asyncio.gather(*[run(aw) for aw in aws], return_exceptions=return_exceptions)
+
+async def shared_result(tasks: dict, key, func, *args):
+  """ Awaits func(*args) only once per <key>, concurrent callers with the same key share the same task. """
+  if key not in tasks:
+    tasks[key] = asyncio.ensure_future(func(*args))
+  return await tasks[key]
@@ -0,0 +1,277 @@
+import os
+import re
+import time
+import uuid
+import sqlite3
+import threading
+from base.logger import log
+try:
+  import zstandard
+except ImportError:
+  zstandard = None
+
+"""
+  Storage backends for the responses cached by base/request.py. Keys are the cache file
+  names used since the beginning ("<md5 of url>.<extension>") so entries can be moved
+  between backends. Stores are synchronous, async callers run them in a thread.
+"""
+CACHE_KEY_PATTERN = re.compile(r'^[0-9a-f]{32}\.\w+$')
+SQLITE_FILE_NAME = 'cache.sqlite3'
+# seconds between accessed_at updates of the same entry, keeps reads from turning into writes
+ACCESS_RESOLUTION = 60
+# size cap is checked every N writes
+SIZE_CHECK_INTERVAL = 100
+COMPRESS_MIN_SIZE = 512
+
+
+class FileCacheStore:
+  """ One file per key inside <directory>. No expiry index, prune() walks the directory. """
+  def __init__(self, directory: str) -> None:
+    self.directory = directory
+    os.makedirs(directory, exist_ok=True)
+
+  def _path(self, key: str) -> str:
+    return os.path.join(self.directory, key)
+
+  def get(self, key: str, max_age: float) -> tuple[str, float]|None:
+    """ Returns (value, stored_at) when <key> exists and is younger than <max_age> seconds """
+    path = self._path(key)
+    try:
+      stored_at = os.path.getmtime(path)
+      if time.time() - stored_at >= max_age:
+        return None
+      with open(path, 'r', encoding='utf-8') as file:
+        return file.read(), stored_at
+    except FileNotFoundError:
+      return None
+
+  def set(self, key: str, value: str, ttl: float = None, stored_at: float = None) -> None:
+    # write to a temporary file and rename it, readers never see a partially written file
+    path = self._path(key)
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    try:
+      with open(tmp_path, 'w', encoding='utf-8') as file:
+        file.write(value)
+      if stored_at is not None:
+        os.utime(tmp_path, (stored_at, stored_at))
+      os.replace(tmp_path, path)
+    except Exception:
+      if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+      raise
+
+  def delete(self, key: str) -> None:
+    try:
+      os.remove(self._path(key))
+    except FileNotFoundError:
+      pass
+
+  def items(self):
+    """ Yields (key, value, stored_at) for every cached entry """
+    for entry in os.scandir(self.directory):
+      if entry.is_file() and CACHE_KEY_PATTERN.match(entry.name):
+        with open(entry.path, 'r', encoding='utf-8') as file:
+          yield entry.name, file.read(), entry.stat().st_mtime
+
+  def stats(self) -> dict:
+    entries = 0
+    size = 0
+    for entry in os.scandir(self.directory):
+      if entry.is_file() and CACHE_KEY_PATTERN.match(entry.name):
+        entries += 1
+        size += entry.stat().st_size
+    return { 'backend': 'files', 'directory': self.directory, 'entries': entries, 'size': size }
+
+  def prune(self, max_age: float = None, max_bytes: int = None) -> int:
+    """ Removes files older than <max_age> seconds, then the least recently modified over <max_bytes> """
+    now = time.time()
+    files = []
+    removed = 0
+    for entry in os.scandir(self.directory):
+      if entry.is_file() and CACHE_KEY_PATTERN.match(entry.name):
+        stat = entry.stat()
+        if max_age is not None and now - stat.st_mtime >= max_age:
+          os.remove(entry.path)
+          removed += 1
+        else:
+          files.append((stat.st_mtime, stat.st_size, entry.path))
+    if max_bytes is not None:
+      files.sort()
+      size = sum(file[1] for file in files)
+      for _, file_size, path in files:
+        if size <= max_bytes:
+          break
+        os.remove(path)
+        size -= file_size
+        removed += 1
+    return removed
+
+
+class SQLiteCacheStore:
+  """
+    Single SQLite database in WAL mode. Entries have an expiry index used by prune() and an
+    access index used to evict the least recently used entries once the database grows over
+    <max_bytes>. Values are compressed with zstd when <compress> is set and zstandard is installed.
+  """
+  def __init__(self, path: str, max_bytes: int = None, compress: bool = False) -> None:
+    self.path = path
+    self.max_bytes = max_bytes
+    self.compress = compress and zstandard is not None
+    self._local = threading.local()
+    self._writes = 0
+    self._lock = threading.Lock()
+    if compress and zstandard is None:
+      log('zstandard is not installed, cache values will be stored uncompressed')
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with self._connection() as conn:
+      conn.execute("""
+        CREATE TABLE IF NOT EXISTS cache (
+          key TEXT PRIMARY KEY,
+          value BLOB NOT NULL,
+          compressed INTEGER NOT NULL DEFAULT 0,
+          size INTEGER NOT NULL,
+          created_at REAL NOT NULL,
+          expires_at REAL NOT NULL,
+          accessed_at REAL NOT NULL
+        )
+      """)
+      conn.execute("CREATE INDEX IF NOT EXISTS cache_expires_at ON cache (expires_at)")
+      conn.execute("CREATE INDEX IF NOT EXISTS cache_accessed_at ON cache (accessed_at)")
+
+  def _connection(self) -> sqlite3.Connection:
+    # sqlite connections can't be shared between threads, keep one per thread
+    conn = getattr(self._local, 'conn', None)
+    if conn is None:
+      conn = sqlite3.connect(self.path, timeout=30)
+      conn.execute("PRAGMA journal_mode=WAL")
+      conn.execute("PRAGMA synchronous=NORMAL")
+      self._local.conn = conn
+    return conn
+
+  def _encode(self, value: str) -> tuple[bytes, int]:
+    data = value.encode('utf-8')
+    if self.compress and len(data) >= COMPRESS_MIN_SIZE:
+      return zstandard.ZstdCompressor().compress(data), 1
+    return data, 0
+
+  def _decode(self, data: bytes, compressed: int) -> str:
+    if compressed:
+      if zstandard is None:
+        raise RuntimeError('Cache entry is zstd compressed but zstandard is not installed')
+      data = zstandard.ZstdDecompressor().decompress(data)
+    return data.decode('utf-8')
+
+  def get(self, key: str, max_age: float) -> tuple[str, float]|None:
+    """ Returns (value, stored_at) when <key> exists and is younger than <max_age> seconds """
+    conn = self._connection()
+    row = conn.execute("SELECT value, compressed, created_at, accessed_at FROM cache WHERE key = ?", (key,)).fetchone()
+    if row is None:
+      return None
+    value, compressed, created_at, accessed_at = row
+    now = time.time()
+    if now - created_at >= max_age:
+      return None
+    if now - accessed_at >= ACCESS_RESOLUTION:
+      with conn:
+        conn.execute("UPDATE cache SET accessed_at = ? WHERE key = ?", (now, key))
+    return self._decode(value, compressed), created_at
+
+  def set(self, key: str, value: str, ttl: float = None, stored_at: float = None) -> None:
+    now = time.time()
+    stored_at = stored_at or now
+    expires_at = stored_at + ttl if ttl is not None else float('inf')
+    data, compressed = self._encode(value)
+    conn = self._connection()
+    with conn:
+      conn.execute(
+        "INSERT OR REPLACE INTO cache (key, value, compressed, size, created_at, expires_at, accessed_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+        (key, data, compressed, len(data), stored_at, expires_at, now)
+      )
+    with self._lock:
+      self._writes += 1
+      check_size = self.max_bytes is not None and self._writes % SIZE_CHECK_INTERVAL == 0
+    if check_size:
+      self._evict(self.max_bytes)
+
+  def delete(self, key: str) -> None:
+    conn = self._connection()
+    with conn:
+      conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+
+  def _evict(self, max_bytes: int) -> int:
+    """ Removes the least recently used entries until the stored values fit in <max_bytes> """
+    conn = self._connection()
+    size = conn.execute("SELECT COALESCE(SUM(size), 0) FROM cache").fetchone()[0]
+    removed = 0
+    while size > max_bytes:
+      rows = conn.execute("SELECT key, size FROM cache ORDER BY accessed_at LIMIT 500").fetchall()
+      if not rows:
+        break
+      keys = []
+      for key, entry_size in rows:
+        keys.append((key,))
+        size -= entry_size
+        if size <= max_bytes:
+          break
+      with conn:
+        conn.executemany("DELETE FROM cache WHERE key = ?", keys)
+      removed += len(keys)
+    return removed
+
+  def stats(self) -> dict:
+    conn = self._connection()
+    entries, size, compressed, expired, oldest, newest = conn.execute("""
+      SELECT COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(compressed), 0),
+        COALESCE(SUM(expires_at < ?), 0), MIN(created_at), MAX(created_at)
+      FROM cache
+    """, (time.time(),)).fetchone()
+    file_size = sum(os.path.getsize(f"{self.path}{suffix}") for suffix in ['', '-wal'] if os.path.exists(f"{self.path}{suffix}"))
+    return {
+      'backend': 'sqlite',
+      'path': self.path,
+      'entries': entries,
+      'size': size,
+      'compressed': compressed,
+      'expired': expired,
+      'oldest': oldest,
+      'newest': newest,
+      'file_size': file_size,
+      'max_bytes': self.max_bytes,
+    }
+
+  def prune(self, max_age: float = None, max_bytes: int = None) -> int:
+    """ Removes expired entries, entries older than <max_age> seconds and the LRU ones over <max_bytes> """
+    now = time.time()
+    conn = self._connection()
+    with conn:
+      removed = conn.execute("DELETE FROM cache WHERE expires_at <= ?", (now,)).rowcount
+      if max_age is not None:
+        removed += conn.execute("DELETE FROM cache WHERE created_at <= ?", (now - max_age,)).rowcount
+    max_bytes = max_bytes if max_bytes is not None else self.max_bytes
+    if max_bytes is not None:
+      removed += self._evict(max_bytes)
+    return removed
+
+  def vacuum(self) -> None:
+    conn = self._connection()
+    conn.execute("VACUUM")
+
+
+def create_cache_store(backend: str, directory: str, max_bytes: int = None, compress: bool = False):
+  if backend == 'files':
+    return FileCacheStore(directory)
+  if backend == 'sqlite':
+    return SQLiteCacheStore(os.path.join(directory, SQLITE_FILE_NAME), max_bytes=max_bytes, compress=compress)
+  raise ValueError(f"Unknown cache backend: {backend}")
+
+def migrate_files(source: FileCacheStore, target: SQLiteCacheStore, ttl: float = None, delete: bool = False) -> int:
+  """ Copies every md5-named cache file into <target>, keeping the file mtime as creation time """
+  count = 0
+  for key, value, stored_at in source.items():
+    target.set(key, value, ttl=ttl, stored_at=stored_at)
+    if delete:
+      source.delete(key)
+    count += 1
+    if count % 1000 == 0:
+      log(f"Migrated {count} cache entries")
+  return count
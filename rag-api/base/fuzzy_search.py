@@ -1,28 +1,279 @@
+import numpy as np
 from typing import Any
-from thefuzz import fuzz
-from thefuzz import process
+from bisect import bisect_left
+from functools import cached_property
+from collections import Counter
+from collections.abc import Sequence
+from rapidfuzz import fuzz as rapid_fuzz
+from rapidfuzz import process as rapid_process
+from thefuzz import utils
 from base.logger import debug
 
+NGRAM_SIZE = 3
+NGRAM_PAD = '$'
+# rows of the score matrix computed at once by FuzzyIndex.best_matches
+SCORE_MATRIX_ROWS = 256
+
+def process_choice(choice: str) -> str:
+  """ Same preprocessing thefuzz's extractOne applies to each choice with the token_sort_ratio scorer """
+  return utils.full_process(choice, force_ascii=True)
+
+def process_query(query: str) -> str:
+  """ extractOne runs its default processor on the query and then the choice processor """
+  return process_choice(utils.full_process(query))
+
+def sort_tokens(text: str) -> str:
+  return ' '.join(sorted(text.split()))
+
+def ngrams(text: str) -> Counter:
+  padded = NGRAM_PAD * (NGRAM_SIZE - 1) + text + NGRAM_PAD * (NGRAM_SIZE - 1)
+  return Counter(padded[i:i + NGRAM_SIZE] for i in range(len(padded) - NGRAM_SIZE + 1))
+
+def gram_code(gram: str) -> int:
+  """ Packs an n-gram into an int, 21 bits per code point """
+  code = 0
+  for char in gram:
+    code = (code << 21) | ord(char)
+  return code
+
+def pack_strings(values: list[str]) -> tuple[np.ndarray, np.ndarray]:
+  encoded = [value.encode('utf-8') for value in values]
+  offsets = np.zeros(len(encoded) + 1, dtype=np.uint64)
+  offsets[1:] = np.cumsum([len(value) for value in encoded], dtype=np.uint64)
+  return np.frombuffer(b''.join(encoded), dtype=np.uint8), offsets
+
+class PackedStrings(Sequence):
+  """ Read-only list over the strings packed by pack_strings, each one decoded when accessed """
+  def __init__(self, blob: np.ndarray, offsets: np.ndarray) -> None:
+    # memoryviews index to plain ints and bytes, numpy scalars are much slower
+    self._data = blob.data
+    self._offsets = offsets.data
+    self._count = len(offsets) - 1
+
+  def __len__(self) -> int:
+    return self._count
+
+  def __getitem__(self, i: int) -> str:
+    if i < 0:
+      i += self._count
+    if not 0 <= i < self._count:
+      raise IndexError('PackedStrings index out of range')
+    return str(self._data[self._offsets[i]:self._offsets[i + 1]], 'utf-8')
+
+  def __iter__(self):
+    data, offsets = self._data, self._offsets
+    for i in range(self._count):
+      yield str(data[offsets[i]:offsets[i + 1]], 'utf-8')
+
+def build_index_arrays(items: list[str]) -> dict[str, np.ndarray]:
+  keys = [sort_tokens(process_choice(item)) for item in items]
+  names_blob, names_offsets = pack_strings(items)
+  keys_blob, keys_offsets = pack_strings(keys)
+  item_lengths = np.array([len(key) for key in keys], dtype=np.uint32)
+  # empty names only match an empty query, handled by the exact match
+  indexed = [i for i, key in enumerate(keys) if key]
+  length_order = np.array(sorted(indexed, key=lambda i: (len(keys[i]), i)), dtype=np.uint32)
+  length_values, length_starts = np.unique(item_lengths[length_order], return_index=True)
+  # items by key, the first of the items sharing a key wins exact matches
+  exact_order = np.array(sorted(range(len(keys)), key=lambda i: (keys[i], i)), dtype=np.uint32)
+  codes, posting_items, posting_counts = [], [], []
+  for i in indexed:
+    for gram, count in ngrams(keys[i]).items():
+      codes.append(gram_code(gram))
+      posting_items.append(i)
+      posting_counts.append(count)
+  codes = np.array(codes, dtype=np.uint64)
+  posting_items = np.array(posting_items, dtype=np.uint32)
+  posting_counts = np.array(posting_counts, dtype=np.uint16)
+  posting_lengths = item_lengths[posting_items]
+  # postings of each n-gram sorted by item length, then item
+  order = np.lexsort((posting_items, posting_lengths, codes))
+  codes = codes[order]
+  gram_codes, gram_starts = np.unique(codes, return_index=True)
+  return {
+    'names_blob': names_blob,
+    'names_offsets': names_offsets,
+    'keys_blob': keys_blob,
+    'keys_offsets': keys_offsets,
+    'exact_order': exact_order,
+    'item_lengths': item_lengths,
+    'length_order': length_order,
+    'length_values': length_values.astype(np.uint32),
+    'length_offsets': np.append(length_starts, len(length_order)).astype(np.uint32),
+    'gram_codes': gram_codes.astype(np.uint64),
+    'gram_offsets': np.append(gram_starts, len(codes)).astype(np.uint32),
+    'posting_items': posting_items[order],
+    'posting_counts': posting_counts[order],
+    'posting_lengths': posting_lengths[order],
+  }
+
+INDEX_ARRAYS = list(build_index_arrays([]).keys())
+
+class FuzzyIndex:
+  """
+    Index over a list of names giving the same best match as
+    process.extractOne(keyword, items, scorer=fuzz.token_sort_ratio) without scoring every item.
+
+    Lookups try an exact match of the normalized token-sorted names first, a binary search of
+    the keys sorted in exact_order. Otherwise the
+    candidates are shortlisted with length and n-gram count filters: a name within Indel
+    distance d of the query shares at least max(len) + n - 1 - n * d padded n-grams with it.
+    Only the shortlist is scored.
+
+    The index lives in flat numpy arrays (see build_index_arrays) so it can be written to a
+    snapshot and used straight from a memory mapped file (see base/fuzzy_snapshot.py), shared
+    by every process mapping it: names and keys are decoded from it as they are read. Only
+    best_matches keeps a decoded copy of the keys per process, rapidfuzz scores str objects.
+  """
+  def __init__(self, items: list[str] = None, arrays: dict[str, np.ndarray] = None) -> None:
+    if arrays is None:
+      arrays = build_index_arrays(items)
+    self.arrays = arrays
+    for name in INDEX_ARRAYS:
+      setattr(self, name, arrays[name])
+    self.items = PackedStrings(self.names_blob, self.names_offsets)
+    self.keys = PackedStrings(self.keys_blob, self.keys_offsets)
+
+  @cached_property
+  def key_list(self) -> list[str]:
+    """ Decoded keys for scoring them all at once, built on the first batched search """
+    return list(self.keys)
+
+  def exact_match(self, query: str) -> int|None:
+    """ Index of the first item whose key is <query> """
+    j = bisect_left(self.exact_order, query, key=lambda i: self.keys[i])
+    if j < len(self.exact_order) and self.keys[int(self.exact_order[j])] == query:
+      return int(self.exact_order[j])
+    return None
+
+  def candidates(self, query: str, min_score: int) -> list[int]:
+    """ Indexes of every item that can score at least <min_score> against <query> """
+    # scores are rounded, an item scoring min_score - 0.5 can still pass
+    threshold = min_score - 0.5
+    query_len = len(query)
+    lengths = self.length_values.astype(np.int64)
+    max_distance = np.floor((100 - threshold) * (query_len + lengths) / 100 + 1e-9)
+    required = np.maximum(query_len, lengths) + NGRAM_SIZE - 1 - NGRAM_SIZE * max_distance
+    in_range = np.abs(query_len - lengths) <= max_distance
+    result = []
+    # lengths where the n-gram bound is vacuous, every item is a candidate
+    for j in np.flatnonzero(in_range & (required <= 0)):
+      result.append(self.length_order[self.length_offsets[j]:self.length_offsets[j + 1]])
+    filtered = in_range & (required > 0)
+    if filtered.any():
+      min_len = lengths[filtered].min()
+      max_len = lengths[filtered].max()
+      items = []
+      counts = []
+      for gram, query_count in ngrams(query).items():
+        code = gram_code(gram)
+        row = int(np.searchsorted(self.gram_codes, code))
+        if row == len(self.gram_codes) or self.gram_codes[row] != code:
+          continue
+        start, end = int(self.gram_offsets[row]), int(self.gram_offsets[row + 1])
+        gram_lengths = self.posting_lengths[start:end]
+        first = start + int(np.searchsorted(gram_lengths, min_len, 'left'))
+        last = start + int(np.searchsorted(gram_lengths, max_len, 'right'))
+        items.append(self.posting_items[first:last])
+        counts.append(np.minimum(self.posting_counts[first:last], query_count))
+      if items:
+        items, inverse = np.unique(np.concatenate(items), return_inverse=True)
+        common = np.bincount(inverse, weights=np.concatenate(counts))
+        item_lengths = self.item_lengths[items].astype(np.int64)
+        item_distance = np.floor((100 - threshold) * (query_len + item_lengths) / 100 + 1e-9)
+        item_required = np.maximum(query_len, item_lengths) + NGRAM_SIZE - 1 - NGRAM_SIZE * item_distance
+        keep = (np.abs(query_len - item_lengths) <= item_distance) & (item_required > 0) & (common >= item_required)
+        result.append(items[keep])
+    if not result:
+      return []
+    return np.sort(np.concatenate(result)).tolist()
+
+  def best_match(self, keyword: str, min_score: int) -> tuple[str, int]|None:
+    """ Returns (item, score) for the best scoring item when its score is at least <min_score> """
+    query = sort_tokens(process_query(keyword))
+    exact = self.exact_match(query)
+    if exact is not None:
+      return self.items[exact], 100
+    if not query:
+      return None
+    best_index = None
+    best_score = -1
+    # ties go to the first item in the list, as in extractOne
+    for i in self.candidates(query, min_score):
+      score = rapid_fuzz.ratio(query, self.keys[i])
+      if score > best_score:
+        best_index = i
+        best_score = score
+    if best_index is None or int(round(best_score)) < min_score:
+      return None
+    return self.items[best_index], int(round(best_score))
+
+  def best_matches(self, keywords: list[str], min_score: int, workers: int = -1) -> list[tuple[str, int]|None]:
+    """
+      Same as best_match for many keywords at once. Keywords without an exact match are scored
+      against every item in one score matrix (rapidfuzz cdist) spread over <workers> cores.
+    """
+    queries = [sort_tokens(process_query(keyword)) for keyword in keywords]
+    result = [None] * len(queries)
+    pending = []
+    for row, query in enumerate(queries):
+      exact = self.exact_match(query)
+      if exact is not None:
+        result[row] = self.items[exact], 100
+      elif query and len(self.keys):
+        pending.append(row)
+    for start in range(0, len(pending), SCORE_MATRIX_ROWS):
+      rows = pending[start:start + SCORE_MATRIX_ROWS]
+      scores = rapid_process.cdist(
+        [queries[row] for row in rows], self.key_list,
+        scorer=rapid_fuzz.ratio, score_cutoff=min_score - 0.5, dtype=np.float64, workers=workers
+      )
+      # argmax returns the first of tied items, as extractOne does
+      best_indexes = np.argmax(scores, axis=1)
+      for row, best_index, row_scores in zip(rows, best_indexes, scores):
+        score = int(round(row_scores[best_index]))
+        if score >= min_score:
+          result[row] = self.items[int(best_index)], score
+    return result
+
 class FuzzySearch:
   def __init__(self, config = {}) -> None:
     self.collections = {}
+    self.indexes = {}
     self.config = config
 
   def add(self, type: str, items: list[str]):
-      self.collections[type] = items
+      self.add_index(type, FuzzyIndex(items))
+
+  def add_index(self, type: str, index: FuzzyIndex):
+      self.collections[type] = index.items
+      self.indexes[type] = index
 
   def search(self, keyword: str, min_score: int = 97) -> Any:
     types = self.collections.keys()
     results = []
     for c_type in types:
-      match = process.extractOne(keyword, self.collections[c_type], scorer=fuzz.token_sort_ratio)
+      match = self.indexes[c_type].best_match(keyword, min_score)
       if not match:
         continue
-      score = int(match[1] or 0)
-      if match and score >= min_score:
+      debug(f"Match: {match[0]} with {match[1]} for {keyword}")
+      results.append({
+        'type': c_type,
+        'value': match[0]
+      })
+    return results
+
+  def search_many(self, keywords: list[str], min_score: int = 97) -> list[Any]:
+    """ Batched search, scores all keywords against each collection in one pass """
+    results = [[] for _ in keywords]
+    for c_type in self.collections.keys():
+      matches = self.indexes[c_type].best_matches(keywords, min_score)
+      for keyword, match, keyword_results in zip(keywords, matches, results):
+        if not match:
+          continue
         debug(f"Match: {match[0]} with {match[1]} for {keyword}")
-        results.append({
+        keyword_results.append({
           'type': c_type,
           'value': match[0]
         })
-    return results
\ No newline at end of file
+    return results
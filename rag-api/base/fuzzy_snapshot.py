@@ -0,0 +1,86 @@
+import os
+import json
+import mmap
+import uuid
+import struct
+import numpy as np
+from base.fuzzy_search import FuzzyIndex
+from base.fuzzy_search import INDEX_ARRAYS
+
+"""
+  Binary snapshot of FuzzyIndex collections. Layout:
+
+    magic (8 bytes) | header length (uint64 little endian) | JSON header | arrays
+
+  The header holds the caller's metadata, the collection types (their position is the type id)
+  and the offset, dtype and shape of every array. Arrays start on 64 byte boundaries and are
+  loaded as read-only numpy views over a memory mapped file, nothing is parsed or copied.
+"""
+# bumped with the arrays, older snapshots are rebuilt
+SNAPSHOT_MAGIC = b'FZSNAP02'
+SNAPSHOT_ALIGNMENT = 64
+HEADER_PREFIX = len(SNAPSHOT_MAGIC) + 8
+
+def align(offset: int) -> int:
+  return -(-offset // SNAPSHOT_ALIGNMENT) * SNAPSHOT_ALIGNMENT
+
+def write_snapshot(path: str, indexes: dict[str, FuzzyIndex], metadata: dict = {}) -> None:
+  """ Writes <indexes> (type -> FuzzyIndex) to <path>, replacing the file atomically """
+  header = { 'metadata': metadata, 'types': list(indexes.keys()), 'arrays': {} }
+  sections = []
+  offset = 0
+  for type, index in indexes.items():
+    for name in INDEX_ARRAYS:
+      array = np.ascontiguousarray(index.arrays[name])
+      offset = align(offset)
+      header['arrays'][f"{type}/{name}"] = { 'offset': offset, 'dtype': array.dtype.str, 'shape': list(array.shape) }
+      sections.append((offset, array))
+      offset += array.nbytes
+  header_bytes = json.dumps(header).encode('utf-8')
+  data_start = align(HEADER_PREFIX + len(header_bytes))
+
+  os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+  tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+  try:
+    with open(tmp_path, 'wb') as file:
+      file.write(SNAPSHOT_MAGIC)
+      file.write(struct.pack('<Q', len(header_bytes)))
+      file.write(header_bytes)
+      for offset, array in sections:
+        file.write(b'\0' * (data_start + offset - file.tell()))
+        file.write(array.tobytes())
+    os.replace(tmp_path, path)
+  except Exception:
+    if os.path.exists(tmp_path):
+      os.remove(tmp_path)
+    raise
+
+def read_snapshot_metadata(path: str) -> dict:
+  """ Metadata of the snapshot at <path> without mapping its arrays """
+  with open(path, 'rb') as file:
+    prefix = file.read(HEADER_PREFIX)
+    if len(prefix) < HEADER_PREFIX or prefix[:len(SNAPSHOT_MAGIC)] != SNAPSHOT_MAGIC:
+      raise ValueError(f"{path} is not a fuzzy search snapshot")
+    header_length = struct.unpack('<Q', prefix[len(SNAPSHOT_MAGIC):])[0]
+    return json.loads(file.read(header_length))['metadata']
+
+def load_snapshot(path: str) -> tuple[dict, dict[str, FuzzyIndex]]:
+  """ Maps the snapshot at <path>, returns (metadata, type -> FuzzyIndex) """
+  with open(path, 'rb') as file:
+    buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+  if buffer[:len(SNAPSHOT_MAGIC)] != SNAPSHOT_MAGIC:
+    raise ValueError(f"{path} is not a fuzzy search snapshot")
+  header_length = struct.unpack_from('<Q', buffer, len(SNAPSHOT_MAGIC))[0]
+  header = json.loads(buffer[HEADER_PREFIX:HEADER_PREFIX + header_length])
+  data_start = align(HEADER_PREFIX + header_length)
+  indexes = {}
+  for type in header['types']:
+    arrays = {}
+    for name in INDEX_ARRAYS:
+      spec = header['arrays'][f"{type}/{name}"]
+      count = int(np.prod(spec['shape']))
+      # the views keep the mmap open for as long as the index is alive
+      array = np.frombuffer(buffer, dtype=spec['dtype'], count=count, offset=data_start + spec['offset'])
+      arrays[name] = array.reshape(spec['shape'])
+    indexes[type] = FuzzyIndex(arrays=arrays)
+  return header['metadata'], indexes
@@ -1,43 +1,143 @@
+import re
 import json
+from typing import Any
 from base.logger import log
 
-def try_parse_json(json_str):
-  try:
-    json_str_1 = try_extract(json_str, token_start='{', token_end='}')
-    json_str_2 = try_extract(json_str, token_start='[', token_end=']')
-    result = json_str_1 if len(json_str_1) > len(json_str_2) else json_str_2
-    return json.loads(result)
-  except json.JSONDecodeError as e:
-    log('Error parsing JSON', e)
-    return None
-
-def try_extract(input_str, token_start, token_end):
-  try:
-    json_str = extract_valid_json(input_str, token_start, token_end)
-    json.loads(json_str)
-    return json_str
-  except:
-    return ''
-
-# https://github.com/chigwell/JsonExtractor/blob/main/json_extractor/extractor.py
-def extract_valid_json(input_str, token_start, token_end):
-  stack = []
-  start_index = None
-  for i, char in enumerate(input_str):
-    if char == token_start:
-      stack.append(char)
-      if len(stack) == 1:
-        # Mark the start of a potential JSON object
-        start_index = i
-    elif char == token_end:
-      if stack:
-        stack.pop()
-        if len(stack) == 0 and start_index is not None:
-          # Attempt to parse when we find a closing brace that matches the outermost opening brace
+"""
+  Extraction of the JSON answer in LLM output, which usually comes wrapped in prose or markdown
+  fences. JSONExtractor is fed the output chunk by chunk as it is streamed and returns the first
+  complete and valid JSON object or array as soon as its closing bracket arrives.
+"""
+# candidates retried from their next bracket after failing, beyond these the scan moves on linearly
+MAX_RESTARTS = 32
+OPEN_PATTERN = re.compile(r'[{\[]')
+# a whole string literal is skipped at once, a lone quote is one that continues in the next chunk
+STRUCTURE_PATTERN = re.compile(r'"[^"\\]*(?:\\.[^"\\]*)*"|[{}\[\]"]', re.DOTALL)
+STRING_PATTERN = re.compile(r'["\\]')
+CLOSERS = { '{': '}', '[': ']' }
+
+class JSONExtractor:
+  """
+    Incremental scanner that follows bracket nesting from the first '{' or '[' on, ignoring the
+    brackets inside string literals. When the outermost bracket closes the candidate is parsed
+    once: if it's not valid JSON (e.g. "{placeholder}" in the prose) scanning restarts right
+    after its opening bracket. Only the text of the open candidate is kept.
+
+    A restart rescans the rest of the candidate, so after MAX_RESTARTS of them scanning resumes
+    from the innermost open bracket instead (whose text holds no unclosed bracket), and a closed
+    candidate that fails to parse is skipped whole. That bounds the work on output full of stray
+    brackets to a few passes over it.
+  """
+  def __init__(self) -> None:
+    self.value = None
+    self.done = False
+    self.restarts = 0
+    self._pieces = []
+    # length of the text in _pieces
+    self._size = 0
+    # (bracket, offset in the candidate text) of the open brackets
+    self._stack = []
+    self._in_string = False
+    self._escape = False
+
+  def _reset(self) -> str:
+    """ Drops the open candidate and returns its text """
+    text = ''.join(self._pieces)
+    self._pieces = []
+    self._size = 0
+    self._stack = []
+    self._in_string = False
+    self._escape = False
+    return text
+
+  def _can_restart(self) -> bool:
+    self.restarts += 1
+    return self.restarts <= MAX_RESTARTS
+
+  def feed(self, chunk: str) -> Any:
+    """ Scans the next <chunk> of output, returns the JSON value once found (and from then on), None until then """
+    pos = 0
+    # start of the open candidate within chunk
+    begin = 0
+    while not self.done and pos < len(chunk):
+      if not self._stack:
+        match = OPEN_PATTERN.search(chunk, pos)
+        if match is None:
+          return None
+        begin = match.start()
+        self._stack.append((match.group(), 0))
+        pos = match.end()
+      elif self._escape:
+        self._escape = False
+        pos += 1
+      elif self._in_string:
+        match = STRING_PATTERN.search(chunk, pos)
+        if match is None:
+          pos = len(chunk)
+        elif match.group() == '"':
+          self._in_string = False
+          pos = match.end()
+        else:
+          self._escape = True
+          pos = match.end()
+      else:
+        match = STRUCTURE_PATTERN.search(chunk, pos)
+        if match is None:
+          pos = len(chunk)
+          continue
+        char = match.group()
+        pos = match.end()
+        if len(char) > 1:
+          continue
+        if char == '"':
+          self._in_string = True
+        elif char in CLOSERS:
+          self._stack.append((char, self._size + match.start() - begin))
+        elif char != CLOSERS[self._stack[-1][0]]:
+          # mismatched bracket, not JSON: retry after the opening bracket, or out of restarts after
+          # the innermost one, the text between it and the mismatch is all closed candidates
+          offset = 0 if self._can_restart() else self._stack[-1][1]
+          chunk = (self._reset() + chunk[begin:])[offset + 1:]
+          pos = begin = 0
+        elif len(self._stack) > 1:
+          self._stack.pop()
+        else:
+          self._pieces.append(chunk[begin:pos])
+          candidate = self._reset()
           try:
-            return input_str[start_index:i+1]
-          except:
-            # Reset start_index if parsing fails
-            start_index = None
-  # If no valid JSON found
-  return None
\ No newline at end of file
+            self.value = json.loads(candidate)
+            self.done = True
+          except (json.JSONDecodeError, RecursionError):
+            if self._can_restart():
+              chunk = candidate[1:] + chunk[pos:]
+              pos = begin = 0
+            else:
+              begin = pos
+    if self._stack and not self.done:
+      self._pieces.append(chunk[begin:])
+      self._size += len(chunk) - begin
+    return self.value
+
+  def finish(self) -> Any:
+    """
+      End of the output. A bracket that never closed (e.g. "use { and }" with the braces
+      unbalanced) may hide a valid value after it, so its text is scanned again without it.
+      Out of restarts, only the text after the innermost open bracket is scanned, once.
+    """
+    while self._stack and not self.done:
+      if self._can_restart():
+        self.feed(self._reset()[1:])
+        continue
+      offset = self._stack[-1][1]
+      self.feed(self._reset()[offset + 1:])
+      self._reset()
+    return self.value
+
+def try_parse_json(json_str):
+  """ First JSON object or array in <json_str>, None when there is none """
+  extractor = JSONExtractor()
+  extractor.feed(json_str or '')
+  value = extractor.finish()
+  if not extractor.done:
+    log('Error parsing JSON, no JSON value found')
+  return value
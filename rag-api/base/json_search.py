@@ -1,19 +1,48 @@
 from typing import Any
+import re
 import json
-from jmespath import search, visitor
+from functools import lru_cache
+from jmespath import compile as compile_jmespath
+from jmespath import visitor
+
+# a.b.c with unquoted identifiers only, resolved without jmespath
+DOTTED_PATH_PATTERN = re.compile(r'[A-Za-z_][A-Za-z0-9_]*(?:\.[A-Za-z_][A-Za-z0-9_]*)*')
+
+@lru_cache(maxsize=1024)
+def compile_expression(expression: str):
+  """ The keys of a dotted path, or the compiled jmespath expression otherwise """
+  if DOTTED_PATH_PATTERN.fullmatch(expression):
+    return tuple(expression.split('.'))
+  return compile_jmespath(expression)
 
 class JSONSearch:
-  def __init__(self, data: bytes|str, options: visitor.Options = None):
-    self.data = data
-    self.json_data = json.loads(data)
+  def __init__(self, data: bytes|str|dict|list, options: visitor.Options = None):
+    if isinstance(data, (bytes, str)):
+      self.data = data
+      self.json_data = json.loads(data)
+    else:
+      # already parsed JSON, serialized lazily by __str__
+      self.data = None
+      self.json_data = data
     self.options = options
 
   def search(self, expression: str) -> Any:
-    return search(expression, self.json_data, self.options)
+    compiled = compile_expression(expression)
+    if isinstance(compiled, tuple):
+      # as in jmespath, a field of anything but an object is null
+      value = self.json_data
+      for key in compiled:
+        if not isinstance(value, dict):
+          return None
+        value = value.get(key)
+      return value
+    return compiled.search(self.json_data, self.options)
 
   @property
   def empty(self):
-    return len(self.search('@')) == 0
+    return len(self.json_data) == 0
 
   def __str__(self):
+    if self.data is None:
+      self.data = json.dumps(self.json_data, ensure_ascii=False)
     return self.data
@@ -0,0 +1,67 @@
+import time
+import threading
+from typing import Any
+from collections import OrderedDict
+
+class MemoryCache:
+  """
+    Thread safe in-process LRU cache. Entries are evicted when they are older than <ttl>
+    seconds or when the cache holds more than <max_entries>, least recently used first.
+  """
+  def __init__(self, max_entries: int = 4096, ttl: float = 3600) -> None:
+    self.max_entries = max_entries
+    self.ttl = ttl
+    self.hits = 0
+    self.misses = 0
+    self.evictions = 0
+    self._entries = OrderedDict()
+    self._lock = threading.Lock()
+
+  def get(self, key: str, max_age: float = None) -> Any:
+    """ Returns the value for <key> or None when missing or older than min(ttl, max_age) """
+    max_age = self.ttl if max_age is None else min(self.ttl, max_age)
+    with self._lock:
+      entry = self._entries.get(key)
+      if entry is not None:
+        stored_at, value = entry
+        if time.monotonic() - stored_at < max_age:
+          self._entries.move_to_end(key)
+          self.hits += 1
+          return value
+        del self._entries[key]
+        self.evictions += 1
+      self.misses += 1
+      return None
+
+  def set(self, key: str, value: Any, age: float = 0) -> None:
+    """ Stores <value> for <key>. <age> is how old the value already is, in seconds """
+    with self._lock:
+      self._entries[key] = (time.monotonic() - age, value)
+      self._entries.move_to_end(key)
+      while len(self._entries) > self.max_entries:
+        self._entries.popitem(last=False)
+        self.evictions += 1
+
+  def delete(self, key: str) -> None:
+    with self._lock:
+      self._entries.pop(key, None)
+
+  def clear(self) -> None:
+    with self._lock:
+      self._entries.clear()
+
+  def stats(self) -> dict:
+    with self._lock:
+      total = self.hits + self.misses
+      return {
+        'entries': len(self._entries),
+        'max_entries': self.max_entries,
+        'ttl': self.ttl,
+        'hits': self.hits,
+        'misses': self.misses,
+        'evictions': self.evictions,
+        'hit_rate': self.hits / total if total else 0,
+      }
+
+  def __len__(self) -> int:
+    return len(self._entries)
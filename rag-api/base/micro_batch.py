@@ -0,0 +1,187 @@
+import time
+import queue
+import asyncio
+import threading
+from typing import Any, Callable
+from collections import deque
+from concurrent.futures import Future
+from concurrent.futures import ThreadPoolExecutor
+from base.logger import debug
+
+"""
+  Micro-batching of calls to a function that works better with many inputs at once (model
+  inference). Items can be submitted from any thread or event loop. A dedicated thread groups
+  them into batches of up to <max_batch_size> items, waiting at most <max_wait> seconds for a
+  batch to fill after its first item arrives, and runs func(items) -> results.
+
+  Up to <concurrency> batches run at once. While they are all busy new items keep queueing,
+  so the next batch is collected full. With <max_pending> set, submitting more items than
+  the queue has room for raises QueueFullError instead of letting latency pile up.
+"""
+BATCH_HISTORY = 256
+
+class QueueFullError(Exception):
+  pass
+
+class MicroBatcher:
+  def __init__(
+    self,
+    func: Callable[[list], list],
+    max_batch_size: int = 8,
+    max_wait: float = 0.01,
+    name: str = 'batcher',
+    concurrency: int = 1,
+    max_pending: int = None
+  ) -> None:
+    self.func = func
+    self.max_batch_size = max_batch_size
+    self.max_wait = max_wait
+    self.name = name
+    self.concurrency = concurrency
+    self.max_pending = max_pending
+    self.pending = 0
+    self.batches = 0
+    self.items = 0
+    self.errors = 0
+    self.rejected = 0
+    self._history = deque(maxlen=BATCH_HISTORY)
+    self._queue = queue.Queue()
+    self._slots = threading.Semaphore(concurrency)
+    self._executor = None
+    self._thread = None
+    self._lock = threading.Lock()
+
+  def _start(self) -> None:
+    with self._lock:
+      if self._thread is None:
+        self._executor = ThreadPoolExecutor(self.concurrency, thread_name_prefix=self.name)
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+
+  def _reserve(self, count: int) -> None:
+    with self._lock:
+      # a request bigger than the whole queue is still let through when nothing else is waiting
+      if self.max_pending is not None and self.pending > 0 and self.pending + count > self.max_pending:
+        self.rejected += 1
+        raise QueueFullError(f"{self.name} queue is full ({self.pending} pending)")
+      self.pending += count
+
+  def _release(self, count: int) -> None:
+    with self._lock:
+      self.pending -= count
+
+  def submit_many(self, items: list) -> list[Future]:
+    """ Queues all <items> or none of them, each future resolves once its batch has run """
+    self._reserve(len(items))
+    self._start()
+    futures = []
+    for item in items:
+      future = Future()
+      self._queue.put((item, future, time.perf_counter()))
+      futures.append(future)
+    return futures
+
+  def submit(self, item: Any) -> Future:
+    return self.submit_many([item])[0]
+
+  async def run(self, items: list) -> list:
+    """ Results of <items> in order, awaitable from any event loop """
+    futures = [asyncio.wrap_future(future) for future in self.submit_many(items)]
+    return list(await asyncio.gather(*futures))
+
+  def _collect(self) -> list:
+    batch = [self._queue.get()]
+    deadline = time.perf_counter() + self.max_wait
+    while len(batch) < self.max_batch_size and batch[-1] is not None:
+      timeout = deadline - time.perf_counter()
+      try:
+        batch.append(self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait())
+      except queue.Empty:
+        break
+    return batch
+
+  def _run(self) -> None:
+    while True:
+      # wait for a free slot first, items arriving meanwhile end up in the same batch
+      self._slots.acquire()
+      batch = self._collect()
+      stop = batch[-1] is None
+      batch = [entry for entry in batch if entry is not None]
+      # drop the items whose caller already gave up
+      running = [entry for entry in batch if entry[1].set_running_or_notify_cancel()]
+      self._release(len(batch) - len(running))
+      if running:
+        self._executor.submit(self._run_batch, running)
+      else:
+        self._slots.release()
+      if stop:
+        return
+
+  def _run_batch(self, batch: list) -> None:
+    try:
+      self._call(batch)
+    finally:
+      self._release(len(batch))
+      self._slots.release()
+
+  def _call(self, batch: list) -> None:
+    start = time.perf_counter()
+    try:
+      results = list(self.func([item for item, _, _ in batch]))
+      if len(results) != len(batch):
+        # zip would leave the callers of the missing results waiting forever
+        raise ValueError(f"Batch function returned {len(results)} results for {len(batch)} items")
+      for (_, future, _), result in zip(batch, results):
+        future.set_result(result)
+      failed = False
+    except Exception as e:
+      for _, future, _ in batch:
+        future.set_exception(e)
+      failed = True
+    end = time.perf_counter()
+    metrics = {
+      'size': len(batch),
+      'wait_ms': (start - min(submitted_at for _, _, submitted_at in batch)) * 1000,
+      'run_ms': (end - start) * 1000,
+      'failed': failed,
+      'finished_at': time.time(),
+    }
+    with self._lock:
+      self.batches += 1
+      self.items += len(batch)
+      self.errors += failed
+      self._history.append(metrics)
+    debug(f"{self.name}: batch of {metrics['size']} waited {metrics['wait_ms']:.1f} ms, ran in {metrics['run_ms']:.1f} ms")
+
+  def stats(self) -> dict:
+    with self._lock:
+      history = list(self._history)
+      batches = len(history)
+      return {
+        'max_batch_size': self.max_batch_size,
+        'max_wait_ms': self.max_wait * 1000,
+        'concurrency': self.concurrency,
+        'queued': self._queue.qsize(),
+        'pending': self.pending,
+        'max_pending': self.max_pending,
+        'rejected': self.rejected,
+        'batches': self.batches,
+        'items': self.items,
+        'errors': self.errors,
+        # averages over the last BATCH_HISTORY batches
+        'avg_batch_size': sum(batch['size'] for batch in history) / batches if batches else 0,
+        'avg_wait_ms': sum(batch['wait_ms'] for batch in history) / batches if batches else 0,
+        'avg_run_ms': sum(batch['run_ms'] for batch in history) / batches if batches else 0,
+        'recent': history[-10:],
+      }
+
+  def close(self, timeout: float = 5) -> None:
+    """ Runs what's already queued and stops the batching thread """
+    with self._lock:
+      thread = self._thread
+      executor = self._executor
+      self._thread = None
+    if thread is not None:
+      self._queue.put(None)
+      thread.join(timeout)
+      executor.shutdown(wait=True)
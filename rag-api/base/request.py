@@ -1,51 +1,191 @@
 import os
+import json
 import time
+import atexit
 import aiohttp
 import asyncio
 import hashlib
-from aiofiles import open as aio_open
+import threading
+from urllib.parse import urlsplit
 from base.logger import log, debug
+from base.memory_cache import MemoryCache
+from base.cache_store import create_cache_store
 
 CACHE_DIR = "cache"
-semaphore = asyncio.Semaphore(5)  # Adjust the number to limit concurrent requests
+CACHE_BACKEND = os.environ.get("CACHE_BACKEND", "sqlite")  # sqlite | files
+CACHE_MAX_BYTES = int(os.environ.get("CACHE_MAX_BYTES", 2 * 1024 ** 3))
+CACHE_COMPRESS = os.environ.get("CACHE_COMPRESS", "1") == "1"
+MAX_CONNECTIONS = 100
+MAX_CONNECTIONS_PER_HOST = 5  # Adjust the number to limit concurrent requests to the same host
+KEEPALIVE_TIMEOUT = 30
+DNS_CACHE_TTL = 300
+MEMORY_CACHE_MAX_ENTRIES = 4096
+MEMORY_CACHE_TTL = 3600
 
-async def get_url(url, cache_duration=3600, extension='', cache=True):
-  if not extension:
-    extension = 'data'
+class PooledClient:
+  """
+    Process wide HTTP client with keep-alive connections and per host concurrency limits.
+    Flask runs each async view in a new event loop, so the aiohttp session lives in its own
+    loop on a background thread and callers hand their requests over to it.
+  """
+  def __init__(self, limit: int = MAX_CONNECTIONS, limit_per_host: int = MAX_CONNECTIONS_PER_HOST) -> None:
+    self.limit = limit
+    self.limit_per_host = limit_per_host
+    self._loop = None
+    self._thread = None
+    self._session = None
+    self._host_semaphores = {}
+    self._inflight = {}
+    self._lock = threading.Lock()
 
-  # Ensure the cache directory exists
-  if not os.path.exists(CACHE_DIR):
-    os.makedirs(CACHE_DIR)
+  def _get_loop(self) -> asyncio.AbstractEventLoop:
+    with self._lock:
+      if self._loop is None:
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name='http-client', daemon=True)
+        self._thread.start()
+      return self._loop
 
-  # Use a hash function for a consistent, positive hash
-  url_hash = hashlib.md5(url.encode()).hexdigest()
-  cache_file = f"{CACHE_DIR}/{url_hash}.{extension}"
-
-  # Remove cache file if it exists and caching is disabled
-  if not cache and os.path.exists(cache_file):
-    os.remove(cache_file)
-
-  # Check if cached file exists and is within the expiry time
-  if os.path.exists(cache_file) and time.time() - os.path.getmtime(cache_file) < cache_duration:
-    async with aio_open(cache_file, 'r', encoding='utf-8') as file:
-      return await file.read()
-
-  # Make the full request and cache the result
-  async with semaphore:
-    async with aiohttp.ClientSession() as session:
-      debug(f"URL Hash: {url_hash}")
-      log(f"Req: {url}")
-      async with session.get(url, headers={"User-Agent": "Mozilla/5.0"}) as response:
+  async def run(self, coro):
+    """ Runs <coro> in the client loop and awaits its result from the caller loop """
+    loop = self._get_loop()
+    if asyncio.get_running_loop() is loop:
+      return await coro
+    return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coro, loop))
+
+  def _get_session(self) -> aiohttp.ClientSession:
+    if self._session is None or self._session.closed:
+      connector = aiohttp.TCPConnector(
+        limit=self.limit,
+        limit_per_host=self.limit_per_host,
+        keepalive_timeout=KEEPALIVE_TIMEOUT,
+        ttl_dns_cache=DNS_CACHE_TTL,
+      )
+      self._session = aiohttp.ClientSession(connector=connector, headers={"User-Agent": "Mozilla/5.0"})
+    return self._session
+
+  def session(self) -> aiohttp.ClientSession:
+    """ The pooled session, only for coroutines running in the client loop (see run()) """
+    return self._get_session()
+
+  def _get_host_semaphore(self, url: str) -> asyncio.Semaphore:
+    host = urlsplit(url).netloc
+    if host not in self._host_semaphores:
+      self._host_semaphores[host] = asyncio.Semaphore(self.limit_per_host)
+    return self._host_semaphores[host]
+
+  async def _get(self, url: str) -> tuple[int, str]:
+    async with self._get_host_semaphore(url):
+      async with self._get_session().get(url) as response:
         try:
           response_text = await response.text(encoding='utf-8')
         except Exception as e:
           response_text = await response.text(encoding='latin-1')
-        if response.status == 200:
-          async with aio_open(cache_file, 'w', encoding='utf-8') as file:
-            await file.write(response_text)
-          return response_text
-        else:
-          raise Exception(f"Request failed with status code {response.status}")
+        return response.status, response_text
+
+  async def get(self, url: str) -> tuple[int, str]:
+    """ GET <url> returning (status, text) """
+    return await self.run(self._get(url))
+
+  async def run_once(self, key: str, func, *args):
+    """
+      Single-flight: awaits func(*args) in the client loop, concurrent callers with the same <key>
+      share the result of the call already in flight instead of starting a new one.
+    """
+    return await self.run(self._run_once(key, func, *args))
+
+  async def _run_once(self, key: str, func, *args):
+    task = self._inflight.get(key)
+    if task is None:
+      task = asyncio.ensure_future(func(*args))
+      self._inflight[key] = task
+      task.add_done_callback(lambda _: self._inflight.pop(key, None))
+    # a cancelled caller must not cancel the call for the others
+    return await asyncio.shield(task)
+
+  def close(self, timeout: float = 5) -> None:
+    """ Closes the pooled connections and stops the client loop """
+    with self._lock:
+      loop, thread, session = self._loop, self._thread, self._session
+      self._loop = self._thread = self._session = None
+      self._host_semaphores = {}
+      self._inflight = {}
+    if loop is None:
+      return
+    if session is not None and not session.closed:
+      asyncio.run_coroutine_threadsafe(session.close(), loop).result(timeout)
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join(timeout)
+    loop.close()
+
+http_client = PooledClient()
+atexit.register(http_client.close)
+# Parsed JSON responses of get_json, sits in front of the cache store
+memory_cache = MemoryCache(MEMORY_CACHE_MAX_ENTRIES, MEMORY_CACHE_TTL)
+cache_stores = {}
+cache_stores_lock = threading.Lock()
+
+def get_cache_store(directory: str = None):
+  """ Returns the cache store configured by CACHE_BACKEND for <directory> (defaults to CACHE_DIR) """
+  directory = directory or CACHE_DIR
+  with cache_stores_lock:
+    if directory not in cache_stores:
+      cache_stores[directory] = create_cache_store(CACHE_BACKEND, directory, CACHE_MAX_BYTES, CACHE_COMPRESS)
+    return cache_stores[directory]
+
+async def get_url(url, cache_duration=3600, extension='', cache=True):
+  response_text, _ = await fetch_url(url, cache_duration, extension, cache)
+  return response_text
+
+async def get_json(url, cache_duration=3600, extension='', cache=True):
+  """
+    Same as get_url but returns the parsed JSON. Parsed responses are kept in memory_cache so
+    repeated lookups skip both the cache file and the parsing. Treat the result as read-only,
+    it's shared between callers.
+  """
+  url_hash = hashlib.md5(url.encode()).hexdigest()
+  if cache:
+    data = memory_cache.get(url_hash, cache_duration)
+    if data is not None:
+      return data
+  else:
+    memory_cache.delete(url_hash)
+  response_text, fetched_at = await fetch_url(url, cache_duration, extension, cache)
+  data = json.loads(response_text)
+  memory_cache.set(url_hash, data, age=time.time() - fetched_at)
+  return data
+
+async def fetch_url(url, cache_duration=3600, extension='', cache=True) -> tuple[str, float]:
+  """ Returns the response text for <url> and the time it was fetched at """
+  if not extension:
+    extension = 'data'
+
+  # Use a hash function for a consistent, positive hash
+  url_hash = hashlib.md5(url.encode()).hexdigest()
+  cache_key = f"{url_hash}.{extension}"
+  store = get_cache_store()
+
+  # Remove cached entry if it exists and caching is disabled
+  if not cache:
+    await asyncio.to_thread(store.delete, cache_key)
+  else:
+    # Check if cached entry exists and is within the expiry time
+    cached = await asyncio.to_thread(store.get, cache_key, cache_duration)
+    if cached is not None:
+      return cached
+
+  # Make the full request and cache the result, concurrent requests for the same url share it
+  return await http_client.run_once(url_hash, download_url, url, store, cache_key, cache_duration)
+
+async def download_url(url, store, cache_key, cache_duration) -> tuple[str, float]:
+  debug(f"URL Hash: {cache_key}")
+  log(f"Req: {url}")
+  status, response_text = await http_client.get(url)
+  if status == 200:
+    await asyncio.to_thread(store.set, cache_key, response_text, cache_duration)
+    return response_text, time.time()
+  else:
+    raise Exception(f"Request failed with status code {status}")
 
 
 async def main():
@@ -0,0 +1,86 @@
+import json
+import asyncio
+import hashlib
+import threading
+from typing import Any
+from base.logger import warn
+from base.memory_cache import MemoryCache
+from base.request import get_cache_store
+
+"""
+  Content addressed cache of JSON values with two tiers: a MemoryCache in front of the
+  persistent cache store used by base/request.py. Keys are the md5 of the JSON encoded key
+  parts plus a ".<name>" extension, the same shape as the url cache keys. A failing
+  persistent tier is logged and skipped, it never fails the caller.
+"""
+
+class TieredCache:
+  def __init__(self, name: str, ttl: float, max_entries: int = 4096, persist: bool = True) -> None:
+    self.name = name
+    self.ttl = ttl
+    self.persist = persist
+    self.memory = MemoryCache(max_entries, ttl)
+    self.store_hits = 0
+    self.store_misses = 0
+    self._lock = threading.Lock()
+
+  def key(self, *parts) -> str:
+    encoded = json.dumps(parts, ensure_ascii=False, sort_keys=True)
+    return f"{hashlib.md5(encoded.encode('utf-8')).hexdigest()}.{self.name}"
+
+  def get_many(self, keys: list[str]) -> dict[str, Any]:
+    """ Cached values of <keys>, missing keys are left out """
+    found = {}
+    missing = []
+    for key in keys:
+      value = self.memory.get(key)
+      if value is not None:
+        found[key] = value
+      else:
+        missing.append(key)
+    if not missing or not self.persist:
+      return found
+    hits = 0
+    try:
+      store = get_cache_store()
+      for key in missing:
+        entry = store.get(key, self.ttl)
+        if entry is None:
+          continue
+        value = json.loads(entry[0])
+        self.memory.set(key, value)
+        found[key] = value
+        hits += 1
+    except Exception as e:
+      warn(f"{self.name} cache store read failed: {e}")
+    with self._lock:
+      self.store_hits += hits
+      self.store_misses += len(missing) - hits
+    return found
+
+  def set_many(self, values: dict[str, Any]) -> None:
+    for key, value in values.items():
+      self.memory.set(key, value)
+    if not values or not self.persist:
+      return
+    try:
+      store = get_cache_store()
+      for key, value in values.items():
+        store.set(key, json.dumps(value, ensure_ascii=False), ttl=self.ttl)
+    except Exception as e:
+      warn(f"{self.name} cache store write failed: {e}")
+
+  async def aget_many(self, keys: list[str]) -> dict[str, Any]:
+    return await asyncio.to_thread(self.get_many, keys)
+
+  async def aset_many(self, values: dict[str, Any]) -> None:
+    await asyncio.to_thread(self.set_many, values)
+
+  def stats(self) -> dict:
+    with self._lock:
+      return {
+        'memory': self.memory.stats(),
+        'store_hits': self.store_hits,
+        'store_misses': self.store_misses,
+        'persist': self.persist,
+      }
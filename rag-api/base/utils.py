@@ -1,7 +1,10 @@
-from typing import List
+from typing import List, Iterator, Callable
 import re
+from bisect import bisect_left
+from bisect import bisect_right
 from threading import Timer
 from unidecode import unidecode
+from base.aho_corasick import AhoCorasick
 
 def debounce(wait):
     """ Decorator that will postpone a functions
@@ -32,9 +35,11 @@ def fix_punctuation_spaces(text: str) -> str:
   text = re.sub(r'\((\s*)(.*?)(\s*)\)', r'(\2)', text)
   return text.strip()
 
+NORMALIZE_PATTERN = re.compile(r'[\s,.:;]')
+
 def normalize_str(str):
   str = unidecode(str).lower()
-  return re.sub(r'[\s,.:;]', '', str)
+  return NORMALIZE_PATTERN.sub('', str)
 
 def str_in_text(str, content) -> int:
   str = normalize_str(str)
@@ -42,6 +47,14 @@ def str_in_text(str, content) -> int:
   occurrences = re.findall(re.escape(str), content)
   return len(occurrences)
 
+def mentions_matcher(strs: List[str]) -> AhoCorasick:
+  """ Matcher for the normalized <strs>, run it over normalize_str(content) """
+  return AhoCorasick([normalize_str(str) for str in strs])
+
+def mentions_in_text(strs: List[str], content: str) -> List[int]:
+  """ Same as [str_in_text(str, content) for str in strs] normalizing <content> once and scanning it once """
+  return mentions_matcher(strs).counts(normalize_str(content))
+
 def split_text(text: str, max_length: int) -> List[str]:
   """ Split text into balanced sized chunks when <text> exceeds <max_length> characters """
   sentences = text.split('. ')
@@ -50,18 +63,68 @@ def split_text(text: str, max_length: int) -> List[str]:
   # Calculate the approximate length of each chunk
   approx_chunk_length = len(text) // num_chunks
   chunks = []
-  current_chunk = ""
+  # sentences of the current chunk, joined once when the chunk is complete
+  current_chunk = []
   current_length = 0
   for sentence in sentences:
     sentence_length = len(sentence) + 2  # Account for the dot and space
     if current_length + sentence_length > approx_chunk_length and len(chunks) < num_chunks - 1:
-      chunks.append(current_chunk.strip())
-      current_chunk = sentence + ". "
+      chunks.append(join_sentences(current_chunk))
+      current_chunk = [sentence]
       current_length = sentence_length
     else:
-      current_chunk += sentence + ". "
+      current_chunk.append(sentence)
       current_length += sentence_length
   # Append the last chunk if it's not empty
-  if current_chunk.strip():
-    chunks.append(current_chunk.strip())
-  return chunks
\ No newline at end of file
+  last_chunk = join_sentences(current_chunk)
+  if last_chunk:
+    chunks.append(last_chunk)
+  return chunks
+
+def join_sentences(sentences: List[str]) -> str:
+  return ". ".join(sentences + ['']).strip()
+
+# GLiNER's word splitter, its max_len limit counts these tokens
+WORD_PATTERN = re.compile(r'\w+(?:[-_]\w+)*|\S')
+SENTENCE_END_PATTERN = re.compile(r'[.!?;\n]')
+
+def word_spans(text: str) -> List[tuple[int, int]]:
+  return [match.span() for match in WORD_PATTERN.finditer(text)]
+
+def chunk_text(
+  text: str,
+  max_tokens: int,
+  overlap: int = 0,
+  tokenize: Callable[[str], List[tuple[int, int]]] = word_spans
+) -> Iterator[str]:
+  """
+    Yields slices of <text> of at most <max_tokens> tokens, as counted by <tokenize> (text -> token
+    spans). Chunks end at the last sentence end that fits and are only cut mid-sentence when a
+    sentence alone is longer than <max_tokens>. A chunk cut mid-sentence is followed by one that
+    repeats its last <overlap> tokens, so names split by the cut are seen whole. Runs in linear
+    time: the text is tokenized once and chunks are slices of it, never concatenations.
+
+    Chunks are cut greedily from the start, so editing the text leaves the chunks before the
+    edit unchanged.
+  """
+  spans = tokenize(text)
+  count = len(spans)
+  if count == 0:
+    return
+  overlap = max(0, min(overlap, max_tokens - 1))
+  starts = [span[0] for span in spans]
+  sentence_ends = [match.start() for match in SENTENCE_END_PATTERN.finditer(text)]
+  first = 0
+  while first < count:
+    last = min(first + max_tokens, count)
+    next_first = last
+    if last < count:
+      # last sentence end before token <last>, the chunk ends with the token holding or preceding it
+      index = bisect_left(sentence_ends, starts[last]) - 1
+      if index >= 0 and sentence_ends[index] >= starts[first]:
+        last = bisect_right(starts, sentence_ends[index])
+        next_first = last
+      else:
+        next_first = last - overlap
+    yield text[spans[first][0]:spans[last - 1][1]]
+    first = next_first
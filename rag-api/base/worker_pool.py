@@ -0,0 +1,61 @@
+import threading
+import multiprocessing
+from typing import Any, Callable
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from base.logger import warn
+
+"""
+  Pool of <workers> processes, each started with <initializer>(*initargs) so it can load a model
+  once and keep it. Processes are spawned, not forked, so they don't inherit the server's
+  threads or sockets, but each imports the main module again (as __mp_main__): keep it light,
+  with the work under its __main__ guard. A pool whose worker died (e.g. killed for memory) is
+  replaced on the next call instead of failing every call after it.
+"""
+
+class WorkerPool:
+  def __init__(self, workers: int, initializer: Callable = None, initargs: tuple = ()) -> None:
+    self.workers = workers
+    self.initializer = initializer
+    self.initargs = initargs
+    self.restarts = 0
+    self._executor = None
+    self._lock = threading.Lock()
+
+  def _get_executor(self) -> ProcessPoolExecutor:
+    with self._lock:
+      if self._executor is None:
+        self._executor = ProcessPoolExecutor(
+          max_workers=self.workers,
+          mp_context=multiprocessing.get_context('spawn'),
+          initializer=self.initializer,
+          initargs=self.initargs
+        )
+      return self._executor
+
+  def _replace_executor(self, broken: ProcessPoolExecutor) -> None:
+    with self._lock:
+      if self._executor is broken:
+        self._executor = None
+        self.restarts += 1
+    broken.shutdown(wait=False, cancel_futures=True)
+
+  def run(self, func: Callable, *args) -> Any:
+    """ Runs func(*args) in one of the workers and waits for its result """
+    executor = self._get_executor()
+    try:
+      return executor.submit(func, *args).result()
+    except BrokenProcessPool:
+      warn('Worker pool is broken, starting new workers')
+      self._replace_executor(executor)
+      raise
+
+  def stats(self) -> dict:
+    return { 'workers': self.workers, 'started': self._executor is not None, 'restarts': self.restarts }
+
+  def close(self) -> None:
+    with self._lock:
+      executor = self._executor
+      self._executor = None
+    if executor is not None:
+      executor.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,106 @@
+import json
+import time
+import inspect
+import random
+import argparse
+import tracemalloc
+from flask import Flask
+from flask import json as flask_json
+from base.serialize import to_serializable
+from entities.article_location import ArticleLocation
+from entities.article_location import ALL_TYPES_BY_RANK
+"""
+  ArticleLocation before and after slotting it: memory per location, construction time and the
+  time to serialize a response as index.py does (flask's json within the app, sorted keys) and
+  with the stdlib json (declaration order). Checks the serialized bytes are identical.
+
+  Usage: python -m benchmarks.bench_article_location --count 20000
+"""
+TYPES = ['country', 'state', 'city', 'town', 'village', 'hamlet']
+
+class DictArticleLocation(dict):
+  """ ArticleLocation as the dict subclass with reflected properties it was before slotting it """
+  def __init__(self, fields: dict = None) -> None:
+    fields = fields or {}
+    for field in ['place_id', 'osm_type', 'osm_id', 'continent', 'country', 'state', 'region', 'province', 'county', 'city',
+        'municipality', 'island', 'town', 'borough', 'village', 'suburb', 'hamlet', 'rank_address', 'lat', 'lon']:
+      setattr(self, field, fields.get(field, ''))
+    super().__init__(self.__dict__)
+
+  def __getitem__(self, key):
+    if hasattr(self.__class__, key) and isinstance(getattr(self.__class__, key), property):
+      return getattr(self, key)
+    return super().__getitem__(key)
+
+  def __iter__(self):
+    for key in super().__iter__():
+      yield key
+    for name, value in inspect.getmembers(self.__class__, lambda v: isinstance(v, property)):
+      yield name
+
+  def items(self):
+    for key, value in super().items():
+      yield key, value
+    for name, value in inspect.getmembers(self.__class__, lambda v: isinstance(v, property)):
+      yield name, getattr(self, name)
+
+  @property
+  def name(self) -> str:
+    for place in ALL_TYPES_BY_RANK:
+      name = getattr(self, place, None)
+      if name:
+        return name
+
+  @property
+  def id(self) -> str:
+    t = self.osm_type[0].upper() if self.osm_type else ''
+    return f"{t}{self.osm_id}"
+
+def random_fields(i: int, rand: random.Random) -> dict:
+  fields = { 'place_id': 100000 + i, 'osm_type': rand.choice(['relation', 'node', 'way']), 'osm_id': 5000000 + i }
+  for type in TYPES[:rand.randint(1, len(TYPES))]:
+    fields[type] = f"{type.capitalize()} Ñandú {rand.randint(1, 500)}"
+  fields['rank_address'] = rand.randint(4, 20)
+  fields['lat'] = f"{rand.uniform(14, 32):.7f}"
+  fields['lon'] = f"{rand.uniform(-118, -86):.7f}"
+  return fields
+
+def build(cls, fields_list) -> tuple[list, float, int]:
+  tracemalloc.start()
+  start = time.perf_counter()
+  locations = [cls(fields) for fields in fields_list]
+  elapsed = time.perf_counter() - start
+  size, _ = tracemalloc.get_traced_memory()
+  tracemalloc.stop()
+  return locations, elapsed, size
+
+def serialize(dumps, batches) -> tuple[list[str], float]:
+  start = time.perf_counter()
+  results = [dumps(batch) for batch in batches]
+  return results, time.perf_counter() - start
+
+def main(args):
+  rand = random.Random(args.seed)
+  fields_list = [random_fields(i, rand) for i in range(args.count)]
+  before, before_time, before_size = build(DictArticleLocation, fields_list)
+  after, after_time, after_size = build(ArticleLocation, fields_list)
+  print(f"build   dict {before_time * 1000:8.1f} ms {before_size / args.count:6.0f} B/location, slots {after_time * 1000:8.1f} ms {after_size / args.count:6.0f} B/location")
+  # responses of <batch> locations
+  batches = lambda locations: [locations[i:i + args.batch] for i in range(0, len(locations), args.batch)]
+  app = Flask(__name__)
+  for label, before_dumps, after_dumps in [
+    ('flask', lambda batch: flask_json.dumps(batch, ensure_ascii=False), lambda batch: flask_json.dumps(batch, ensure_ascii=False, default=to_serializable)),
+    ('json', lambda batch: json.dumps(batch, ensure_ascii=False), lambda batch: json.dumps(batch, ensure_ascii=False, default=to_serializable)),
+  ]:
+    with app.app_context():
+      before_json, before_time = serialize(before_dumps, batches(before))
+      after_json, after_time = serialize(after_dumps, batches(after))
+    mismatches = sum(old != new for old, new in zip(before_json, after_json))
+    print(f"{label:<7} dict {before_time * 1000:8.1f} ms, slots {after_time * 1000:8.1f} ms ({before_time / after_time:5.1f}x), mismatches: {mismatches}")
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser(description='ArticleLocation memory and serialization benchmark')
+  parser.add_argument('--count', type=int, default=20000)
+  parser.add_argument('--batch', type=int, default=10, help='Locations per response')
+  parser.add_argument('--seed', type=int, default=7)
+  main(parser.parse_args())
@@ -0,0 +1,109 @@
+import os
+import json
+import time
+import random
+import argparse
+import tempfile
+from thefuzz import fuzz
+from thefuzz import process
+from base.fuzzy_search import FuzzySearch
+from base.fuzzy_snapshot import write_snapshot
+from base.fuzzy_snapshot import load_snapshot
+"""
+  Compares FuzzySearch.search and FuzzySearch.search_many against the linear process.extractOne
+  scan they replaced, over the gazetteer in storage/locations_map.json (or a synthetic one when
+  it's missing) and checks all of them return the same type/value results. Also times loading
+  the indexes back from a snapshot file against building them.
+
+  Usage: python -m benchmarks.bench_fuzzy_search --queries 300
+"""
+LOCATIONS_MAP_FILE = 'storage/locations_map.json'
+SYLLABLES = ['san', 'ta', 'ma', 'ri', 'a', 'jo', 'sé', 'del', 'pe', 'dro', 'gua', 'da', 'la', 'ja', 'ra', 'te', 'pec', 'zin', 'co', 'mo', 'tla']
+TYPE_SIZES = { 'country': 3, 'state': 32, 'city': 2500, 'borough': 500, 'town': 4000, 'village': 20000, 'hamlet': 15000 }
+
+def synthetic_name(rand: random.Random) -> str:
+  words = [''.join(rand.choice(SYLLABLES) for _ in range(rand.randint(2, 4))) for _ in range(rand.randint(1, 3))]
+  return ' '.join(word.capitalize() for word in words)
+
+def load_gazetteer(rand: random.Random) -> dict:
+  try:
+    with open(LOCATIONS_MAP_FILE, 'r', encoding='utf-8') as file:
+      return json.load(file)
+  except FileNotFoundError:
+    print(f"{LOCATIONS_MAP_FILE} not found, using a synthetic gazetteer")
+    return { type: [synthetic_name(rand) for _ in range(size)] for type, size in TYPE_SIZES.items() }
+
+def perturb(name: str, rand: random.Random) -> str:
+  chars = list(name)
+  if chars and rand.random() < 0.5:
+    chars.pop(rand.randrange(len(chars)))
+  if rand.random() < 0.5:
+    chars.insert(rand.randrange(len(chars) + 1), rand.choice('aeiou'))
+  return ''.join(chars)
+
+def linear_search(collections: dict, keyword: str, min_score: int = 97) -> list:
+  """ FuzzySearch.search before the index """
+  results = []
+  for c_type, items in collections.items():
+    match = process.extractOne(keyword, items, scorer=fuzz.token_sort_ratio)
+    if match and int(match[1] or 0) >= min_score:
+      results.append({ 'type': c_type, 'value': match[0] })
+  return results
+
+def main(args):
+  rand = random.Random(args.seed)
+  gazetteer = load_gazetteer(rand)
+  names = [name for items in gazetteer.values() for name in items if name]
+  keywords = []
+  for _ in range(args.queries):
+    roll = rand.random()
+    name = rand.choice(names)
+    keywords.append(name if roll < 0.4 else perturb(name, rand) if roll < 0.8 else synthetic_name(rand))
+
+  start = time.perf_counter()
+  search = FuzzySearch()
+  for type, items in gazetteer.items():
+    search.add(type, items)
+  build_time = time.perf_counter() - start
+
+  with tempfile.TemporaryDirectory() as directory:
+    path = os.path.join(directory, 'locations_map.snapshot')
+    write_snapshot(path, search.indexes)
+    start = time.perf_counter()
+    _, indexes = load_snapshot(path)
+    snapshot_search = FuzzySearch()
+    for type, index in indexes.items():
+      snapshot_search.add_index(type, index)
+    load_time = time.perf_counter() - start
+    snapshot_size = os.path.getsize(path)
+    snapshot = [snapshot_search.search(keyword, args.min_score) for keyword in keywords]
+
+  start = time.perf_counter()
+  indexed = [search.search(keyword, args.min_score) for keyword in keywords]
+  indexed_time = time.perf_counter() - start
+
+  start = time.perf_counter()
+  batched = search.search_many(keywords, args.min_score)
+  batched_time = time.perf_counter() - start
+
+  start = time.perf_counter()
+  linear = [linear_search(gazetteer, keyword, args.min_score) for keyword in keywords]
+  linear_time = time.perf_counter() - start
+
+  mismatches = [(keyword, a, b, c, d) for keyword, a, b, c, d in zip(keywords, linear, indexed, batched, snapshot) if not a == b == c == d]
+  print(f"gazetteer: {len(names)} names in {len(gazetteer)} collections, {len(keywords)} queries, min_score {args.min_score}")
+  print(f"index build: {build_time * 1000:9.1f} ms")
+  print(f"   snapshot: {load_time * 1000:9.1f} ms load, {snapshot_size / 1e6:.1f} MB")
+  print(f"    indexed: {indexed_time * 1000:9.1f} ms ({indexed_time / len(keywords) * 1e6:8.1f} us/query)")
+  print(f"    batched: {batched_time * 1000:9.1f} ms ({batched_time / len(keywords) * 1e6:8.1f} us/query)")
+  print(f"     linear: {linear_time * 1000:9.1f} ms ({linear_time / len(keywords) * 1e6:8.1f} us/query)")
+  print(f"    speedup: {linear_time / indexed_time:.1f}x indexed, {linear_time / batched_time:.1f}x batched, mismatches: {len(mismatches)}")
+  for mismatch in mismatches[:10]:
+    print(f"  {mismatch}")
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser(description='FuzzySearch benchmark')
+  parser.add_argument('--queries', type=int, default=300)
+  parser.add_argument('--min-score', type=int, default=97)
+  parser.add_argument('--seed', type=int, default=7)
+  main(parser.parse_args())
@@ -0,0 +1,105 @@
+import json
+import time
+import random
+import argparse
+from base.json_parse import JSONExtractor
+from base.json_parse import try_parse_json
+"""
+  JSON extraction from LLM output: throughput on large responses, in one piece and streamed in
+  small chunks, against the previous two pass extraction (which didn't skip brackets inside
+  strings), and on output full of stray brackets. Correctness is fuzzed in tests/test_json_parse.py.
+
+  Usage: python -m benchmarks.bench_json_parse --sizes 100000 1000000 10000000
+"""
+
+def previous_try_parse_json(json_str):
+  """ try_parse_json before the incremental extractor """
+  def extract(input_str, token_start, token_end):
+    stack = []
+    start_index = None
+    for i, char in enumerate(input_str):
+      if char == token_start:
+        stack.append(char)
+        if len(stack) == 1:
+          start_index = i
+      elif char == token_end and stack:
+        stack.pop()
+        if len(stack) == 0 and start_index is not None:
+          return input_str[start_index:i + 1]
+    return None
+  def try_extract(input_str, token_start, token_end):
+    try:
+      json_str = extract(input_str, token_start, token_end)
+      json.loads(json_str)
+      return json_str
+    except:
+      return ''
+  try:
+    json_str_1 = try_extract(json_str, '{', '}')
+    json_str_2 = try_extract(json_str, '[', ']')
+    return json.loads(json_str_1 if len(json_str_1) > len(json_str_2) else json_str_2)
+  except json.JSONDecodeError:
+    return None
+
+def random_chunks(text: str, rand: random.Random) -> list[str]:
+  chunks = []
+  pos = 0
+  while pos < len(text):
+    size = rand.randint(1, 8)
+    chunks.append(text[pos:pos + size])
+    pos += size
+  return chunks
+
+def large_response(size: int, rand: random.Random) -> str:
+  items = []
+  length = 0
+  while length < size:
+    item = json.dumps({ 'nombre': f"Lugar {{{rand.randint(1, 10 ** 6)}}}", 'tipo': rand.choice(['ciudad', 'estado']), 'valores': [rand.random() for _ in range(3)] }, ensure_ascii=False)
+    items.append(item)
+    length += len(item) + 2
+  return 'Aquí está la respuesta:\n```json\n[' + ', '.join(items) + ']\n```\nEspero que ayude.'
+
+def measure(func, text: str) -> float:
+  start = time.perf_counter()
+  func(text)
+  return time.perf_counter() - start
+
+def throughput(sizes: list[int], rand: random.Random) -> None:
+  for size in sizes:
+    text = large_response(size, rand)
+    chunks = random_chunks(text, rand)
+    def streamed(text):
+      extractor = JSONExtractor()
+      for chunk in chunks:
+        if extractor.feed(chunk) is not None:
+          break
+      return extractor.finish()
+    mb = len(text) / 1e6
+    timings = [
+      ('previous', measure(previous_try_parse_json, text)),
+      ('extractor', measure(try_parse_json, text)),
+      ('streamed', measure(streamed, text)),
+    ]
+    print(f"{len(text):9} chars: " + ', '.join(f"{name} {mb / elapsed:6.1f} MB/s" for name, elapsed in timings) + f" ({len(chunks)} chunks)")
+
+def stray_brackets(counts: list[int]) -> None:
+  """ Prose with <count> brackets that never close before the value """
+  for count in counts:
+    for label, text in [
+      ('nested', '{' * count + '{"a": 1}'),
+      ('prose', 'usa { para abrir, ' * count + '{"a": 1}'),
+    ]:
+      elapsed = measure(try_parse_json, text)
+      print(f"{count:6} stray brackets ({label}): {elapsed * 1000:8.1f} ms, found: {try_parse_json(text) == { 'a': 1 }}")
+
+def main(args):
+  rand = random.Random(args.seed)
+  throughput(args.sizes, rand)
+  stray_brackets(args.stray)
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser(description='JSON extraction throughput benchmark')
+  parser.add_argument('--stray', type=int, nargs='+', default=[100, 1000, 5000])
+  parser.add_argument('--sizes', type=int, nargs='+', default=[100000, 1000000, 10000000])
+  parser.add_argument('--seed', type=int, default=7)
+  main(parser.parse_args())
@@ -0,0 +1,68 @@
+import time
+import random
+import argparse
+import jmespath
+from base.json_search import JSONSearch
+from prompts.article_geo_location import DEFAULT_FIELDS_EXPRESSIONS
+"""
+  JSONSearch.search before and after compiling expressions once and resolving dotted paths
+  without jmespath, on the searches geo_location_from_results and related_location_from_params
+  run per result (fields of a /search result and the rank filters of /details). Checks both
+  return the same values.
+
+  Usage: python -m benchmarks.bench_json_search --results 2000
+"""
+RESULT_PATHS = [
+  'place_id', 'osm_type', 'osm_id', 'lat', 'lon', 'place_rank', 'address.continent', 'address.country', 'address.state',
+  'address.region', 'address.province', 'address.county', 'address.city', 'address.municipality', 'address.island',
+  'address.town', 'address.borough', 'address.village', 'address.suburb', 'address.hamlet', 'address.city.name', 'missing.field',
+]
+TYPES = [('country', 4), ('state', 8), ('county', 12), ('city', 16), ('town', 18), ('suburb', 19)]
+
+def random_result(i: int, rand: random.Random) -> dict:
+  parts = TYPES[:rand.randint(1, len(TYPES))]
+  return {
+    'place_id': i,
+    'osm_type': rand.choice(['relation', 'node', 'way']),
+    'osm_id': 1000 + i,
+    'lat': f"{rand.uniform(14, 32):.7f}",
+    'lon': f"{rand.uniform(-118, -86):.7f}",
+    'place_rank': parts[-1][1],
+    'address': { type: f"{type} {rand.randint(1, 99)}" for type, _ in parts },
+  }
+
+def random_details(i: int, rand: random.Random) -> dict:
+  parts = TYPES[:rand.randint(1, len(TYPES))]
+  return {
+    'place_id': i,
+    'rank_address': parts[-1][1],
+    'address': [{ 'localname': f"{type} {rand.randint(1, 99)}", 'rank_address': rank, 'isaddress': rand.random() < 0.9 } for type, rank in parts],
+  }
+
+def measure(func, documents, expressions) -> tuple[float, list]:
+  start = time.perf_counter()
+  values = [func(document, expression) for document in documents for expression in expressions]
+  return time.perf_counter() - start, values
+
+def main(args):
+  rand = random.Random(args.seed)
+  results = [random_result(i, rand) for i in range(args.results)] + [[], [random_result(0, rand)]]
+  details = [random_details(i, rand) for i in range(args.results)]
+  for label, documents, expressions in [
+    ('result fields', results, RESULT_PATHS + ['@']),
+    ('rank filters', details, list(DEFAULT_FIELDS_EXPRESSIONS.values())),
+  ]:
+    searches = [JSONSearch(document) for document in documents]
+    before_time, before = measure(lambda search, expression: jmespath.search(expression, search.json_data), searches, expressions)
+    after_time, after = measure(lambda search, expression: search.search(expression), searches, expressions)
+    mismatches = sum(old != new for old, new in zip(before, after))
+    calls = len(before)
+    print(f"{label:<14} jmespath {before_time / calls * 1e6:6.2f} us, compiled {after_time / calls * 1e6:6.2f} us per search ({before_time / after_time:5.1f}x), mismatches: {mismatches}")
+  empty_mismatches = sum((len(jmespath.search('@', search.json_data)) == 0) != search.empty for search in map(JSONSearch, results))
+  print(f"empty mismatches: {empty_mismatches}")
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser(description='JSONSearch benchmark')
+  parser.add_argument('--results', type=int, default=2000)
+  parser.add_argument('--seed', type=int, default=7)
+  main(parser.parse_args())
@@ -0,0 +1,88 @@
+import time
+import random
+import argparse
+from entities.article_location import ArticleLocation
+from prompts.location_tree import LocationTree
+"""
+  filter_unmentioned_locations before and after indexing LocationTree. The previous tree scanned
+  every location for each get_children call and the filter removed while iterating and recursed.
+  Runs both on a seeded corpus of random location hierarchies with random mentions, checks the
+  kept locations are identical (same objects, same order) and reports the time of each.
+
+  Usage: python -m benchmarks.bench_location_tree --cases 2000 --sizes 10 50 200 1000
+"""
+# (type, rank_address) from the highest level down
+LEVELS = [('country', 4), ('state', 8), ('county', 12), ('city', 16), ('town', 18), ('suburb', 19), ('village', 19), ('hamlet', 20)]
+NAMES = ['San Juan', 'Santa María', 'Guadalupe', 'Jalisco', 'Colima', 'Reforma', 'Centro', 'Juárez', 'Morelos', 'Hidalgo']
+
+class ListLocationTree:
+  """ LocationTree before indexing """
+  def __init__(self, locations):
+    self.locations = locations or []
+
+  def get_children(self, location):
+    return [loc for loc in self.locations if self.is_location_child_of(loc, location)]
+
+  def is_location_child_of(self, location, parent):
+    loc_type = parent.get_lower_rank_type()
+    return location.rank_address > parent.rank_address and location[loc_type] == parent[loc_type]
+
+def list_filter(mentioned, locations):
+  """ filter_unmentioned_locations before indexing """
+  tree = ListLocationTree(locations)
+  removals = 0
+  for location in tree.locations:
+    if not mentioned(location) and len(tree.get_children(location)) == 0:
+      tree.locations.remove(location)
+      removals += 1
+  if removals > 0:
+    return list_filter(mentioned, tree.locations)
+  return tree.locations
+
+def tree_filter(mentioned, locations):
+  tree = LocationTree(locations)
+  tree.prune(mentioned)
+  return tree.locations
+
+def random_case(size: int, rand: random.Random):
+  """ <size> locations under a few countries, each one filled in with the fields of a random ancestor """
+  locations = []
+  for i in range(size):
+    depth = rand.randrange(len(LEVELS))
+    parent = rand.choice(locations) if locations and rand.random() < 0.8 else None
+    fields = { 'osm_type': 'relation', 'osm_id': str(i) }
+    for type, _ in LEVELS[:depth]:
+      fields[type] = (parent.get(type) if parent else '') or rand.choice(NAMES)
+    type, rank = LEVELS[depth]
+    fields[type] = rand.choice(NAMES) + ('' if rand.random() < 0.3 else f" {i}")
+    fields['rank_address'] = rank
+    locations.append(ArticleLocation(fields))
+  rand.shuffle(locations)
+  mentioned_names = { location.name for location in locations if rand.random() < 0.3 }
+  return locations, lambda location: location.name in mentioned_names
+
+def main(args):
+  rand = random.Random(args.seed)
+  for size in args.sizes:
+    cases = [random_case(size, rand) for _ in range(max(1, args.cases * 10 // size))]
+    timings = {}
+    results = {}
+    for name, func in [('list', list_filter), ('tree', tree_filter)]:
+      start = time.perf_counter()
+      results[name] = [func(mentioned, list(locations)) for locations, mentioned in cases]
+      timings[name] = time.perf_counter() - start
+    mismatches = sum(
+      [id(loc) for loc in before] != [id(loc) for loc in after] for before, after in zip(results['list'], results['tree'])
+    )
+    kept = sum(map(len, results['tree'])) / (len(cases) * size)
+    print(
+      f"{size:6} locations x {len(cases):5} cases: list {timings['list'] * 1000:9.1f} ms, tree {timings['tree'] * 1000:9.1f} ms "
+      f"({timings['list'] / timings['tree']:6.1f}x), kept {kept:.0%}, mismatches: {mismatches}"
+    )
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser(description='LocationTree filtering benchmark')
+  parser.add_argument('--sizes', type=int, nargs='+', default=[10, 50, 200, 1000])
+  parser.add_argument('--cases', type=int, default=2000, help='Cases of 10 locations, fewer for larger sizes')
+  parser.add_argument('--seed', type=int, default=7)
+  main(parser.parse_args())
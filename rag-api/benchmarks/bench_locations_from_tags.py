@@ -0,0 +1,71 @@
+import os
+import time
+import asyncio
+import argparse
+import tempfile
+"""
+  Measures locations_from_tags latency against the local Nominatim stub (stubs/nominatim_stub.py),
+  running the Nominatim lookups serially (MAX_CONCURRENT_LOOKUPS = 1) and concurrently, one
+  article at a time and all of them in one locations_from_tags_batch call.
+
+  Usage: python -m benchmarks.bench_locations_from_tags --latency 0.02 --rounds 3
+"""
+
+ARTICLES_TAGS = [
+  [{ 'Pais': 'México' }, { 'Estado': 'Jalisco' }, { 'Ciudad': 'Guadalajara' }, { 'Ciudad': 'Zapopan' }, { 'Municipio': 'Puerto Vallarta' }],
+  [{ 'Estado': 'Yucatán' }, { 'Ciudad': 'Mérida' }, { 'Ciudad': 'Valladolid' }, { 'Ciudad': 'Progreso' }],
+  [{ 'Pais': 'México' }, { 'Estado': 'Nuevo León' }, { 'Ciudad': 'Monterrey' }, { 'Municipio': 'Apodaca' }],
+]
+TYPES_BY_LABEL = { 'Pais': 'country', 'Estado': 'state', 'Ciudad': 'city', 'Municipio': 'city' }
+
+async def run(args):
+  from stubs.nominatim_stub import start_stub
+  from base import request
+  from entities.location_tags import LocationTags
+  from prompts import article_geo_location
+
+  class TypedLocationTags(LocationTags):
+    """ Skips the gazetteer classification, tags are typed from their NER label """
+    async def get_tags(self):
+      return [{ TYPES_BY_LABEL[label]: name } for tag in self._tags for label, name in tag.items()]
+
+  stub, runner = await start_stub(args.port, args.latency)
+  try:
+    timings = {}
+    for mode, limit, batch in [('serial', 1, False), ('concurrent', args.limit, False), ('batch', args.limit, True)]:
+      article_geo_location.MAX_CONCURRENT_LOOKUPS = limit
+      timings[mode] = []
+      for _ in range(args.rounds):
+        # every round starts with an empty cache so all lookups hit the stub
+        request.CACHE_DIR = tempfile.mkdtemp(prefix='bench-cache-')
+        request.memory_cache.clear()
+        article_geo_location.query_cache.memory.clear()
+        stub.calls.clear()
+        start = time.perf_counter()
+        if batch:
+          await article_geo_location.locations_from_tags_batch([TypedLocationTags(tags) for tags in ARTICLES_TAGS])
+        else:
+          for tags in ARTICLES_TAGS:
+            await article_geo_location.locations_from_tags(TypedLocationTags(tags))
+        timings[mode].append(time.perf_counter() - start)
+      calls = ', '.join(f"{endpoint} {count}" for endpoint, count in sorted(stub.calls.items()))
+      avg = sum(timings[mode]) / len(timings[mode])
+      print(f"{mode:>10}: {avg * 1000:8.1f} ms per {len(ARTICLES_TAGS)} articles (stub calls per round: {calls})")
+    speedup = sum(timings['serial']) / sum(timings['concurrent'])
+    print(f"   speedup: {speedup:.2f}x")
+  finally:
+    await runner.cleanup()
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser(description='locations_from_tags latency benchmark')
+  parser.add_argument('--port', type=int, default=18080)
+  parser.add_argument('--latency', type=float, default=0.02, help='Stub latency per request in seconds')
+  parser.add_argument('--rounds', type=int, default=3)
+  parser.add_argument('--limit', type=int, default=8, help='MAX_CONCURRENT_LOOKUPS for the concurrent run')
+  args = parser.parse_args()
+  # the provider reads its host and port on import
+  os.environ['NOMINATIM_HOST'] = '127.0.0.1'
+  os.environ['NOMINATIM'] = str(args.port)
+  # resolved queries are only kept in memory, cleared every round
+  os.environ['LOCATIONS_CACHE_PERSIST'] = '0'
+  asyncio.run(run(args))
@@ -0,0 +1,56 @@
+import os
+import time
+import asyncio
+import argparse
+"""
+  ollama_geo_tag.geo_tag_content against the Ollama stub (stubs/ollama_stub.py): both prompts
+  streamed concurrently and stopped at the first complete JSON answer, against running them one
+  after the other until the model is done as before. Reports latency, tokens generated and the
+  generations cut short, and checks the answers are the same.
+
+  Usage: python -m benchmarks.bench_ollama_geo_tag --token-latency 0.01
+"""
+ARTICLE = "Las lluvias de la tarde provocaron inundaciones en Mérida y Progreso, Yucatán. En Valladolid se reportaron árboles caídos."
+
+async def sequential_geo_tag(content: str) -> list:
+  """ geo_tag_content before streaming, one prompt after the other until done """
+  from base.json_parse import try_parse_json
+  from providers.ollama_provider import generate
+  from prompts.ollama_geo_tag import build_prompt_country
+  from prompts.ollama_geo_tag import build_prompt_administrative
+  country = try_parse_json(await generate(build_prompt_country(content)))
+  state = try_parse_json(await generate(build_prompt_administrative(content, 'estado', 'Mexico')))
+  return [country, state]
+
+async def run(args):
+  from stubs.ollama_stub import start_stub
+  from prompts.ollama_geo_tag import geo_tag_content
+  stub, runner = await start_stub(args.port, args.token_latency)
+  try:
+    answers = {}
+    for mode in ['sequential', 'concurrent']:
+      stub.calls.clear()
+      start = time.perf_counter()
+      for _ in range(args.rounds):
+        if mode == 'sequential':
+          answers[mode] = await sequential_geo_tag(ARTICLE)
+        else:
+          answers[mode] = (await geo_tag_content(ARTICLE))._tags
+      elapsed = (time.perf_counter() - start) / args.rounds
+      # let the stub notice the last disconnections
+      await asyncio.sleep(args.token_latency * 5)
+      print(f"{mode:>10}: {elapsed * 1000:8.1f} ms per article, {stub.calls['tokens'] // args.rounds} tokens, {stub.calls['disconnected'] // args.rounds} stopped early")
+    print(f"answers: {answers['concurrent']}, same as sequential: {answers['sequential'] == answers['concurrent']}")
+  finally:
+    await runner.cleanup()
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser(description='Ollama geo tagging benchmark')
+  parser.add_argument('--port', type=int, default=18434)
+  parser.add_argument('--token-latency', type=float, default=0.01, help='Stub delay per streamed token in seconds')
+  parser.add_argument('--rounds', type=int, default=3)
+  args = parser.parse_args()
+  # the provider reads its host and port on import
+  os.environ['OLLAMA_HOST'] = '127.0.0.1'
+  os.environ['OLLAMA_PORT'] = str(args.port)
+  asyncio.run(run(args))
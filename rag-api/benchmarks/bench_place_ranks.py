@@ -0,0 +1,108 @@
+import sys
+import time
+import random
+import argparse
+from entities.location_relation import LocationRelation
+from providers.overpass_provider import PLACE_TYPES_BY_RANK
+from providers.overpass_provider import higher_ranked_place_types
+from providers.overpass_provider import lower_ranked_place_types
+from providers.overpass_provider import is_type_rank_greater_than
+from prompts.article_geo_location import relations_from_parent
+"""
+  Relation generation (relations_from_parent) before and after precomputing the rank tables of
+  overpass_provider. Previously every rank lookup rebuilt the list of ranks and scanned it, and the
+  (type, name) tuples were rebuilt for each parent/child pair. Checks both produce the same
+  relations, and that the lookup functions answer the same as before for every place type.
+
+  Usage: python -m benchmarks.bench_place_ranks --locations 5 20 100
+"""
+NAMES = ['Jalisco', 'Guadalajara', 'Zapopan', 'Tlaquepaque', 'Colima', 'Manzanillo', 'Tequila', 'Ajijic', 'Chapala', 'Tonalá']
+TAGGED_TYPES = ['country', 'state', 'city', 'town', 'borough', 'village', 'hamlet']
+
+def list_place_ranks():
+  return [
+    { 'rank_from': 1, 'rank_to': 3, 'values': ['continent', 'ocean'] },
+    { 'rank_from': 4, 'rank_to': 4, 'values': ['country'] },
+    { 'rank_from': 5, 'rank_to': 9, 'values': ['state', 'region', 'province'] },
+    { 'rank_from': 10, 'rank_to': 12, 'values': ['county'] },
+    { 'rank_from': 13, 'rank_to': 16, 'values': ['city', 'municipality', 'island'] },
+    { 'rank_from': 17, 'rank_to': 18, 'values': ['town', 'borough'] },
+    { 'rank_from': 19, 'rank_to': 19, 'values': ['village', 'suburb'] },
+    { 'rank_from': 20, 'rank_to': 20, 'values': ['hamlet', 'farm', 'neighbourhood'] },
+    { 'rank_from': 21, 'rank_to': 25, 'values': ['isolated_dwelling', 'city_block'] }
+  ]
+
+def list_ranked_place_types(rank_from, rank_to):
+  result = []
+  for rank in list_place_ranks():
+    if rank['rank_from'] >= rank_from and rank['rank_to'] <= rank_to:
+      result += rank['values']
+  return result
+
+def list_higher_ranked_place_types(place_type):
+  place_rank = next((rank for rank in list_place_ranks() if place_type in rank['values']), None)
+  return list_ranked_place_types(0, place_rank['rank_from'] - 1) if place_rank else []
+
+def list_lower_ranked_place_types(place_type):
+  place_rank = next((rank for rank in list_place_ranks() if place_type in rank['values']), None)
+  return list_ranked_place_types(place_rank['rank_to'] + 1, sys.maxsize) if place_rank else []
+
+def list_is_type_rank_greater_than(place_left, place_right):
+  ranks = list_place_ranks()
+  rank_left = next((rank for rank in ranks if place_left in rank['values']), None)
+  rank_right = next((rank for rank in ranks if place_right in rank['values']), None)
+  if not rank_left or not rank_right:
+    return False
+  return rank_left['rank_from'] > rank_right['rank_from']
+
+def list_relations_from_parent(locations, parent_type):
+  """ relations_from_parent before the rank tables """
+  relations = []
+  parent_locs = [loc for loc in locations if parent_type in loc]
+  for loc_type in list_lower_ranked_place_types(parent_type):
+    child_locs = [loc for loc in locations if loc_type in loc]
+    for parent in parent_locs:
+      for child in child_locs:
+        p_tuple = next(iter(parent.items()))
+        c_tuple = next(iter(child.items()))
+        relations.append(LocationRelation(p_tuple, c_tuple))
+  return set(relations)
+
+def check_lookups() -> int:
+  mismatches = 0
+  types = list(PLACE_TYPES_BY_RANK) + ['unknown']
+  for left in types:
+    mismatches += list(higher_ranked_place_types(left)) != list_higher_ranked_place_types(left)
+    mismatches += list(lower_ranked_place_types(left)) != list_lower_ranked_place_types(left)
+    for right in types:
+      mismatches += is_type_rank_greater_than(left, right) != list_is_type_rank_greater_than(left, right)
+  return mismatches
+
+def measure(func, cases, repeat) -> tuple[float, list]:
+  start = time.perf_counter()
+  for _ in range(repeat):
+    results = [func(locations, parent_type) for locations in cases for parent_type in ('state', 'city')]
+  return time.perf_counter() - start, results
+
+def main(args):
+  rand = random.Random(args.seed)
+  print(f"lookup mismatches: {check_lookups()}")
+  for count in args.locations:
+    # tagged locations as NER returns them, one { type: name } per tag
+    cases = [[{ rand.choice(TAGGED_TYPES): rand.choice(NAMES) } for _ in range(count)] for _ in range(args.cases)]
+    list_time, list_results = measure(list_relations_from_parent, cases, args.repeat)
+    table_time, table_results = measure(relations_from_parent, cases, args.repeat)
+    mismatches = sum(before != after for before, after in zip(list_results, table_results))
+    calls = args.cases * 2 * args.repeat
+    print(
+      f"{count:5} tags: list {list_time / calls * 1e6:8.1f} us/call, tables {table_time / calls * 1e6:8.1f} us/call "
+      f"({list_time / table_time:5.1f}x), mismatches: {mismatches}"
+    )
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser(description='relations_from_parent / rank tables benchmark')
+  parser.add_argument('--locations', type=int, nargs='+', default=[5, 20, 100])
+  parser.add_argument('--cases', type=int, default=200)
+  parser.add_argument('--repeat', type=int, default=5)
+  parser.add_argument('--seed', type=int, default=7)
+  main(parser.parse_args())
@@ -0,0 +1,73 @@
+import os
+import time
+import asyncio
+import argparse
+import tempfile
+"""
+  filter_invalid_relations on relation heavy articles (one state and many municipalities, half of
+  them from other states) against the local Nominatim stub (stubs/nominatim_stub.py). Compares
+  the previous sequential validation, which removed from the list while iterating it and so kept
+  some invalid relations, with the concurrent one, cold and with the invalid relations cached.
+
+  Usage: python -m benchmarks.bench_relations --latency 0.02
+"""
+ARTICLES_TAGS = [
+  [{ 'state': 'Jalisco' }, { 'city': 'Guadalajara' }, { 'city': 'Zapopan' }, { 'city': 'Tlaquepaque' }, { 'city': 'Puerto Vallarta' },
+   { 'city': 'Monterrey' }, { 'city': 'Apodaca' }, { 'city': 'Mérida' }, { 'city': 'Valladolid' }, { 'town': 'Tesistán' },
+   { 'town': 'Nextipac' }, { 'town': 'Las Palmas' }, { 'town': 'Huinalá' }, { 'town': 'Caucel' }],
+  [{ 'state': 'Yucatán' }, { 'city': 'Mérida' }, { 'city': 'Valladolid' }, { 'city': 'Progreso' }, { 'city': 'Oaxaca de Juárez' },
+   { 'city': 'Salina Cruz' }, { 'city': 'Juchitán de Zaragoza' }, { 'town': 'Caucel' }, { 'town': 'Chicxulub Puerto' }, { 'town': 'Tesistán' }],
+]
+
+async def sequential_filter_invalid_relations(relations):
+  """ filter_invalid_relations before validating concurrently """
+  from providers.nominatim_provider import search_location_params
+  for relation in relations:
+    params = { relation.parent_type: relation.parent_name, relation.child_type: relation.child_name }
+    results = await search_location_params(params)
+    if results.empty or results.search('osm_type') == 'way':
+      relations.remove(relation)
+  return relations
+
+def candidate_relations(tags):
+  from prompts.article_geo_location import relations_from_parent
+  return list(relations_from_parent(tags, 'state')) + list(relations_from_parent(tags, 'city'))
+
+async def run(args):
+  from stubs.nominatim_stub import start_stub
+  from base import request
+  from prompts import article_geo_location
+  stub, runner = await start_stub(args.port, args.latency)
+  try:
+    # every mode starts with an empty url cache so all lookups hit the stub
+    for mode, func, clear in [
+      ('sequential', sequential_filter_invalid_relations, True),
+      ('concurrent', article_geo_location.filter_invalid_relations, True),
+      ('cached', article_geo_location.filter_invalid_relations, False),
+    ]:
+      request.CACHE_DIR = tempfile.mkdtemp(prefix='bench-cache-')
+      request.memory_cache.clear()
+      if clear:
+        article_geo_location.invalid_relations.clear()
+      stub.calls.clear()
+      start = time.perf_counter()
+      kept = []
+      candidates = 0
+      for tags in ARTICLES_TAGS:
+        relations = candidate_relations(tags)
+        candidates += len(relations)
+        kept += await func(relations)
+      elapsed = time.perf_counter() - start
+      print(f"{mode:>10}: {elapsed * 1000:8.1f} ms, {candidates} candidates, {len(kept)} kept, {stub.calls['search']} searches")
+  finally:
+    await runner.cleanup()
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser(description='filter_invalid_relations benchmark')
+  parser.add_argument('--port', type=int, default=18081)
+  parser.add_argument('--latency', type=float, default=0.02, help='Stub latency per request in seconds')
+  args = parser.parse_args()
+  # the provider reads its host and port on import
+  os.environ['NOMINATIM_HOST'] = '127.0.0.1'
+  os.environ['NOMINATIM'] = str(args.port)
+  asyncio.run(run(args))
@@ -0,0 +1,74 @@
+import time
+import random
+import argparse
+from base.utils import split_text
+from base.utils import chunk_text
+from base.utils import word_spans
+"""
+  Chunking of very long articles: split_text before and after joining sentences once per chunk,
+  and the token aware chunk_text generator used for GLiNER. Reports time, number of chunks and
+  the largest chunk in characters and words, plus how many chunks exceed GLINER_MAX_WORDS
+  (the model silently drops the words past it).
+
+  Usage: python -m benchmarks.bench_split_text --sizes 100000 1000000 10000000
+"""
+GLINER_MAX_WORDS = 384
+WORDS = ['el', 'la', 'de', 'en', 'y', 'los', 'lluvias', 'Guadalajara', 'Jalisco', 'gobierno', 'municipio', 'calle', 'vecinos', 'San-Pedro', 'informó', '2024', 'alcalde']
+
+def concat_split_text(text: str, max_length: int) -> list[str]:
+  """ split_text before joining the sentences once per chunk """
+  sentences = text.split('. ')
+  num_chunks = len(text) // max_length + (len(text) % max_length > 0)
+  approx_chunk_length = len(text) // num_chunks
+  chunks = []
+  current_chunk = ""
+  current_length = 0
+  for sentence in sentences:
+    sentence_length = len(sentence) + 2
+    if current_length + sentence_length > approx_chunk_length and len(chunks) < num_chunks - 1:
+      chunks.append(current_chunk.strip())
+      current_chunk = sentence + ". "
+      current_length = sentence_length
+    else:
+      current_chunk += sentence + ". "
+      current_length += sentence_length
+  if current_chunk.strip():
+    chunks.append(current_chunk.strip())
+  return chunks
+
+def article(size: int, sentence_words: int, rand: random.Random) -> str:
+  """ Roughly <size> characters of sentences of about <sentence_words> words """
+  sentences = []
+  length = 0
+  while length < size:
+    sentence = ' '.join(rand.choice(WORDS) for _ in range(rand.randint(sentence_words // 2, sentence_words * 3 // 2)))
+    sentences.append(sentence.capitalize())
+    length += len(sentence) + 2
+  return '. '.join(sentences) + '.'
+
+def measure(name: str, func, text: str) -> None:
+  start = time.perf_counter()
+  chunks = list(func(text))
+  elapsed = time.perf_counter() - start
+  words = [len(word_spans(chunk)) for chunk in chunks]
+  over = sum(count > GLINER_MAX_WORDS for count in words)
+  print(f"  {name:<14} {elapsed * 1000:9.1f} ms {len(chunks):7} chunks, max {max(map(len, chunks)):8} chars {max(words):7} words, {over:5} over {GLINER_MAX_WORDS} words")
+
+def main(args):
+  rand = random.Random(args.seed)
+  for size in args.sizes:
+    # sentences of ~20 words, and one endless paragraph with no periods at all
+    for label, sentence_words in [('sentences', 20), ('no periods', size // 7)]:
+      text = article(size, sentence_words, rand)
+      print(f"{len(text)} chars, {label}")
+      measure('split concat', lambda text: concat_split_text(text, 1500), text)
+      measure('split_text', lambda text: split_text(text, 1500), text)
+      measure('chunk_text', lambda text: chunk_text(text, args.max_tokens, args.overlap), text)
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser(description='split_text / chunk_text benchmark')
+  parser.add_argument('--sizes', type=int, nargs='+', default=[100000, 1000000, 5000000])
+  parser.add_argument('--max-tokens', type=int, default=256)
+  parser.add_argument('--overlap', type=int, default=16)
+  parser.add_argument('--seed', type=int, default=7)
+  main(parser.parse_args())
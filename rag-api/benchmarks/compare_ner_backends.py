@@ -0,0 +1,109 @@
+import json
+import time
+import argparse
+from statistics import median
+from base.utils import chunk_text
+from prompts.ner_backends import BACKENDS
+from prompts.ner_backends import load_model
+from prompts.gliner_geo_tag import LOCATION_LABELS
+from prompts.gliner_geo_tag import OTHER_LABELS
+from prompts.gliner_geo_tag import GLINER_THRESHOLD
+from prompts.gliner_geo_tag import GLINER_BATCH_SIZE
+from prompts.gliner_geo_tag import GLINER_CHUNK_TOKENS
+from prompts.gliner_geo_tag import GLINER_CHUNK_OVERLAP
+"""
+  Runs the same articles through several NER backends and reports latency and how much their
+  entities agree with the first (reference) backend. Entities are compared per article as
+  (label, lowercased text) pairs: precision, recall and F1 against the reference, the same with
+  the label ignored, and the share of articles with exactly the same entities.
+
+  Usage: python -m benchmarks.compare_ner_backends --backends torch torch-int8 onnx --articles articles.ndjson
+  <articles> is a JSON array or NDJSON of { "title", "content" }, a few built-in articles otherwise.
+"""
+SAMPLE_ARTICLES = [
+  "Un choque entre dos camiones sobre la carretera Guadalajara-Chapala dejó tres heridos. Los lesionados fueron trasladados al Hospital Civil de Guadalajara, informó Protección Civil de Jalisco.",
+  "El gobierno de Nuevo León anunció la ampliación de la Línea 6 del metro de Monterrey, que conectará San Nicolás de los Garza con Apodaca antes de 2026.",
+  "Vecinos de la colonia Reforma, en Oaxaca de Juárez, bloquearon la avenida Eduardo Mata para exigir el restablecimiento del servicio de agua potable.",
+  "Las lluvias de la tarde provocaron inundaciones en Mérida y Progreso, Yucatán. En Valladolid se reportaron árboles caídos sobre la calle 41.",
+  "La Secretaría de Turismo informó que Puerto Vallarta y Tequila recibieron más de un millón de visitantes durante el puente vacacional, 12% más que el año pasado.",
+]
+
+def load_articles(path: str) -> list[str]:
+  if not path:
+    return SAMPLE_ARTICLES
+  with open(path, 'r', encoding='utf-8') as file:
+    body = file.read()
+  try:
+    articles = json.loads(body)
+  except json.JSONDecodeError:
+    articles = [json.loads(line) for line in body.splitlines() if line.strip()]
+  return [f"{article.get('title') or ''}. {article.get('content') or ''}" for article in articles]
+
+def run_backend(backend: str, articles: list[str], threads: int) -> tuple[list[set], list[float], float]:
+  """ Returns (entities per article, seconds per article, model load seconds) """
+  start = time.perf_counter()
+  model = load_model(backend, threads)
+  load_time = time.perf_counter() - start
+  labels = LOCATION_LABELS + OTHER_LABELS
+  # warm up so the first article doesn't pay for lazy initialization
+  model.batch_predict_entities([articles[0][:200]], labels, threshold=GLINER_THRESHOLD)
+  entities = []
+  latencies = []
+  for article in articles:
+    chunks = list(chunk_text(article, GLINER_CHUNK_TOKENS, GLINER_CHUNK_OVERLAP))
+    start = time.perf_counter()
+    article_entities = set()
+    for i in range(0, len(chunks), GLINER_BATCH_SIZE):
+      for chunk_entities in model.batch_predict_entities(chunks[i:i + GLINER_BATCH_SIZE], labels, threshold=GLINER_THRESHOLD):
+        article_entities.update((entity['label'], entity['text'].lower()) for entity in chunk_entities)
+    latencies.append(time.perf_counter() - start)
+    entities.append(article_entities)
+  return entities, latencies, load_time
+
+def agreement(reference: list[set], candidate: list[set]) -> dict:
+  def scores(ref_sets, cand_sets):
+    true_positives = sum(len(ref & cand) for ref, cand in zip(ref_sets, cand_sets))
+    ref_total = sum(len(ref) for ref in ref_sets)
+    cand_total = sum(len(cand) for cand in cand_sets)
+    precision = true_positives / cand_total if cand_total else 1.0
+    recall = true_positives / ref_total if ref_total else 1.0
+    f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+    return precision, recall, f1
+  texts = lambda sets: [{ text for _, text in entities } for entities in sets]
+  precision, recall, f1 = scores(reference, candidate)
+  _, _, text_f1 = scores(texts(reference), texts(candidate))
+  return {
+    'precision': precision,
+    'recall': recall,
+    'f1': f1,
+    'text_f1': text_f1,
+    'exact_articles': sum(ref == cand for ref, cand in zip(reference, candidate)) / len(reference),
+  }
+
+def main(args):
+  articles = load_articles(args.articles)
+  if args.threads:
+    import torch
+    torch.set_num_threads(args.threads)
+  print(f"{len(articles)} articles, threads: {args.threads or 'default'}")
+  print(f"{'backend':<12} {'load s':>7} {'p50 ms':>8} {'mean ms':>8} {'speedup':>8} {'P':>6} {'R':>6} {'F1':>6} {'textF1':>7} {'exact':>6}")
+  reference = None
+  reference_mean = None
+  for backend in args.backends:
+    entities, latencies, load_time = run_backend(backend, articles, args.threads)
+    mean = sum(latencies) / len(latencies)
+    if reference is None:
+      reference = entities
+      reference_mean = mean
+    scores = agreement(reference, entities)
+    print(
+      f"{backend:<12} {load_time:7.1f} {median(latencies) * 1000:8.1f} {mean * 1000:8.1f} {reference_mean / mean:7.2f}x "
+      f"{scores['precision']:6.3f} {scores['recall']:6.3f} {scores['f1']:6.3f} {scores['text_f1']:7.3f} {scores['exact_articles']:6.2f}"
+    )
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser(description='NER backend accuracy vs latency comparison')
+  parser.add_argument('--backends', nargs='+', default=['torch', 'torch-int8'], choices=BACKENDS, help='The first one is the reference')
+  parser.add_argument('--articles', help='JSON array or NDJSON file of articles')
+  parser.add_argument('--threads', type=int, help='Intra-op threads for torch and onnxruntime')
+  main(parser.parse_args())
@@ -0,0 +1,222 @@
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+import subprocess
+import aiohttp
+"""
+  End to end load test of /geo_locate_article (or /geo_locate_ollama). Replays a file of articles
+  at a fixed concurrency and reports the latency percentiles, the throughput and the upstream
+  calls made per article: Nominatim requests by endpoint, Ollama generations and NER batches.
+
+  Without --url it runs the whole stack locally, no Docker needed: the Nominatim stub (replaying
+  --fixtures when given, see stubs/nominatim_stub.py) and the Ollama stub in this process, and
+  index.py in a subprocess with GLINER_BACKEND=stub over a locations map of the stub gazetteer,
+  inside a temporary directory so its caches start empty. With --url it loads a running server
+  and only the NER counters are reported.
+
+  Articles are read from --articles, NDJSON or a JSON array of { "title", "content" } like
+  /geo_locate_articles takes, or generated from the stub gazetteer.
+
+  Usage: python -m benchmarks.load_test --articles articles.jsonl --concurrency 8 --count 200
+"""
+RAG_API_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SENTENCES = [
+  "Se reportaron lluvias intensas en {0}, {1}.",
+  "Las autoridades de {0} atendieron un incendio cerca de {1}.",
+  "El festival cultural de {0} recibió visitantes de {1} y {2}.",
+  "Vecinos de {0} denunciaron cortes de agua desde hace una semana.",
+]
+
+def read_articles(path: str) -> list[dict]:
+  with open(path, 'r', encoding='utf-8') as file:
+    body = file.read()
+  if body.lstrip().startswith('['):
+    return json.loads(body)
+  return [json.loads(line) for line in body.splitlines() if line.strip()]
+
+def synthetic_articles(count: int, seed: int) -> list[dict]:
+  """ <count> articles mentioning places of the stub gazetteer, along with their states """
+  from stubs.nominatim_stub import GAZETTEER
+  rand = random.Random(seed)
+  places = [(city, state) for state, cities in GAZETTEER['México'].items() for city in cities]
+  articles = []
+  for i in range(count):
+    sentences = []
+    for _ in range(rand.randint(1, 4)):
+      (city, state), (other, _) = rand.sample(places, 2)
+      sentences.append(rand.choice(SENTENCES).format(city, state, other))
+    articles.append({ 'title': f"Nota {i}", 'content': ' '.join(sentences) })
+  return articles
+
+def write_locations_map(directory: str) -> None:
+  """ storage/locations_map.json of the stub gazetteer, for the fuzzy place classification """
+  from stubs.nominatim_stub import GAZETTEER
+  locations = { 'country': [], 'state': [], 'city': [], 'town': [] }
+  for country, states in GAZETTEER.items():
+    locations['country'].append(country)
+    for state, cities in states.items():
+      locations['state'].append(state)
+      for city, towns in cities.items():
+        locations['city'].append(city)
+        locations['town'] += towns
+  os.makedirs(os.path.join(directory, 'storage'), exist_ok=True)
+  with open(os.path.join(directory, 'storage', 'locations_map.json'), 'w', encoding='utf-8') as file:
+    json.dump(locations, file, ensure_ascii=False)
+
+def start_server(args, directory: str) -> subprocess.Popen:
+  env = dict(os.environ)
+  env.update({
+    'PYTHONPATH': os.pathsep.join(filter(None, [RAG_API_DIR, env.get('PYTHONPATH')])),
+    'NOMINATIM_HOST': '127.0.0.1',
+    'NOMINATIM': str(args.nominatim_port),
+    'OLLAMA_HOST': '127.0.0.1',
+    'OLLAMA_PORT': str(args.ollama_port),
+    'GLINER_BACKEND': 'stub',
+  })
+  code = (
+    "import threading, index; "
+    "threading.Thread(target=index.load_gazetteer, daemon=True).start(); "
+    f"index.app.run(host='127.0.0.1', port={args.port})"
+  )
+  log = open(os.path.join(directory, 'server.log'), 'w')
+  return subprocess.Popen([sys.executable, '-c', code], cwd=directory, env=env, stdout=log, stderr=subprocess.STDOUT)
+
+async def wait_ready(session: aiohttp.ClientSession, url: str, server: subprocess.Popen, timeout: float) -> None:
+  deadline = time.monotonic() + timeout
+  while time.monotonic() < deadline:
+    if server is not None and server.poll() is not None:
+      raise RuntimeError(f"Server exited with {server.returncode}")
+    try:
+      async with session.get(f"{url}/ready") as response:
+        if response.status == 200:
+          return
+    except aiohttp.ClientError:
+      pass
+    await asyncio.sleep(0.2)
+  raise TimeoutError(f"{url} not ready after {timeout}s")
+
+async def get_stats(session: aiohttp.ClientSession, url: str) -> dict:
+  async with session.get(url) as response:
+    return await response.json(content_type=None)
+
+async def post_article(session: aiohttp.ClientSession, url: str, article: dict) -> tuple[float, int]:
+  """ Latency and status of one request, status 0 when it failed to connect """
+  start = time.perf_counter()
+  try:
+    async with session.post(url, data={ 'title': article.get('title') or '', 'content': article.get('content') or '' }) as response:
+      await response.read()
+      status = response.status
+  except (aiohttp.ClientError, asyncio.TimeoutError):
+    status = 0
+  return time.perf_counter() - start, status
+
+async def replay(session: aiohttp.ClientSession, url: str, articles: list[dict], concurrency: int) -> tuple[list, float]:
+  """ Posts <articles> with at most <concurrency> requests in flight, returns their results and the wall time """
+  results = [None] * len(articles)
+  next_index = iter(range(len(articles)))
+  async def worker():
+    for i in next_index:
+      results[i] = await post_article(session, url, articles[i])
+  start = time.perf_counter()
+  await asyncio.gather(*[worker() for _ in range(concurrency)])
+  return results, time.perf_counter() - start
+
+def percentile(values: list[float], p: float) -> float:
+  """ Nearest rank percentile of sorted <values> """
+  if not values:
+    return 0.0
+  return values[min(len(values) - 1, max(0, round(p / 100 * len(values)) - 1))]
+
+def report(results: list, elapsed: float, calls: dict) -> None:
+  latencies = sorted(latency for latency, status in results if status == 200)
+  errors = len(results) - len(latencies)
+  print(f"requests: {len(results)}, errors: {errors}, {elapsed:.2f}s, {len(results) / elapsed:.1f} articles/s")
+  print(
+    f"latency ms: p50 {percentile(latencies, 50) * 1000:.1f}, p95 {percentile(latencies, 95) * 1000:.1f}, "
+    f"p99 {percentile(latencies, 99) * 1000:.1f}, max {(latencies[-1] if latencies else 0) * 1000:.1f}"
+  )
+  per_article = ', '.join(f"{name} {count / len(results):.2f}" for name, count in sorted(calls.items()))
+  print(f"upstream calls per article: {per_article or 'none'}")
+
+def ner_calls(before: dict, after: dict) -> dict:
+  """ NER batches and chunks run between two /ner_stats """
+  calls = {}
+  for key in ['batches', 'items']:
+    if key in before and key in after:
+      calls[f"ner_{key}"] = after[key] - before[key]
+  return calls
+
+async def run(args):
+  from stubs.nominatim_stub import start_stub as start_nominatim
+  from stubs.ollama_stub import start_stub as start_ollama
+  articles = read_articles(args.articles) if args.articles else synthetic_articles(args.count, args.seed)
+  if not articles:
+    raise ValueError('No articles to replay')
+  # cycle through the articles up to --count, repeated articles are answered from the caches
+  articles = [articles[i % len(articles)] for i in range(args.count)]
+  runners = []
+  server = None
+  with tempfile.TemporaryDirectory() as directory:
+    try:
+      if args.url:
+        url = args.url.rstrip('/')
+      else:
+        nominatim, runner = await start_nominatim(args.nominatim_port, args.latency, fixtures=args.fixtures)
+        runners.append(runner)
+        ollama, runner = await start_ollama(args.ollama_port, args.token_latency)
+        runners.append(runner)
+        write_locations_map(directory)
+        server = start_server(args, directory)
+        url = f"http://127.0.0.1:{args.port}"
+      timeout = aiohttp.ClientTimeout(total=args.timeout)
+      connector = aiohttp.TCPConnector(limit=args.concurrency)
+      async with aiohttp.ClientSession(timeout=timeout, connector=connector) as session:
+        await wait_ready(session, url, server, args.ready_timeout)
+        endpoint = f"{url}/{args.endpoint}"
+        if args.warmup:
+          await replay(session, endpoint, articles[:args.warmup], min(args.concurrency, args.warmup))
+        ner_before = await get_stats(session, f"{url}/ner_stats")
+        if not args.url:
+          nominatim.calls.clear()
+          ollama.calls.clear()
+        results, elapsed = await replay(session, endpoint, articles, args.concurrency)
+        calls = ner_calls(ner_before, await get_stats(session, f"{url}/ner_stats"))
+        if not args.url:
+          calls.update({ f"nominatim_{name}": count for name, count in nominatim.calls.items() })
+          calls['ollama_generate'] = ollama.calls['generate']
+      print(f"{args.endpoint} at concurrency {args.concurrency}, {len(set(map(json.dumps, articles)))} distinct articles")
+      report(results, elapsed, calls)
+    finally:
+      if server is not None:
+        server.terminate()
+        server.wait()
+        if args.server_log:
+          with open(os.path.join(directory, 'server.log'), 'r', encoding='utf-8', errors='replace') as file:
+            print(file.read())
+      for runner in runners:
+        await runner.cleanup()
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser(description='End to end load test of the geo location endpoints')
+  parser.add_argument('--articles', help='NDJSON or JSON array of articles, generated from the stub gazetteer when missing')
+  parser.add_argument('--count', type=int, default=200, help='Requests to make, cycling through the articles')
+  parser.add_argument('--concurrency', type=int, default=8)
+  parser.add_argument('--endpoint', choices=['geo_locate_article', 'geo_locate_ollama'], default='geo_locate_article')
+  parser.add_argument('--warmup', type=int, default=0, help='Requests made before measuring')
+  parser.add_argument('--url', help='Running server to load instead of starting the stubs and index.py')
+  parser.add_argument('--port', type=int, default=18500, help='Port of the index.py started')
+  parser.add_argument('--nominatim-port', type=int, default=18501)
+  parser.add_argument('--ollama-port', type=int, default=18502)
+  parser.add_argument('--fixtures', help='Recorded Nominatim responses for the stub to replay')
+  parser.add_argument('--latency', type=float, default=0.02, help='Nominatim stub delay per request in seconds')
+  parser.add_argument('--token-latency', type=float, default=0.005, help='Ollama stub delay per streamed token in seconds')
+  parser.add_argument('--timeout', type=float, default=120, help='Seconds before a request is counted as failed')
+  parser.add_argument('--ready-timeout', type=float, default=60)
+  parser.add_argument('--server-log', action='store_true', help='Print the output of index.py when done')
+  parser.add_argument('--seed', type=int, default=7)
+  asyncio.run(run(parser.parse_args()))
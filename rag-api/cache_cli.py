@@ -0,0 +1,54 @@
+import json
+import argparse
+from base import request
+from base.logger import log
+from base.cache_store import FileCacheStore
+from base.cache_store import create_cache_store
+from base.cache_store import migrate_files
+"""
+  Maintenance of the url cache used by base/request.py
+
+  poetry run python cache_cli.py stats
+  poetry run python cache_cli.py prune --max-age 604800 --max-bytes 1073741824
+  poetry run python cache_cli.py migrate --delete
+"""
+
+def get_store(args):
+  return create_cache_store(args.backend, args.dir, request.CACHE_MAX_BYTES, request.CACHE_COMPRESS)
+
+def stats(args):
+  print(json.dumps(get_store(args).stats(), indent=2))
+
+def prune(args):
+  store = get_store(args)
+  removed = store.prune(max_age=args.max_age, max_bytes=args.max_bytes)
+  log(f"Removed {removed} cache entries")
+  if args.vacuum and hasattr(store, 'vacuum'):
+    store.vacuum()
+
+def migrate(args):
+  """ Moves the md5-named cache files into the sqlite store """
+  source = FileCacheStore(args.dir)
+  target = create_cache_store('sqlite', args.dir, request.CACHE_MAX_BYTES, request.CACHE_COMPRESS)
+  count = migrate_files(source, target, ttl=args.ttl, delete=args.delete)
+  log(f"Migrated {count} cache entries into {target.path}")
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser(description='URL cache maintenance')
+  parser.add_argument('--dir', default=request.CACHE_DIR, help='Cache directory')
+  parser.add_argument('--backend', default=request.CACHE_BACKEND, choices=['sqlite', 'files'])
+  commands = parser.add_subparsers(dest='command', required=True)
+
+  commands.add_parser('stats', help='Show entries and size of the cache')
+
+  prune_parser = commands.add_parser('prune', help='Remove expired, old or least recently used entries')
+  prune_parser.add_argument('--max-age', type=float, help='Remove entries older than this many seconds')
+  prune_parser.add_argument('--max-bytes', type=int, help='Evict least recently used entries over this size')
+  prune_parser.add_argument('--vacuum', action='store_true', help='Compact the sqlite file afterwards')
+
+  migrate_parser = commands.add_parser('migrate', help='Import the md5-named cache files into the sqlite store')
+  migrate_parser.add_argument('--ttl', type=float, help='Expiry for the imported entries in seconds, never by default')
+  migrate_parser.add_argument('--delete', action='store_true', help='Delete each file once imported')
+
+  args = parser.parse_args()
+  { 'stats': stats, 'prune': prune, 'migrate': migrate }[args.command](args)
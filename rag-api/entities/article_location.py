@@ -1,47 +1,79 @@
-from base.logger import log
-from base.serialize import SerializableDict
-from providers.overpass_provider import all_rank_place_types
+import json
+from providers.overpass_provider import PLACE_TYPES_BY_RANK_REVERSED
 
-ALL_TYPES_BY_RANK = all_rank_place_types(reversed=True)
+ALL_TYPES_BY_RANK = PLACE_TYPES_BY_RANK_REVERSED
+
+# fields in the order they are serialized, followed by PROPERTIES
+FIELDS = (
+  'place_id', 'osm_type', 'osm_id', 'continent',
+  'country', 'state', 'region', 'province', 'county', 'city', 'municipality', 'island',
+  'town', 'borough', 'village', 'suburb', 'hamlet', 'rank_address', 'lat', 'lon',
+)
+PROPERTIES = ('id', 'name')
+KEYS = frozenset(FIELDS + PROPERTIES)
+# place types ArticleLocation has a field for, most specific first
+LOCATION_TYPES_BY_RANK = tuple(type for type in ALL_TYPES_BY_RANK if type in FIELDS)
+
+class ArticleLocation:
+  """
+    Slotted location record. Reads like a read only dict of its FIELDS (location['state'],
+    location.get('state'), dict(location)), and to_dict() adds the id and name properties for
+    the JSON responses, see base/serialize.py.
+  """
+  __slots__ = FIELDS
 
-class ArticleLocation(SerializableDict):
   def __init__(self, fields: dict = None) -> None:
     fields = fields or {}
-    self.place_id = fields.get('place_id', '')
-    self.osm_type = fields.get('osm_type', '')
-    self.osm_id = fields.get('osm_id', '')
-    self.continent = fields.get('continent', '')
-
-    self.country = fields.get('country', '')
-    self.state = fields.get('state', '')
-    self.region = fields.get('region', '')
-    self.province = fields.get('province', '')
-    self.county = fields.get('county', '')
-    self.city = fields.get('city', '')
-    self.municipality = fields.get('municipality', '')
-    self.island = fields.get('island', '')
-    self.town = fields.get('town', '')
-    self.borough = fields.get('borough', '')
-    self.village = fields.get('village', '')
-    self.suburb = fields.get('suburb', '')
-    self.hamlet = fields.get('hamlet', '')
-    self.rank_address = fields.get('rank_address', '')
-    self.lat = fields.get('lat', '')
-    self.lon = fields.get('lon', '')
-    super().__init__(self.__dict__)
+    for field in FIELDS:
+      setattr(self, field, fields.get(field, ''))
+
+  def __getitem__(self, key: str):
+    if key in KEYS:
+      return getattr(self, key)
+    raise KeyError(key)
+
+  def __contains__(self, key: str) -> bool:
+    return key in FIELDS
+
+  def __iter__(self):
+    return iter(FIELDS)
+
+  def __eq__(self, other: object) -> bool:
+    if not isinstance(other, ArticleLocation):
+      return NotImplemented
+    return all(getattr(self, field) == getattr(other, field) for field in FIELDS)
+
+  # mutable and compared by value like the dict it replaced, so not hashable
+  __hash__ = None
+
+  def get(self, key: str, default = None):
+    return getattr(self, key) if key in KEYS else default
+
+  def keys(self):
+    return FIELDS
+
+  def to_dict(self) -> dict:
+    values = { field: getattr(self, field) for field in FIELDS }
+    values['id'] = self.id
+    values['name'] = self.name
+    return values
+
+  def __str__(self) -> str:
+    return json.dumps(self.to_dict(), ensure_ascii=False)
+
+  def __repr__(self) -> str:
+    return str(self)
 
   def get_lower_rank_type(self) -> str:
-    for type in ALL_TYPES_BY_RANK:
-      if getattr(self, type, None):
+    for type in LOCATION_TYPES_BY_RANK:
+      if getattr(self, type):
         return type
 
   @property
   def name(self) -> str:
-    # try get the most specific name using ALL_TYPES_BY_RANK
-    for place in ALL_TYPES_BY_RANK:
-      name = getattr(self, place, None)
-      if name:
-        return name
+    # the most specific name using ALL_TYPES_BY_RANK
+    type = self.get_lower_rank_type()
+    return getattr(self, type) if type else None
 
   @property
   def id(self) -> str:
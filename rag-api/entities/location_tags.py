@@ -1,60 +1,112 @@
+import time
+import asyncio
+import threading
 from typing import List, Tuple, Dict
 from base.logger import log
-from base.utils import str_in_text
-from prompts.location_mapper import get_locations_map
+from base.logger import error
+from base.utils import normalize_str
+from base.utils import mentions_matcher
+from prompts.location_mapper import load_locations_snapshot
+from prompts.location_mapper import SNAPSHOT_TYPES
 from base.fuzzy_search import FuzzySearch
-from providers.overpass_provider import PLACE_TYPE_STATE
-from providers.overpass_provider import PLACE_TYPE_CITY
-from providers.overpass_provider import PLACE_TYPE_BOROUGH
-from providers.overpass_provider import PLACE_TYPE_TOWN
-from providers.overpass_provider import PLACE_TYPE_VILLAGE
-from providers.overpass_provider import PLACE_TYPE_HAMLET
-from providers.overpass_provider import PLACE_TYPE_COUNTRY
+from base.fuzzy_search import FuzzyIndex
 
 FuzzyLocations = FuzzySearch()
+# set once the gazetteer is loaded, the server reports it on /ready
+gazetteer_ready = threading.Event()
+gazetteer_info = {}
+gazetteer_lock = threading.Lock()
+
+def load_gazetteer(reload: bool = False) -> bool:
+  """ Loads the location indexes from the snapshot, returns whether they are available """
+  global FuzzyLocations
+  with gazetteer_lock:
+    if gazetteer_ready.is_set() and not reload:
+      return True
+    start = time.perf_counter()
+    snapshot = load_locations_snapshot()
+    if snapshot is None:
+      # leave it unloaded, the next call tries again
+      error("Locations gazetteer could not be loaded")
+      return False
+    metadata, indexes = snapshot
+    search = FuzzySearch()
+    for type in SNAPSHOT_TYPES:
+      search.add_index(type, indexes.get(type) or FuzzyIndex([]))
+    FuzzyLocations = search
+    gazetteer_info.clear()
+    gazetteer_info.update(metadata)
+    gazetteer_info['load_time'] = time.perf_counter() - start
+    gazetteer_ready.set()
+    log(f"Locations gazetteer {metadata['version']} loaded in {gazetteer_info['load_time']:.2f}s")
+    return True
+
 async def init_fuzzy_search():
-  if len(FuzzyLocations.collections) > 0:
+  if gazetteer_ready.is_set():
     return
-  loc_map = await get_locations_map()
-  keys_order = [
-    PLACE_TYPE_COUNTRY,
-    PLACE_TYPE_STATE,
-    PLACE_TYPE_CITY,
-    PLACE_TYPE_BOROUGH,
-    PLACE_TYPE_TOWN,
-    PLACE_TYPE_VILLAGE,
-    PLACE_TYPE_HAMLET
-  ]
-  for type in keys_order:
-    FuzzyLocations.add(type, loc_map[type])
+  await asyncio.to_thread(load_gazetteer)
+
+async def get_place_types(names: List[str]) -> List[str|None]:
+  """ Classifies all <names> in one batched fuzzy search, off the event loop """
+  await init_fuzzy_search()
+  results = await asyncio.to_thread(FuzzyLocations.search_many, names)
+  return [matches[0]['type'] if len(matches) > 0 else None for matches in results]
+
+async def tag_locations_batch(tags_batch: List['LocationTags']) -> None:
+  """ Classifies the tags of many articles at once, each LocationTags keeps its typed tags """
+  names_batch = [tags.get_names() for tags in tags_batch]
+  unique_names = list(dict.fromkeys(name for names in names_batch for name in names))
+  types = dict(zip(unique_names, await get_place_types(unique_names)))
+  for tags, names in zip(tags_batch, names_batch):
+    tags.set_tags(typed_locations(names, types))
+
+def typed_locations(names: List[str], types: Dict[str, str|None]) -> List[Dict]:
+  result = []
+  for name in names:
+    type = types[name]
+    log(f"Name: {name} - Type: {type}")
+    if type:
+      result.append({ type: name })
+  return result
 
 class LocationTags:
   def __init__(self, tags: List[Dict]) -> None:
     self._tags = tags
+    self._typed_tags = None
+    self._matcher = None
 
-  async def get_tags(self) -> List[Dict]:
+  def get_values(self) -> List[str]:
     values = [tag.values() for tag in self._tags]
-    values = [item for sublist in values for item in sublist]
-    return await self.tag_locations(values)
+    return [item for sublist in values for item in sublist]
+
+  def get_names(self) -> List[str]:
+    # deduplicate values
+    return [name.strip().capitalize() for name in set(self.get_values())]
+
+  async def get_tags(self) -> List[Dict]:
+    if self._typed_tags is None:
+      self._typed_tags = await self.tag_locations(self.get_values())
+    return self._typed_tags
+
+  def set_tags(self, typed_tags: List[Dict]) -> None:
+    """ Typed tags classified elsewhere (see tag_locations_batch), get_tags returns them """
+    self._typed_tags = typed_tags
 
   def with_text(self, text: str) -> List[Dict]:
+    # one automaton over all the tags, built once and run once per text
+    if self._matcher is None:
+      self._matcher = mentions_matcher([' '.join(tag.values()) for tag in self._tags])
     results = []
-    for tag in self._tags:
-      if str_in_text(' '.join(tag.values()), text) > 0:
+    for tag, count in zip(self._tags, self._matcher.counts(normalize_str(text))):
+      if count > 0:
         results += tag
     return results
 
   async def tag_locations(self, arr: List[str]) -> Dict:
     # deduplicate arr
-    arr = list(set(arr))
-    result = []
-    for name in arr:
-      name = name.strip().capitalize()
-      type = await self.get_place_type(name)
-      log(f"Name: {name} - Type: {type}")
-      if type:
-        result.append({ type: name })
-    return result
+    names = [name.strip().capitalize() for name in set(arr)]
+    types = await get_place_types(names)
+    return typed_locations(names, dict(zip(names, types)))
 
   async def get_place_type(self, name: str) -> str|None:
     await init_fuzzy_search()
@@ -1,40 +1,135 @@
+import asyncio
+import threading
 from flask import Flask
 from flask import json
 from flask import request
 from flask import Response
 from base.logger import log
+from base.serialize import to_serializable
+from base.request import http_client
+from base.request import memory_cache
+from base.request import get_cache_store
 from server_process import kill_previous_instance
 from prompts.article_geo_location import parse_content as parse_geo_location_content
+from prompts.article_geo_location import parse_contents as parse_geo_location_contents
 from prompts.article_geo_location import tag_content
+from prompts.article_geo_location import article_cache
+from prompts.article_geo_location import tags_cache
+from prompts.article_geo_location import query_cache
+from prompts.article_geo_location import invalid_relations
 from prompts.location_mapper import generate_all
+from prompts.gliner_geo_tag import ner_batcher
+from prompts.gliner_geo_tag import ner_pool
+from prompts.gliner_geo_tag import GLINER_BACKEND
+from prompts.gliner_geo_tag import ner_cache
+from base.micro_batch import QueueFullError
+from entities.location_tags import load_gazetteer
+from entities.location_tags import gazetteer_ready
+from entities.location_tags import gazetteer_info
 # TODO: maybe use https://github.com/openvenues/libpostal
 # read more @ https://medium.com/@albarrentine/statistical-nlp-on-openstreetmap-b9d573e6cc86
 
 app = Flask(__name__)
+MAX_BATCH_ARTICLES = 256
+# seconds clients are asked to wait when the NER queue is full
+OVERLOAD_RETRY_AFTER = 1
+
+def parse_articles_payload(body: str, is_json: bool) -> list[dict]:
+  """ Reads a list of articles from a JSON array or from NDJSON (one article per line) """
+  if is_json:
+    articles = json.loads(body)
+  else:
+    articles = [json.loads(line) for line in body.splitlines() if line.strip()]
+  if not isinstance(articles, list) or not all(isinstance(article, dict) for article in articles):
+    raise ValueError('Expected a list of articles')
+  return articles
+
+@app.errorhandler(QueueFullError)
+def overloaded(e):
+  # shed load right away instead of queueing behind the model
+  return Response(str(e), status=503, headers={ 'Retry-After': str(OVERLOAD_RETRY_AFTER) })
 
 @app.route("/geo_locate_article", methods=["POST"])
 async def geo_locate_article():
   title = request.form.get('title')
   content = request.form.get('content')
   locations = await parse_geo_location_content(title, content)
-  json_str = json.dumps(locations, ensure_ascii=False)
+  json_str = json.dumps(locations, ensure_ascii=False, default=to_serializable)
   response = Response(json_str, content_type='application/json; charset=utf-8')
   return response
 
+@app.route("/geo_locate_articles", methods=["POST"])
+async def geo_locate_articles():
+  try:
+    articles = parse_articles_payload(request.get_data(as_text=True), request.is_json)
+  except ValueError as e:
+    return Response(str(e), status=400)
+  if len(articles) > MAX_BATCH_ARTICLES:
+    return Response(f'Batch exceeds {MAX_BATCH_ARTICLES} articles', status=413)
+  batch = [(article.get('title') or '', article.get('content') or '') for article in articles]
+  locations_batch = await parse_geo_location_contents(batch)
+  lines = []
+  for index, (article, locations) in enumerate(zip(articles, locations_batch)):
+    result = { 'index': index, 'locations': locations }
+    if 'id' in article:
+      result['id'] = article['id']
+    lines.append(json.dumps(result, ensure_ascii=False, default=to_serializable))
+  return Response("\n".join(lines) + "\n", content_type='application/x-ndjson; charset=utf-8')
+
 @app.route("/geo_locate_ollama", methods=["POST"])
 async def geo_locate_ollama_article():
   title = request.form.get('title')
   content = request.form.get('content')
   locations = await tag_content(title, content)
-  json_str = json.dumps(locations, ensure_ascii=False)
+  json_str = json.dumps(locations, ensure_ascii=False, default=to_serializable)
   response = Response(json_str, content_type='application/json; charset=utf-8')
   return response
 
 @app.route("/generate_locations", methods=["POST"])
 async def generate_locations():
   await generate_all()
+  await asyncio.to_thread(load_gazetteer, True)
   return Response('ok', content_type='application/json; charset=utf-8')
 
-if __name__ == '__main__':
+@app.route("/cache_stats", methods=["GET"])
+async def cache_stats():
+  json_str = json.dumps({
+    'memory': memory_cache.stats(),
+    'store': get_cache_store().stats(),
+    'articles': article_cache.stats(),
+    'tags': tags_cache.stats(),
+    'queries': query_cache.stats(),
+    'invalid_relations': invalid_relations.stats(),
+  })
+  return Response(json_str, content_type='application/json; charset=utf-8')
+
+@app.route("/ner_stats", methods=["GET"])
+async def ner_stats():
+  stats = ner_batcher.stats()
+  stats['backend'] = GLINER_BACKEND
+  stats['pool'] = ner_pool.stats() if ner_pool is not None else None
+  stats['cache'] = ner_cache.stats()
+  json_str = json.dumps(stats)
+  return Response(json_str, content_type='application/json; charset=utf-8')
+
+@app.route("/ready", methods=["GET"])
+async def ready():
+  # 503 until the gazetteer is loaded so load balancers hold traffic back
+  is_ready = gazetteer_ready.is_set()
+  json_str = json.dumps({ 'ready': is_ready, 'gazetteer': gazetteer_info })
+  return Response(json_str, status=200 if is_ready else 503, content_type='application/json; charset=utf-8')
+
+def serve():
+  """ Runs the server on port 80, see server.py """
   kill_previous_instance()
-  app.run(host="0.0.0.0", port=80)
+  threading.Thread(target=load_gazetteer, name='gazetteer', daemon=True).start()
+  try:
+    app.run(host="0.0.0.0", port=80)
+  finally:
+    ner_batcher.close()
+    if ner_pool is not None:
+      ner_pool.close()
+    http_client.close()
+
+if __name__ == '__main__':
+  serve()
@@ -1,21 +1,58 @@
+import os
 from typing import List, Tuple, Dict
+from contextvars import ContextVar
 from base.logger import log
 from base.logger import debug
 from base.logger import error
 from base.logger import warn
 from base.json_search import JSONSearch
+from base.async_utils import gather_limited
+from base.async_utils import shared_result
+from base.tiered_cache import TieredCache
+from base.memory_cache import MemoryCache
 from providers.nominatim_provider import search_location
 from providers.nominatim_provider import search_location_params
 from providers.nominatim_provider import search_location_details
+from providers.nominatim_provider import lookup_places
+from providers.nominatim_provider import osm_lookup_id
 from entities.article_location import ArticleLocation
-from providers.overpass_provider import lower_ranked_place_types
+from providers.overpass_provider import LOWER_RANKED_PLACE_TYPES
 from entities.location_relation import LocationRelation
 from entities.location_tags import LocationTags
+from entities.location_tags import tag_locations_batch
+from entities.location_tags import init_fuzzy_search
+from entities.location_tags import gazetteer_info
 from prompts.location_tree import LocationTree
-from prompts.gliner_geo_tag import geo_tag_content as gliner_geo_tag_content
+from prompts.gliner_geo_tag import geo_tag_contents as gliner_geo_tag_contents
+from prompts.gliner_geo_tag import ner_version
 from prompts.ollama_geo_tag import geo_tag_content as ollama_geo_tag_content
 MIN_LOCATION_RANK = 4
 MAX_LOCATION_RANK = 20
+MAX_CONCURRENT_LOOKUPS = 8
+# name of the address part in each rank range of the details, see related_location_from_params
+# https://nominatim.org/release-docs/latest/customize/Ranking/#address-rank
+ADDRESS_RANK_EXPRESSION = "address[?(rank_address >= `{rank_from}` && rank_address <= `{rank_to}` && isaddress == `true`)].localname | [0]"
+DEFAULT_FIELDS_EXPRESSIONS = {
+  field: ADDRESS_RANK_EXPRESSION.format(rank_from=rank_from, rank_to=rank_to)
+  for field, (rank_from, rank_to) in { 'country': (4, 4), 'state': (5, 9), 'county': (10, 12), 'city': (13, 16), 'town': (17, 21) }.items()
+}
+# final locations per article and per set of tags, see parse_contents
+LOCATIONS_CACHE_TTL = float(os.environ.get("LOCATIONS_CACHE_TTL", 24 * 3600))
+LOCATIONS_CACHE_PERSIST = os.environ.get("LOCATIONS_CACHE_PERSIST", "1") == "1"
+article_cache = TieredCache('article', LOCATIONS_CACHE_TTL, persist=LOCATIONS_CACHE_PERSIST)
+tags_cache = TieredCache('tags', LOCATIONS_CACHE_TTL, persist=LOCATIONS_CACHE_PERSIST)
+# location and related locations of each search query, see resolve_queries
+query_cache = TieredCache('query', LOCATIONS_CACHE_TTL, max_entries=16384, persist=LOCATIONS_CACHE_PERSIST)
+# relations nominatim didn't find, see filter_invalid_relations
+INVALID_RELATIONS_TTL = float(os.environ.get("INVALID_RELATIONS_TTL", 24 * 3600))
+invalid_relations = MemoryCache(max_entries=16384, ttl=INVALID_RELATIONS_TTL)
+# errors swallowed while resolving locations, results resolved with errors are not cached
+lookup_errors: ContextVar[list|None] = ContextVar('lookup_errors', default=None)
+
+def record_lookup_error(e: Exception) -> None:
+  errors = lookup_errors.get()
+  if errors is not None:
+    errors.append(e)
 
 async def extract_related_locations(location: ArticleLocation):
   query_params = []
@@ -27,57 +64,61 @@ async def extract_related_locations(location: ArticleLocation):
   # remove items that have empty values in any of the keys
   query_params = [params for params in query_params if all(params.values())]
   debug(f'Query Params: {query_params}')
-  result = []
-  for params in query_params:
-    try:
-      related_loc = await search_location_params(params)
-      details_loc = await search_location_details(related_loc.search('place_id'))
-      # https://nominatim.org/release-docs/latest/customize/Ranking/#address-rank
-      fmt_exp = "address[?(rank_address >= `{rank_from}` && rank_address <= `{rank_to}` && isaddress == `true`)].localname | [0]"
-      defaults = {
-        'country': details_loc.search(fmt_exp.format(rank_from=4, rank_to=4)),
-        'state': details_loc.search(fmt_exp.format(rank_from=5, rank_to=9)),
-        'county': details_loc.search(fmt_exp.format(rank_from=10, rank_to=12)),
-        'city': details_loc.search(fmt_exp.format(rank_from=13, rank_to=16)),
-        'town': details_loc.search(fmt_exp.format(rank_from=17, rank_to=21)),
-      }
-      debug(f'Defaults: {defaults}')
-      geo_loc = await geo_location_from_results(related_loc, default_fields=defaults)
-      result.append(geo_loc)
-    except Exception as e:
-      error('Error extracting parent locations', e)
-  return result
-
-async def geo_location_from_results(results: JSONSearch, default_fields = {}) -> ArticleLocation:
+  related = await gather_limited([related_location_from_params(params) for params in query_params], MAX_CONCURRENT_LOOKUPS)
+  return [geo_loc for geo_loc in related if geo_loc]
+
+async def related_location_from_params(params: dict) -> ArticleLocation|None:
+  try:
+    related_loc = await search_location_params(params)
+    details_loc = await search_location_details(related_loc.search('place_id'))
+    defaults = { field: details_loc.search(expression) for field, expression in DEFAULT_FIELDS_EXPRESSIONS.items() }
+    debug(f'Defaults: {defaults}')
+    # details were already fetched for the same place_id, reuse them
+    return await geo_location_from_results(related_loc, default_fields=defaults, details=details_loc)
+  except Exception as e:
+    error('Error extracting parent locations', e)
+    record_lookup_error(e)
+    return None
+
+async def geo_location_from_results(results: JSONSearch, default_fields = {}, details: JSONSearch = None, place: JSONSearch = None) -> ArticleLocation:
+  """
+    Location of a search result. The address is read from its /lookup <place> when known, the
+    rank_address always from the <details> of the place, fetched when not given. /lookup only has
+    the search rank (place_rank), which isn't the address rank of towns, villages or islands.
+  """
   try:
     place_id = results.search('place_id')
-    details = await search_location_details(place_id)
+    if details is None:
+      details = await search_location_details(place_id)
+    rank_address = details.search('rank_address')
+    address = place if place is not None else results
     return ArticleLocation({
       'place_id': place_id,
       'osm_type': results.search('osm_type'),
       'osm_id': results.search('osm_id'),
 
-      'continent': results.search('address.continent'),
-      'country': results.search('address.country') or default_fields.get('country', None),
-      'state': results.search('address.state') or default_fields.get('state', None),
-      'region': results.search('address.region'),
-      'province': results.search('address.province'),
-      'county': results.search('address.county') or default_fields.get('county', None),
-      'city': results.search('address.city') or default_fields.get('city', None),
-      'municipality': results.search('address.municipality'),
-      'island': results.search('address.island'),
-      'town': results.search('address.town') or default_fields.get('town', None),
-      'borough': results.search('address.borough'),
-      'village': results.search('address.village'),
-      'suburb': results.search('address.suburb'),
-      'hamlet': results.search('address.hamlet'),
-      'rank_address': details.search('rank_address'),
+      'continent': address.search('address.continent'),
+      'country': address.search('address.country') or default_fields.get('country', None),
+      'state': address.search('address.state') or default_fields.get('state', None),
+      'region': address.search('address.region'),
+      'province': address.search('address.province'),
+      'county': address.search('address.county') or default_fields.get('county', None),
+      'city': address.search('address.city') or default_fields.get('city', None),
+      'municipality': address.search('address.municipality'),
+      'island': address.search('address.island'),
+      'town': address.search('address.town') or default_fields.get('town', None),
+      'borough': address.search('address.borough'),
+      'village': address.search('address.village'),
+      'suburb': address.search('address.suburb'),
+      'hamlet': address.search('address.hamlet'),
+      'rank_address': rank_address,
 
       'lat': results.search('lat'),
       'lon': results.search('lon'),
     })
   except Exception as e:
     error('Error mapping location', e)
+    record_lookup_error(e)
     return None
 
 def deduplicate_locations(locations):
@@ -95,29 +136,42 @@ def filter_locations_between_rank(locations: list[ArticleLocation], rank_from: i
   return [location for location in locations if location.rank_address >= rank_from and location.rank_address <= rank_to]
 
 def relations_from_parent(locations: dict, parent_type: str) -> List[LocationRelation]:
-  relations = []
-  parent_locs = [loc for loc in locations if parent_type in loc]
-  for loc_type in lower_ranked_place_types(parent_type):
-    child_locs = [loc for loc in locations if loc_type in loc]
-    for parent in parent_locs:
-      for child in child_locs:
-        p_tuple = next(iter(parent.items()))
-        c_tuple = next(iter(child.items()))
-        relations.append(LocationRelation(p_tuple, c_tuple))
-  # deduplicate list
-  relations = set(relations)
+  # (type, name) of each location, once per location instead of once per pair
+  parent_tuples = { next(iter(loc.items())) for loc in locations if parent_type in loc }
+  relations = set()
+  for loc_type in LOWER_RANKED_PLACE_TYPES.get(parent_type, ()):
+    child_tuples = { next(iter(loc.items())) for loc in locations if loc_type in loc }
+    for p_tuple in parent_tuples:
+      for c_tuple in child_tuples:
+        relations.add(LocationRelation(p_tuple, c_tuple))
   return relations
 
+def relation_key(relation: LocationRelation) -> str:
+  return f"{relation.parent_type}={relation.parent_name}&{relation.child_type}={relation.child_name}"
+
+async def is_valid_relation(relation: LocationRelation) -> bool:
+  """ Whether nominatim finds the child within the parent (not as a street). Invalid relations are remembered """
+  key = relation_key(relation)
+  if invalid_relations.get(key):
+    return False
+  params = { relation.parent_type: relation.parent_name, relation.child_type: relation.child_name }
+  results = await search_location_params(params)
+  is_osm_way = results.search('osm_type') == 'way'
+  if results.empty or is_osm_way:
+    log(f"Removing relation {relation}. Is OSM Way: {is_osm_way}")
+    invalid_relations.set(key, True)
+    return False
+  return True
+
 async def filter_invalid_relations(relations: List[LocationRelation]) -> List[LocationRelation]:
+  """ New list with the valid <relations>, each distinct relation is checked once and concurrently """
   log(f"Fitering potential invalid relations in: {relations}")
-  for relation in relations:
-    params = { relation.parent_type: relation.parent_name, relation.child_type: relation.child_name }
-    results = await search_location_params(params)
-    is_osm_way = results.search('osm_type') == 'way'
-    if results.empty or is_osm_way:
-      log(f"Removing relation. Is OSM Way: {is_osm_way}")
-      relations.remove(relation)
-  return relations
+  relations = list(relations)
+  keys = list(dict.fromkeys(relation_key(relation) for relation in relations))
+  by_key = { relation_key(relation): relation for relation in relations }
+  valid = await gather_limited([is_valid_relation(by_key[key]) for key in keys], MAX_CONCURRENT_LOOKUPS)
+  valid_keys = { key for key, is_valid in zip(keys, valid) if is_valid }
+  return [relation for relation in relations if relation_key(relation) in valid_keys]
 
 async def get_location_queries(tagged_locations: dict) -> list[str]:
   """
@@ -152,19 +206,14 @@ async def get_location_queries(tagged_locations: dict) -> list[str]:
 
 def filter_unmentioned_locations(tags: LocationTags, locations: list[ArticleLocation]) -> list[ArticleLocation]:
   """
-    Filters locations that are not mentioned in the content.
+    Filters locations that are not mentioned in the content. Locations with a child left are kept,
+    so a mentioned city keeps its state and country.
   """
   tree = LocationTree(locations)
   tree.log_tree()
-  removals = 0
-  for location in tree.locations:
-    if len(tags.with_text(location.name)) == 0 and len(tree.get_children(location)) == 0:
-      tree.locations.remove(location)
-      removals += 1
-      warn(f"Location removed: {location.name}")
-
-  if (removals > 0):
-    return filter_unmentioned_locations(tags, tree.locations)
+  removed = tree.prune(lambda location: len(tags.with_text(location.name)) > 0)
+  for location in removed:
+    warn(f"Location removed: {location.name}")
   return tree.locations
 
 async def tag_content(title: str, content: str):
@@ -174,34 +223,180 @@ async def tag_content(title: str, content: str):
   return locations
 
 async def parse_content(title: str, content: str):
-  content = "\n".join([title, content])
-  tags = await gliner_geo_tag_content(content)
-  locations = await locations_from_tags(tags)
-  return locations
+  locations_batch = await parse_contents([(title, content)])
+  return locations_batch[0]
+
+async def parse_contents(articles: List[Tuple[str, str]]) -> List[List[ArticleLocation]]:
+  """
+    Batched version of parse_content. Takes a list of (title, content) tuples and returns
+    the list of locations for each article in the same order.
+
+    Results are cached at three levels so re-submitted and edited articles redo as little as possible:
+    - by title and content: an unchanged article skips everything.
+    - by the tag values NER found: the locations only depend on them (LocationTags.with_text
+      matches tags against location names, not the text), so an edit that doesn't change the
+      tags skips the Nominatim resolution. Unchanged chunks of an edited article are not re-tagged
+      either, their entities are cached by gliner_geo_tag.
+    - by search query (see resolve_queries): when the tags did change, only the queries the new
+      tags add go to Nominatim, the ones the article already had are reused.
+    The first two keys include the NER model settings and the gazetteer version.
+  """
+  await init_fuzzy_search()
+  version = [ner_version(), gazetteer_info.get('version')]
+  contents = ["\n".join([title, content]) for title, content in articles]
+  article_keys = [article_cache.key(version, content) for content in contents]
+  cached = await article_cache.aget_many(article_keys)
+  missing = list(dict.fromkeys(key for key in article_keys if key not in cached))
+  log(f"Locations of {len(contents) - len(missing)}/{len(contents)} articles cached")
+  if missing:
+    missing_contents = [contents[article_keys.index(key)] for key in missing]
+    tags_batch = await gliner_geo_tag_contents(missing_contents)
+    tags_keys = [tags_cache.key(version, sorted(set(tags.get_values()))) for tags in tags_batch]
+    cached_tags = await tags_cache.aget_many(tags_keys)
+    resolve = [(key, tags) for key, tags in zip(tags_keys, tags_batch) if key not in cached_tags]
+    resolve = list({ key: tags for key, tags in resolve }.items())
+    if resolve:
+      resolved, failed = await resolve_tags_batch([tags for _, tags in resolve])
+      resolved = { key: locations for (key, _), locations in zip(resolve, resolved) }
+      if not failed:
+        await tags_cache.aset_many(resolved)
+      cached_tags.update(resolved)
+    else:
+      failed = False
+    new_articles = { key: cached_tags[tags_key] for key, tags_key in zip(missing, tags_keys) }
+    if not failed:
+      await article_cache.aset_many(new_articles)
+    cached.update(new_articles)
+  return [[ArticleLocation(fields) for fields in cached[key]] for key in article_keys]
+
+async def resolve_tags_batch(tags_batch: List[LocationTags]) -> Tuple[List[List[dict]], bool]:
+  """ Locations fields for each tags, and whether any lookup failed along the way """
+  errors = []
+  lookup_errors.set(errors)
+  # classify the tags of all the articles in one pass
+  await tag_locations_batch(tags_batch)
+  locations_batch = await locations_from_tags_batch(tags_batch)
+  if errors:
+    warn(f"Not caching locations, {len(errors)} lookups failed")
+  return [[dict(location) for location in locations] for locations in locations_batch], len(errors) > 0
 
 async def locations_from_tags(locationTags: LocationTags):
-  locations = []
-  parent_locations = []
+  locations_batch = await locations_from_tags_batch([locationTags])
+  return locations_batch[0]
+
+async def locations_from_tags_batch(tags_batch: List[LocationTags]) -> List[List[ArticleLocation]]:
+  """
+    Resolves the locations for the tags of many articles. Each step runs once for the whole batch
+    so identical queries and related locations are only resolved once and shared between the
+    articles, and the addresses of every place found are fetched with a few /lookup calls (see
+    geo_locations_from_results).
+  """
+  queries_batch = await gather_limited([article_location_queries(locationTags) for locationTags in tags_batch], MAX_CONCURRENT_LOOKUPS)
+  queries = list(dict.fromkeys(query for location_queries in queries_batch for query in location_queries))
+  resolved = await resolve_queries(queries)
+  return [
+    article_locations_from_queries(locationTags, [resolved[query] for query in location_queries])
+    for locationTags, location_queries in zip(tags_batch, queries_batch)
+  ]
+
+async def resolve_queries(queries: List[str]) -> Dict[str, dict]:
+  """
+    What each search query resolves to: { "location": fields or None, "related": [fields] }, the
+    location found and its related locations (see extract_related_locations). Only depends on
+    the query and Nominatim, so it's cached per query in query_cache. Queries resolved while any
+    lookup failed are not cached.
+  """
+  keys = { query: query_cache.key(query) for query in queries }
+  cached = await query_cache.aget_many(list(keys.values()))
+  resolved = { query: cached[key] for query, key in keys.items() if key in cached }
+  missing = [query for query in queries if query not in resolved]
+  log(f"Locations of {len(resolved)}/{len(queries)} queries cached")
+  if not missing:
+    return resolved
+  errors = []
+  outer_errors = lookup_errors.get()
+  token = lookup_errors.set(errors)
+  try:
+    results = await gather_limited([search_location_query(query) for query in missing], MAX_CONCURRENT_LOOKUPS)
+    locations = await geo_locations_from_results(results)
+    resolved_related = {}
+    related_locations = await gather_limited([
+      query_related_locations(location, resolved_related) for location in locations
+    ], MAX_CONCURRENT_LOOKUPS)
+  finally:
+    lookup_errors.reset(token)
+  if outer_errors is not None:
+    outer_errors.extend(errors)
+  new_queries = {
+    query: { 'location': dict(location) if location else None, 'related': [dict(parent) for parent in related] }
+    for query, location, related in zip(missing, locations, related_locations)
+  }
+  if not errors:
+    await query_cache.aset_many({ keys[query]: value for query, value in new_queries.items() })
+  resolved.update(new_queries)
+  return resolved
+
+async def query_related_locations(location: ArticleLocation|None, resolved_related: dict) -> List[ArticleLocation]:
+  """ Related locations of <location>, resolved once per location id across the queries """
+  if location is None:
+    return []
+  try:
+    return await shared_result(resolved_related, location.id, extract_related_locations, location)
+  except Exception as e:
+    error('Error parsing response', e)
+    record_lookup_error(e)
+    return []
+
+async def article_location_queries(locationTags: LocationTags) -> list[str]:
   try:
     tags = await locationTags.get_tags()
     log(tags)
     location_queries = await get_location_queries(tags)
     log(f'Location Queries: {location_queries}')
-    for query in location_queries:
-      results = await search_location(query)
-      if not results.empty:
-        debug(f'Results for "{query}": {results}')
-        geo_location = await geo_location_from_results(results)
-        debug(f'Location found for "{query}": {geo_location}')
-        locations.extend([geo_location])
-      else:
-        warn(f'No results found for query: {query}')
-    for location in locations:
-      parent_loc = await extract_related_locations(location)
-      parent_locations.extend(parent_loc)
+    return location_queries
   except Exception as e:
     error('Error parsing response', e)
-    pass
+    record_lookup_error(e)
+    return []
+
+async def search_location_query(query: str) -> JSONSearch|None:
+  try:
+    results = await search_location(query)
+  except Exception as e:
+    error(f'Error searching location: {query}', e)
+    record_lookup_error(e)
+    return None
+  if results.empty:
+    warn(f'No results found for query: {query}')
+    return None
+  debug(f'Results for "{query}": {results}')
+  return results
+
+async def geo_locations_from_results(results_list: List[JSONSearch|None]) -> List[ArticleLocation|None]:
+  """
+    Locations of many search results, their addresses are looked up together in chunks of LOOKUP_MAX_IDS.
+    Their ranks come from /details, get_json shares each place's details with extract_related_locations.
+  """
+  osm_ids = [osm_lookup_id(results.search('osm_type'), results.search('osm_id')) for results in results_list if results]
+  try:
+    places = await lookup_places(osm_ids)
+  except Exception as e:
+    # the addresses of the search results are used instead
+    error('Error looking up places', e)
+    places = {}
+  async def geo_location(results: JSONSearch|None) -> ArticleLocation|None:
+    if not results:
+      return None
+    place = places.get(osm_lookup_id(results.search('osm_type'), results.search('osm_id')))
+    return await geo_location_from_results(results, place=place)
+  return await gather_limited([geo_location(results) for results in results_list], MAX_CONCURRENT_LOOKUPS)
+
+def article_locations_from_queries(locationTags: LocationTags, resolved_queries: List[dict]) -> List[ArticleLocation]:
+  """ Locations of an article from what its queries resolved to (see resolve_queries) """
+  locations = [ArticleLocation(resolved['location']) for resolved in resolved_queries if resolved['location']]
+  parent_locations = [
+    ArticleLocation(fields) for resolved in resolved_queries if resolved['location'] for fields in resolved['related']
+  ]
   locations = deduplicate_locations(locations + parent_locations)
   locations = filter_locations_between_rank(locations, MIN_LOCATION_RANK, MAX_LOCATION_RANK)
   locations = filter_unmentioned_locations(locationTags, locations)
@@ -1,38 +1,118 @@
+import os
+import re
+import unicodedata
+from typing import List
 from base.logger import log
 from base.logger import warn
-from gliner import GLiNER
 from entities.location_tags import LocationTags
-from base.utils import str_in_text
-from base.utils import split_text
+from base.utils import mentions_in_text
+from base.utils import chunk_text
+from base.micro_batch import MicroBatcher
+from base.worker_pool import WorkerPool
+from base.tiered_cache import TieredCache
+from prompts import gliner_worker
+from prompts.ner_backends import load_model
+from prompts.ner_backends import GLINER_MODEL
 
 Cached_Model = None
 
+# chunks from all concurrent requests are grouped into batches of up to GLINER_BATCH_SIZE,
+# a batch waits at most GLINER_BATCH_WAIT seconds to fill after its first chunk arrives
+GLINER_BATCH_SIZE = int(os.environ.get("GLINER_BATCH_SIZE", 8))
+GLINER_BATCH_WAIT = float(os.environ.get("GLINER_BATCH_WAIT_MS", 10)) / 1000
+GLINER_THRESHOLD = 0.4
+# GLiNER truncates its input at 384 words, chunks stay well below that once the subword
+# tokenizer and the label prompt are added. Chunks cut mid-sentence overlap the next one.
+GLINER_CHUNK_TOKENS = int(os.environ.get("GLINER_CHUNK_TOKENS", 256))
+GLINER_CHUNK_OVERLAP = int(os.environ.get("GLINER_CHUNK_OVERLAP", 16))
+# with GLINER_WORKERS > 0 inference runs in that many worker processes using GLINER_THREADS
+# threads each, otherwise in this process (where only the onnx backends are given GLINER_THREADS,
+# torch already uses every core). Chunks past GLINER_MAX_PENDING are rejected.
+GLINER_WORKERS = int(os.environ.get("GLINER_WORKERS", 0))
+GLINER_THREADS = int(os.environ.get("GLINER_THREADS", max(1, (os.cpu_count() or 1) // max(1, GLINER_WORKERS))))
+GLINER_MAX_PENDING = int(os.environ.get("GLINER_MAX_PENDING", 256))
+# torch, torch-int8, onnx or onnx-int8, see prompts/ner_backends.py
+GLINER_BACKEND = os.environ.get("GLINER_BACKEND", "torch")
+# entities of already seen chunks, in memory and in the persistent cache store
+NER_CACHE_TTL = float(os.environ.get("NER_CACHE_TTL", 30 * 24 * 3600))
+NER_CACHE_MAX_ENTRIES = int(os.environ.get("NER_CACHE_MAX_ENTRIES", 8192))
+NER_CACHE_PERSIST = os.environ.get("NER_CACHE_PERSIST", "1") == "1"
 LOCATION_LABELS = ["Pais", "Estado", "Municipio", "Ciudad", "Comunidad", "Pueblo", "Colonia", "Sitio"]
 OTHER_LABELS = ["Organizacion", "Evento", "Persona", "Cargo"]
 # Uses https://github.com/urchade/GLiNER to label locations in the text using a NER Model
 
 async def geo_tag_content(content: str) -> LocationTags:
-  chunks = split_text(content, 1500)
-  log(f"Split text into {len(chunks)} chunks")
-  tags = []
-  for chunk in chunks:
-    log(f"Extracting Locations from chunk: {chunk}")
-    ner_locations = extract_locations_from_ner(chunk)
-    tags += ner_locations
-  return LocationTags(tags)
-
-def extract_locations_from_ner(response_str):
-  locations = []
-  model = get_gliner_model()
+  tags = await geo_tag_contents([content])
+  return tags[0]
+
+async def geo_tag_contents(contents: List[str]) -> List[LocationTags]:
+  """ Tags many articles at once running the chunks of all of them through the model in batches """
+  articles_chunks = [list(chunk_text(content, GLINER_CHUNK_TOKENS, GLINER_CHUNK_OVERLAP)) for content in contents]
+  chunks = [chunk for article_chunks in articles_chunks for chunk in article_chunks]
+  log(f"Split {len(contents)} articles into {len(chunks)} chunks")
+  chunks_locations = await extract_locations_from_ner_batch(chunks)
+  result = []
+  offset = 0
+  for article_chunks in articles_chunks:
+    tags = []
+    for ner_locations in chunks_locations[offset:offset + len(article_chunks)]:
+      tags += ner_locations
+    offset += len(article_chunks)
+    result.append(LocationTags(tags))
+  return result
+
+async def extract_locations_from_ner(response_str):
+  locations = await extract_locations_from_ner_batch([response_str])
+  return locations[0]
+
+async def extract_locations_from_ner_batch(chunks: List[str]) -> List[List[dict]]:
+  chunks = [normalize_chunk(chunk) for chunk in chunks]
+  batch_entities = await predict_entities_cached(chunks)
+  return [locations_from_entities(chunk, entities) for chunk, entities in zip(chunks, batch_entities)]
+
+def normalize_chunk(chunk: str) -> str:
+  """ Same text the model sees either way, GLiNER splits words on whitespace """
+  return re.sub(r'\s+', ' ', unicodedata.normalize('NFC', chunk)).strip()
+
+def ner_version() -> list:
+  """ Everything besides the text that changes what the model returns """
+  return [GLINER_MODEL, GLINER_BACKEND, sorted(LOCATION_LABELS + OTHER_LABELS), GLINER_THRESHOLD]
+
+def ner_cache_key(chunk: str) -> str:
+  return ner_cache.key(ner_version(), chunk)
+
+async def predict_entities_cached(chunks: List[str]) -> List[List[dict]]:
+  """ Entities of each chunk, only chunks missing from the cache go through the model """
+  keys = [ner_cache_key(chunk) for chunk in chunks]
+  cached = await ner_cache.aget_many(keys)
+  # identical chunks missing from the cache run once
+  missing = { key: chunk for key, chunk in zip(keys, chunks) if key not in cached }
+  log(f"Extracting Locations from {len(chunks)} chunks, {len(missing)} not cached")
+  if missing:
+    predicted = dict(zip(missing.keys(), await ner_batcher.run(list(missing.values()))))
+    await ner_cache.aset_many(predicted)
+    cached.update(predicted)
+  return [cached[key] for key in keys]
+
+def predict_entities_batch(chunks: List[str]) -> List[List[dict]]:
+  """ Runs on a batcher thread, never on a request's event loop """
   labels = LOCATION_LABELS + OTHER_LABELS
-  entities = model.predict_entities(response_str, labels, threshold=0.4)
-  for entity in entities:
+  if ner_pool is not None:
+    return ner_pool.run(gliner_worker.predict_entities_batch, chunks, labels, GLINER_THRESHOLD)
+  model = get_gliner_model()
+  return model.batch_predict_entities(chunks, labels, threshold=GLINER_THRESHOLD)
+
+def locations_from_entities(response_str, entities):
+  locations = []
+  # the chunk is normalized and scanned once for all the entities
+  mentions = mentions_in_text([entity['text'] for entity in entities], response_str)
+  for entity, count in zip(entities, mentions):
     if entity['label'] in OTHER_LABELS:
       continue
     # NER will sometimes put the type of location in the text. We ignore it.
     if (entity['text'].lower() in ['municipio', 'ciudad', 'estado']):
       continue
-    if str_in_text(entity['text'], response_str) > 0:
+    if count > 0:
       locations.append({ entity["label"]: entity["text"] })
     else:
       warn(f"Ignoring NER label/value: {entity['label']}:\"{entity['text']}\" not found in text")
@@ -42,6 +122,16 @@ def extract_locations_from_ner(response_str):
 def get_gliner_model():
   global Cached_Model
   if not Cached_Model:
-    Cached_Model = GLiNER.from_pretrained("urchade/gliner_multi-v2.1")
-    Cached_Model.eval()
-  return Cached_Model
\ No newline at end of file
+    Cached_Model = load_model(GLINER_BACKEND, GLINER_THREADS)
+  return Cached_Model
+
+ner_cache = TieredCache('ner', NER_CACHE_TTL, NER_CACHE_MAX_ENTRIES, NER_CACHE_PERSIST)
+ner_pool = WorkerPool(GLINER_WORKERS, gliner_worker.init_worker, (GLINER_THREADS, GLINER_BACKEND)) if GLINER_WORKERS > 0 else None
+ner_batcher = MicroBatcher(
+  predict_entities_batch,
+  GLINER_BATCH_SIZE,
+  GLINER_BATCH_WAIT,
+  name='gliner',
+  concurrency=max(1, GLINER_WORKERS),
+  max_pending=GLINER_MAX_PENDING
+)
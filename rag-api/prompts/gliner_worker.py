@@ -0,0 +1,22 @@
+import os
+from prompts.ner_backends import load_model
+
+"""
+  Code that runs inside the GLiNER worker processes (see base/worker_pool.py). Apart from the
+  backends it imports nothing from rag-api. A spawned worker also imports the server's main
+  module, which is why the server is started from server.py and not from index.py.
+"""
+Worker_Model = None
+
+def init_worker(threads: int, backend: str = 'torch') -> None:
+  """ Pins the torch thread pools of this process before loading the model """
+  global Worker_Model
+  for var in ['OMP_NUM_THREADS', 'MKL_NUM_THREADS']:
+    os.environ[var] = str(threads)
+  import torch
+  torch.set_num_threads(threads)
+  torch.set_num_interop_threads(1)
+  Worker_Model = load_model(backend, threads)
+
+def predict_entities_batch(chunks: list[str], labels: list[str], threshold: float) -> list[list[dict]]:
+  return Worker_Model.batch_predict_entities(chunks, labels, threshold=threshold)
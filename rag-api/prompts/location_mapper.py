@@ -1,7 +1,15 @@
 import json
 import sys
+import time
+import asyncio
+import hashlib
 from base.request import get_url
 from base.logger import log
+from base.logger import warn
+from base.fuzzy_search import FuzzyIndex
+from base.fuzzy_snapshot import write_snapshot
+from base.fuzzy_snapshot import load_snapshot
+from base.fuzzy_snapshot import read_snapshot_metadata
 from aiofiles import open as aio_open
 from providers.overpass_provider import get_locations_by_place
 from providers.overpass_provider import get_locations_by_admin_level
@@ -10,12 +18,26 @@ from providers.overpass_provider import PLACE_TYPE_CITY
 from providers.overpass_provider import PLACE_TYPE_HAMLET
 from providers.overpass_provider import PLACE_TYPE_TOWN
 from providers.overpass_provider import PLACE_TYPE_VILLAGE
+from providers.overpass_provider import PLACE_TYPE_STATE
+from providers.overpass_provider import PLACE_TYPE_COUNTRY
 from providers.overpass_provider import MEXICO_AREA_CODE
 from providers.overpass_provider import ADMIN_LEVEL_CITY
 from providers.overpass_provider import ADMIN_LEVEL_STATE
 from providers.overpass_provider import ADMIN_LEVEL_COUNTRY
 
 CACHE_FILE = 'storage/locations_map.json'
+# compiled fuzzy search indexes of CACHE_FILE, see base/fuzzy_snapshot.py
+SNAPSHOT_FILE = 'storage/locations_map.snapshot'
+# collections in search order, the position is the type id stored in the snapshot
+SNAPSHOT_TYPES = [
+  PLACE_TYPE_COUNTRY,
+  PLACE_TYPE_STATE,
+  PLACE_TYPE_CITY,
+  PLACE_TYPE_BOROUGH,
+  PLACE_TYPE_TOWN,
+  PLACE_TYPE_VILLAGE,
+  PLACE_TYPE_HAMLET
+]
 
 async def get_locations_map() -> dict:
   try:
@@ -40,3 +62,57 @@ async def generate_all():
   async with aio_open(CACHE_FILE, 'w', encoding='utf-8') as file:
     locs_dict_str = json.dumps(locs_dict, ensure_ascii=False)
     await file.write(locs_dict_str)
+  await asyncio.to_thread(build_locations_snapshot)
+
+def locations_map_version() -> str|None:
+  """ sha1 of CACHE_FILE, None when it can't be read """
+  try:
+    with open(CACHE_FILE, 'rb') as file:
+      return hashlib.sha1(file.read()).hexdigest()
+  except OSError:
+    return None
+
+def build_locations_snapshot() -> dict|None:
+  """ Compiles CACHE_FILE into SNAPSHOT_FILE, returns the snapshot metadata """
+  try:
+    with open(CACHE_FILE, 'rb') as file:
+      contents = file.read()
+    loc_map = json.loads(contents)
+  except Exception as e:
+    warn(f"Can't build the locations snapshot, {CACHE_FILE} could not be read: {e}")
+    return None
+  indexes = {}
+  for type in SNAPSHOT_TYPES:
+    if type not in loc_map:
+      warn(f"{CACHE_FILE} has no '{type}' locations")
+    indexes[type] = FuzzyIndex(loc_map.get(type, []))
+  metadata = {
+    'version': hashlib.sha1(contents).hexdigest(),
+    'created_at': time.time(),
+    'counts': { type: len(index.items) for type, index in indexes.items() },
+  }
+  write_snapshot(SNAPSHOT_FILE, indexes, metadata)
+  log(f"Locations snapshot {metadata['version']} written to {SNAPSHOT_FILE}")
+  return metadata
+
+def load_locations_snapshot() -> tuple[dict, dict[str, FuzzyIndex]]|None:
+  """
+    Maps SNAPSHOT_FILE, compiling it first when it's missing or was built from a different
+    CACHE_FILE. Returns (metadata, type -> FuzzyIndex) or None when neither can be read.
+  """
+  version = locations_map_version()
+  try:
+    metadata = read_snapshot_metadata(SNAPSHOT_FILE)
+    stale = version is not None and metadata['version'] != version
+  except FileNotFoundError:
+    stale = True
+  except Exception as e:
+    warn(f"Discarding unreadable locations snapshot: {e}")
+    stale = True
+  if stale and build_locations_snapshot() is None:
+    return None
+  return load_snapshot(SNAPSHOT_FILE)
+
+if __name__ == '__main__':
+  # build step: python -m prompts.location_mapper
+  build_locations_snapshot()
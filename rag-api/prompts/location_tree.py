@@ -1,19 +1,88 @@
-from typing import List
+from typing import List, Callable
+from collections import defaultdict
 from base.logger import log
 from entities.article_location import ArticleLocation
+from entities.article_location import LOCATION_TYPES_BY_RANK
 
 class LocationTree:
+  """
+    Locations indexed by the value of each of their place type fields (e.g. ('state', 'Jalisco')),
+    so children and parents are looked up instead of scanning every location. A location's
+    children share the value of its most specific type and have a higher rank_address.
+    Removal is O(1) and locations keep the order they were added in.
+  """
   def __init__(self, locations: List[ArticleLocation] = None):
-    self.locations = locations or []
+    # id(location) -> location, in insertion order
+    self._nodes = {}
+    self._order = {}
+    # (type, value) -> locations with that value in that field
+    self._by_field = defaultdict(dict)
+    # (type, value) -> locations whose most specific type has that value
+    self._by_own_type = defaultdict(dict)
+    self._next_order = 0
+    for location in locations or []:
+      self.add(location)
+
+  @property
+  def locations(self) -> List[ArticleLocation]:
+    return list(self._nodes.values())
+
+  def _fields(self, location: ArticleLocation) -> List[tuple]:
+    return [(type, value) for type in LOCATION_TYPES_BY_RANK if (value := getattr(location, type))]
+
+  def _own_field(self, location: ArticleLocation) -> tuple|None:
+    loc_type = location.get_lower_rank_type()
+    return (loc_type, location[loc_type]) if loc_type else None
 
   def add(self, location: ArticleLocation):
-    self.locations.append(location)
+    key = id(location)
+    self._nodes[key] = location
+    self._order[key] = self._next_order
+    self._next_order += 1
+    for field in self._fields(location):
+      self._by_field[field][key] = location
+    own_field = self._own_field(location)
+    if own_field:
+      self._by_own_type[own_field][key] = location
+
+  def remove(self, location: ArticleLocation):
+    key = id(location)
+    if self._nodes.pop(key, None) is None:
+      return
+    del self._order[key]
+    for field in self._fields(location):
+      self._by_field[field].pop(key, None)
+    own_field = self._own_field(location)
+    if own_field:
+      self._by_own_type[own_field].pop(key, None)
 
   def get_children(self, location: ArticleLocation) -> List[ArticleLocation]:
-    return [loc for loc in self.locations if self.is_location_child_of(loc, location)]
+    own_field = self._own_field(location)
+    if not own_field:
+      return []
+    return [loc for loc in self._by_field[own_field].values() if loc.rank_address > location.rank_address]
 
   def get_parent(self, location: ArticleLocation) -> ArticleLocation :
-    return next((loc for loc in self.locations if self.is_location_parent_of(loc, location)), None)
+    # a parent's own field is one of the location's fields, the first added one wins
+    candidates = [
+      loc for field in self._fields(location) for loc in self._by_own_type[field].values()
+      if loc.rank_address < location.rank_address
+    ]
+    return min(candidates, key=lambda loc: self._order[id(loc)], default=None)
+
+  def prune(self, keep: Callable[[ArticleLocation], bool]) -> List[ArticleLocation]:
+    """
+      Removes every location for which keep() is false and that has no children left, until
+      none is left to remove. Children always rank higher than their parent, so going from
+      the highest rank down every location is settled after its children, in a single pass.
+      Returns the removed locations.
+    """
+    removed = []
+    for location in sorted(self.locations, key=lambda loc: loc.rank_address, reverse=True):
+      if not keep(location) and len(self.get_children(location)) == 0:
+        self.remove(location)
+        removed.append(location)
+    return removed
 
   def is_location_child_of(self, location: ArticleLocation, parent: ArticleLocation) -> bool:
     loc_type = parent.get_lower_rank_type()
@@ -34,4 +103,4 @@ class LocationTree:
       log(f" > Parent: {formatter(parent)}") if parent else log(" > Parent: None")
       log(f" > Children: count({len(children)})")
       for child in children:
-        log(f"   > {formatter(child)}")
\ No newline at end of file
+        log(f"   > {formatter(child)}")
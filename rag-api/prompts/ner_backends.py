@@ -0,0 +1,109 @@
+import os
+import argparse
+
+"""
+  Ways of running the GLiNER model, selected with GLINER_BACKEND:
+
+    torch       fp32 PyTorch, the original setup
+    torch-int8  PyTorch with the Linear layers dynamically quantized to int8
+    onnx        ONNX Runtime over the model exported by export_onnx()
+    onnx-int8   ONNX Runtime over the int8 dynamically quantized export
+    stub        no model, labels the stub gazetteer places (stubs/gliner_stub.py) for load tests
+
+  All of them return a model with the same batch_predict_entities() interface. Like the worker
+  code it imports nothing else from rag-api, torch and gliner are only imported when loading.
+
+  Export the ONNX models once with:
+    poetry run python -m prompts.ner_backends --quantize
+"""
+GLINER_MODEL = "urchade/gliner_multi-v2.1"
+GLINER_ONNX_DIR = os.environ.get("GLINER_ONNX_DIR", "storage/gliner_onnx")
+ONNX_FILE = "model.onnx"
+ONNX_INT8_FILE = "model_quantized.onnx"
+BACKENDS = ['torch', 'torch-int8', 'onnx', 'onnx-int8', 'stub']
+
+def load_torch():
+  from gliner import GLiNER
+  model = GLiNER.from_pretrained(GLINER_MODEL)
+  model.eval()
+  return model
+
+def load_torch_int8():
+  import torch
+  model = load_torch()
+  # weights are stored as int8, activations are quantized on the fly
+  torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+  return model
+
+def load_onnx(file_name: str = ONNX_FILE, threads: int = None):
+  from gliner import GLiNER
+  if not os.path.exists(os.path.join(GLINER_ONNX_DIR, file_name)):
+    raise FileNotFoundError(f"{GLINER_ONNX_DIR}/{file_name} not found, export it with python -m prompts.ner_backends")
+  session_options = None
+  if threads:
+    # onnxruntime keeps its own thread pools, torch.set_num_threads doesn't reach them
+    import onnxruntime
+    session_options = onnxruntime.SessionOptions()
+    session_options.intra_op_num_threads = threads
+    session_options.inter_op_num_threads = 1
+  return GLiNER.from_pretrained(
+    GLINER_ONNX_DIR,
+    load_onnx_model=True,
+    load_tokenizer=True,
+    onnx_model_file=file_name,
+    session_options=session_options
+  )
+
+def load_model(backend: str = 'torch', threads: int = None):
+  if backend == 'torch':
+    return load_torch()
+  if backend == 'torch-int8':
+    return load_torch_int8()
+  if backend == 'onnx':
+    return load_onnx(ONNX_FILE, threads)
+  if backend == 'onnx-int8':
+    return load_onnx(ONNX_INT8_FILE, threads)
+  if backend == 'stub':
+    from stubs.gliner_stub import StubGLiNER
+    return StubGLiNER()
+  raise ValueError(f"Unknown NER backend: {backend}, expected one of {', '.join(BACKENDS)}")
+
+def export_onnx(directory: str = GLINER_ONNX_DIR, quantize: bool = False) -> None:
+  """ Saves the model config and tokenizer to <directory> with the network exported to ONNX """
+  import torch
+  model = load_torch()
+  model.save_pretrained(directory)
+  inputs, _ = model.prepare_model_inputs(["Export of the GLiNER model in Guadalajara, Jalisco."], ["Ciudad", "Estado"])
+  input_names = ['input_ids', 'attention_mask', 'words_mask', 'text_lengths']
+  dynamic_axes = {
+    'input_ids': { 0: 'batch_size', 1: 'sequence_length' },
+    'attention_mask': { 0: 'batch_size', 1: 'sequence_length' },
+    'words_mask': { 0: 'batch_size', 1: 'sequence_length' },
+    'text_lengths': { 0: 'batch_size', 1: 'value' },
+    'logits': { 0: 'position', 1: 'batch_size', 2: 'sequence_length', 3: 'num_classes' },
+  }
+  if model.config.span_mode != 'token_level':
+    input_names += ['span_idx', 'span_mask']
+    dynamic_axes['span_idx'] = { 0: 'batch_size', 1: 'num_spans', 2: 'idx' }
+    dynamic_axes['span_mask'] = { 0: 'batch_size', 1: 'num_spans' }
+  onnx_path = os.path.join(directory, ONNX_FILE)
+  torch.onnx.export(
+    model.model,
+    tuple(inputs[name] for name in input_names),
+    f=onnx_path,
+    input_names=input_names,
+    output_names=['logits'],
+    dynamic_axes=dynamic_axes,
+    opset_version=14
+  )
+  if quantize:
+    from onnxruntime.quantization import quantize_dynamic
+    from onnxruntime.quantization import QuantType
+    quantize_dynamic(onnx_path, os.path.join(directory, ONNX_INT8_FILE), weight_type=QuantType.QUInt8)
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser(description='Export the GLiNER model to ONNX')
+  parser.add_argument('--dir', default=GLINER_ONNX_DIR)
+  parser.add_argument('--quantize', action='store_true', help='Also write an int8 dynamically quantized model')
+  args = parser.parse_args()
+  export_onnx(args.dir, args.quantize)
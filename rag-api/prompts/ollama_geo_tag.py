@@ -1,8 +1,8 @@
+import asyncio
 from base.logger import log
 from base.logger import error
 from string import Template
-from base.json_parse import try_parse_json
-from base.services import get_ollama
+from providers.ollama_provider import generate_json
 from entities.location_tags import LocationTags
 
 def build_prompt_country(content):
@@ -31,13 +31,11 @@ def build_prompt_administrative(content, admin_name, country):
 
 async def geo_tag_content(content: str) -> LocationTags:
   try:
-    model = get_ollama()
-    prompt = build_prompt_country(content)
-    response = model.invoke(prompt)
-    country_json = try_parse_json(response)
-    prompt = build_prompt_administrative(content, 'estado', 'Mexico')
-    response = model.invoke(prompt)
-    state_json = try_parse_json(response)
+    # both prompts at once, each one stops generating once its JSON answer is complete
+    country_json, state_json = await asyncio.gather(
+      generate_json(build_prompt_country(content)),
+      generate_json(build_prompt_administrative(content, 'estado', 'Mexico')),
+    )
     return LocationTags([country_json, state_json])
   except Exception as e:
     error(e)
@@ -1,51 +1,78 @@
-from logging import warn
 import os
-import json
 from base.logger import debug
-from base.request import get_url
+from base.logger import warn
+from base.request import get_json
+from base.async_utils import gather_limited
 from base.json_search import JSONSearch
 
+NOMINATIM_HOST = os.environ.get("NOMINATIM_HOST", "nominatim")
 NOMINATIM_PORT = os.environ.get("NOMINATIM", "8080")
-NOMINATIM_REVERSE_URL = 'http://nominatim:{port}/reverse?lat={lat}&lon={lon}&format=json'
-NOMINATIM_SEARCH_URL = 'http://nominatim:{port}/search?q={query}&addressdetails=1&limit=1'
-NOMINATIM_SEARCH_PARAMS_URL = 'http://nominatim:{port}/search?{params}&format=json&limit=1'
-NOMINATIM_DETAILS_URL = 'http://nominatim:{port}/details?place_id={place_id}&addressdetails=1&format=json'
-NOMINATIM_LOOKUP_URL = 'http://nominatim:{port}/lookup?osm_ids={osm_ids}&format=json'
+NOMINATIM_REVERSE_URL = 'http://{host}:{port}/reverse?lat={lat}&lon={lon}&format=json'
+NOMINATIM_SEARCH_URL = 'http://{host}:{port}/search?q={query}&addressdetails=1&limit=1'
+NOMINATIM_SEARCH_PARAMS_URL = 'http://{host}:{port}/search?{params}&format=json&limit=1'
+NOMINATIM_DETAILS_URL = 'http://{host}:{port}/details?place_id={place_id}&addressdetails=1&format=json'
+NOMINATIM_LOOKUP_URL = 'http://{host}:{port}/lookup?osm_ids={osm_ids}&format=json'
+# /lookup has no rank_address, its place_rank is the search rank and differs for some types (town, island...)
+NOMINATIM_LOOKUP_BATCH_URL = 'http://{host}:{port}/lookup?osm_ids={osm_ids}&addressdetails=1&format=jsonv2'
+# most ids nominatim accepts per /lookup call
+LOOKUP_MAX_IDS = 50
+MAX_CONCURRENT_BATCH_LOOKUPS = 4
 
 SEARCH_ALLOWED_PARAMS = ['city', 'state', 'country', 'county', 'street', 'amenity', 'postalcode']
 SEARCH_PARAM_PROMOTIONS = { 'town': 'city' }
 
-def unwrap_single_result(content: str) -> str:
-  json_content = json.loads(content)
-  if len(json_content) == 1:
-    content = json.dumps(json_content[0])
+def unwrap_single_result(content: dict|list) -> dict|list:
+  if isinstance(content, list) and len(content) == 1:
+    return content[0]
   return content
 
 async def reverse_lookup(lat, lon) -> dict:
   """ Makes a reverse lookup using nomatim for a given latitude and longitude. """
-  url = NOMINATIM_REVERSE_URL.format(port=NOMINATIM_PORT, lat=lat, lon=lon)
-  content = await get_url(url)
-  return json.loads(content)
+  url = NOMINATIM_REVERSE_URL.format(host=NOMINATIM_HOST, port=NOMINATIM_PORT, lat=lat, lon=lon)
+  return await get_json(url)
 
 async def address_lookup(osm_id) -> JSONSearch:
   """ Searches an address by osm_id. """
-  url = NOMINATIM_LOOKUP_URL.format(port=NOMINATIM_PORT, osm_ids=osm_id)
-  content = await get_url(url)
+  url = NOMINATIM_LOOKUP_URL.format(host=NOMINATIM_HOST, port=NOMINATIM_PORT, osm_ids=osm_id)
+  content = await get_json(url)
   content = unwrap_single_result(content)
   debug(f"@address_lookup(osm_id={osm_id}) -> {content}")
   return JSONSearch(content)
 
+def osm_lookup_id(osm_type: str, osm_id) -> str:
+  """ Id of a place for /lookup: the osm_type initial followed by the osm_id (e.g. R2340636) """
+  return f"{osm_type[0].upper()}{osm_id}" if osm_type and osm_id else ''
+
+async def lookup_places(osm_ids: list[str]) -> dict[str, JSONSearch]:
+  """
+    Looks up many places by their osm_lookup_id with /lookup calls of up to LOOKUP_MAX_IDS ids.
+    Returns the results by id. Ids not found, or in a call that failed, are left out.
+  """
+  osm_ids = sorted(set(osm_id for osm_id in osm_ids if osm_id))
+  chunks = [osm_ids[i:i + LOOKUP_MAX_IDS] for i in range(0, len(osm_ids), LOOKUP_MAX_IDS)]
+  urls = [NOMINATIM_LOOKUP_BATCH_URL.format(host=NOMINATIM_HOST, port=NOMINATIM_PORT, osm_ids=','.join(chunk)) for chunk in chunks]
+  responses = await gather_limited([get_json(url) for url in urls], MAX_CONCURRENT_BATCH_LOOKUPS, return_exceptions=True)
+  places = {}
+  for chunk, content in zip(chunks, responses):
+    if isinstance(content, Exception) or not isinstance(content, list):
+      warn(f"@lookup_places failed for {len(chunk)} ids: {content}")
+      continue
+    for place in content:
+      places[osm_lookup_id(place.get('osm_type'), place.get('osm_id'))] = JSONSearch(place)
+  debug(f"@lookup_places({len(osm_ids)} ids, {len(chunks)} calls) -> {len(places)} found")
+  return places
+
 async def search_location(query) -> JSONSearch:
   """ Searches a location by name. """
-  url = NOMINATIM_SEARCH_URL.format(port=NOMINATIM_PORT, query=query)
-  content = await get_url(url)
+  url = NOMINATIM_SEARCH_URL.format(host=NOMINATIM_HOST, port=NOMINATIM_PORT, query=query)
+  content = await get_json(url)
   content = unwrap_single_result(content)
   debug(f"@search_location(query={query}) -> {content}")
   return JSONSearch(content)
 
 async def search_location_details(location_id) -> JSONSearch:
-  url = NOMINATIM_DETAILS_URL.format(port=NOMINATIM_PORT, place_id=location_id)
-  content = await get_url(url)
+  url = NOMINATIM_DETAILS_URL.format(host=NOMINATIM_HOST, port=NOMINATIM_PORT, place_id=location_id)
+  content = await get_json(url)
   content = unwrap_single_result(content)
   debug(f"@search_location_details(location_id={location_id}) -> {content}")
   return JSONSearch(content)
@@ -65,11 +92,11 @@ async def search_location_params(params) -> JSONSearch:
   if len(valid_params) == len(params.keys()):
     # merge params dict as URL params key=value and merge them with &
     params = '&'.join([f'{k}={v}' for k, v in params.items()])
-    url = NOMINATIM_SEARCH_PARAMS_URL.format(port=NOMINATIM_PORT, params=params)
-    content = await get_url(url)
+    url = NOMINATIM_SEARCH_PARAMS_URL.format(host=NOMINATIM_HOST, port=NOMINATIM_PORT, params=params)
+    content = await get_json(url)
     content = unwrap_single_result(content)
     debug(f"@search_location_params(params={params}) -> {content}")
   else:
     warn(f"Unsupported params: {params}")
-    content = '[]'
+    content = []
   return JSONSearch(content)
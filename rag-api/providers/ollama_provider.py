@@ -0,0 +1,64 @@
+import os
+import json
+import aiohttp
+from typing import Callable
+from base.logger import debug
+from base.request import http_client
+from base.json_parse import JSONExtractor
+
+"""
+  Async client for the Ollama generate API (https://github.com/ollama/ollama/blob/main/docs/api.md).
+  Requests go through the pooled http_client session so connections are reused across requests,
+  and responses are streamed so the caller can stop reading as soon as it has what it needs:
+  closing the response aborts the request and Ollama stops generating.
+"""
+OLLAMA_HOST = os.environ.get("OLLAMA_HOST", "ollama")
+OLLAMA_PORT = os.environ.get("OLLAMA_PORT")
+OLLAMA_MODEL = os.environ.get("OLLAMA_MODEL", "phi3")
+OLLAMA_GENERATE_URL = 'http://{host}:{port}/api/generate'
+# seconds for the whole generation, and between two streamed chunks
+OLLAMA_TIMEOUT = float(os.environ.get("OLLAMA_TIMEOUT", 120))
+OLLAMA_READ_TIMEOUT = float(os.environ.get("OLLAMA_READ_TIMEOUT", 30))
+
+async def _generate(prompt: str, stop_when: Callable[[str], bool]|None, timeout: float) -> str:
+  url = OLLAMA_GENERATE_URL.format(host=OLLAMA_HOST, port=OLLAMA_PORT)
+  payload = { 'model': OLLAMA_MODEL, 'prompt': prompt, 'stream': True, 'options': { 'temperature': 0 } }
+  client_timeout = aiohttp.ClientTimeout(total=timeout, sock_read=OLLAMA_READ_TIMEOUT)
+  text = ''
+  async with http_client.session().post(url, json=payload, timeout=client_timeout) as response:
+    if response.status != 200:
+      raise RuntimeError(f"Ollama returned {response.status}: {await response.text()}")
+    # one JSON object per line: { "response": "<token>", "done": false }
+    async for line in response.content:
+      if not line.strip():
+        continue
+      chunk = json.loads(line)
+      if 'error' in chunk:
+        raise RuntimeError(f"Ollama error: {chunk['error']}")
+      text += chunk.get('response', '')
+      if chunk.get('done'):
+        break
+      if stop_when is not None and stop_when(text):
+        debug(f"@generate stopped early after {len(text)} chars")
+        break
+  return text
+
+async def generate(prompt: str, stop_when: Callable[[str], bool] = None, timeout: float = OLLAMA_TIMEOUT) -> str:
+  """
+    Completion of <prompt>, streamed until done or until stop_when(text so far) is true.
+    Raises asyncio.TimeoutError after <timeout> seconds.
+  """
+  return await http_client.run(_generate(prompt, stop_when, timeout))
+
+async def generate_json(prompt: str, timeout: float = OLLAMA_TIMEOUT):
+  """ First JSON value of the completion of <prompt>, generation stops once it's complete """
+  extractor = JSONExtractor()
+  scanned = 0
+  def json_complete(text: str) -> bool:
+    nonlocal scanned
+    extractor.feed(text[scanned:])
+    scanned = len(text)
+    return extractor.done
+  text = await generate(prompt, json_complete, timeout)
+  extractor.feed(text[scanned:])
+  return extractor.finish()
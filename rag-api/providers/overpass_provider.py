@@ -1,6 +1,7 @@
-import json
-from typing import List, Dict
 import sys
+import json
+from types import MappingProxyType
+from typing import List, Dict, Tuple, Mapping, NamedTuple
 from base.request import get_url
 from base.logger import log
 """
@@ -24,58 +25,65 @@ PLACE_TYPE_TOWN = 'town'
 PLACE_TYPE_VILLAGE = 'village'
 PLACE_TYPE_HAMLET = 'hamlet'
 
+class PlaceRank(NamedTuple):
+  rank_from: int
+  rank_to: int
+  values: Tuple[str, ...]
+
+# See
+# https://nominatim.org/release-docs/develop/customize/Ranking/#search-rank
+# https://nominatim.org/release-docs/develop/api/Output/#addressdetails
+PLACE_RANKS: Tuple[PlaceRank, ...] = (
+  PlaceRank(1, 3, ('continent', 'ocean')),
+  PlaceRank(4, 4, ('country',)),
+  PlaceRank(5, 9, ('state', 'region', 'province')),
+  PlaceRank(10, 12, ('county',)),
+  PlaceRank(13, 16, ('city', 'municipality', 'island')),
+  PlaceRank(17, 18, ('town', 'borough')),
+  PlaceRank(19, 19, ('village', 'suburb')),
+  PlaceRank(20, 20, ('hamlet', 'farm', 'neighbourhood')),
+  PlaceRank(21, 25, ('isolated_dwelling', 'city_block')),
+)
+
+def get_ranked_place_types(rank_from: int, rank_to: int) -> Tuple[str, ...]:
+  """ Place types whose whole rank interval is within <rank_from> and <rank_to> """
+  return tuple(place for rank in PLACE_RANKS if rank.rank_from >= rank_from and rank.rank_to <= rank_to for place in rank.values)
+
+# Lookup tables computed once from PLACE_RANKS, read only
+PLACE_TYPES_BY_RANK: Tuple[str, ...] = get_ranked_place_types(0, sys.maxsize)
+PLACE_TYPES_BY_RANK_REVERSED: Tuple[str, ...] = tuple(place for rank in reversed(PLACE_RANKS) for place in rank.values)
+# type -> its rank interval
+PLACE_TYPE_RANKS: Mapping[str, PlaceRank] = MappingProxyType({ place: rank for rank in PLACE_RANKS for place in rank.values })
+# rank address -> types whose interval contains it
+RANK_PLACE_TYPES: Mapping[int, Tuple[str, ...]] = MappingProxyType({
+  rank_address: rank.values for rank in PLACE_RANKS for rank_address in range(rank.rank_from, rank.rank_to + 1)
+})
+HIGHER_RANKED_PLACE_TYPES: Mapping[str, Tuple[str, ...]] = MappingProxyType({
+  place: get_ranked_place_types(0, rank.rank_from - 1) for place, rank in PLACE_TYPE_RANKS.items()
+})
+LOWER_RANKED_PLACE_TYPES: Mapping[str, Tuple[str, ...]] = MappingProxyType({
+  place: get_ranked_place_types(rank.rank_to + 1, sys.maxsize) for place, rank in PLACE_TYPE_RANKS.items()
+})
+
 def get_place_ranks() -> List[Dict]:
-  """ See
-      https://nominatim.org/release-docs/develop/customize/Ranking/#search-rank
-      https://nominatim.org/release-docs/develop/api/Output/#addressdetails
-  """
-  return [
-    { 'rank_from': 1, 'rank_to': 3, 'values': ['continent', 'ocean'] },
-    { 'rank_from': 4, 'rank_to': 4, 'values': ['country'] },
-    { 'rank_from': 5, 'rank_to': 9, 'values': ['state', 'region', 'province'] },
-    { 'rank_from': 10, 'rank_to': 12, 'values': ['county'] },
-    { 'rank_from': 13, 'rank_to': 16, 'values': ['city', 'municipality', 'island'] },
-    { 'rank_from': 17, 'rank_to': 18, 'values': ['town', 'borough'] },
-    { 'rank_from': 19, 'rank_to': 19, 'values': ['village', 'suburb'] },
-    { 'rank_from': 20, 'rank_to': 20, 'values': ['hamlet', 'farm', 'neighbourhood'] },
-    { 'rank_from': 21, 'rank_to': 25, 'values': ['isolated_dwelling', 'city_block'] }
-  ]
+  """ PLACE_RANKS as a new list of dicts """
+  return [{ 'rank_from': rank.rank_from, 'rank_to': rank.rank_to, 'values': list(rank.values) } for rank in PLACE_RANKS]
 
-def all_rank_place_types(reversed: bool = False) -> List[str]:
-  ranks = get_place_ranks()
-  if reversed:
-    ranks.reverse()
-  return [place for rank in ranks for place in rank['values']]
+def all_rank_place_types(reversed: bool = False) -> Tuple[str, ...]:
+  return PLACE_TYPES_BY_RANK_REVERSED if reversed else PLACE_TYPES_BY_RANK
 
 def is_type_rank_greater_than(place_left: str, place_right: str) -> bool:
-  ranks = get_place_ranks()
-  rank_left = next((rank for rank in ranks if place_left in rank['values']), None)
-  rank_right = next((rank for rank in ranks if place_right in rank['values']), None)
+  rank_left = PLACE_TYPE_RANKS.get(place_left)
+  rank_right = PLACE_TYPE_RANKS.get(place_right)
   if not rank_left or not rank_right:
     return False
-  return rank_left['rank_from'] > rank_right['rank_from']
-
-def get_ranked_place_types(rank_from: int, rank_to: int) -> List[str]:
-  ranks = get_place_ranks()
-  result = []
-  for rank in ranks:
-    if rank['rank_from'] >= rank_from and rank['rank_to'] <= rank_to:
-      result += rank['values']
-  return result
+  return rank_left.rank_from > rank_right.rank_from
 
-def higher_ranked_place_types(place_type: str) -> List[str]:
-  ranks = get_place_ranks()
-  place_rank = next((rank for rank in ranks if place_type in rank['values']), None)
-  if not place_rank:
-    return []
-  return get_ranked_place_types(0, place_rank['rank_from'] - 1)
+def higher_ranked_place_types(place_type: str) -> Tuple[str, ...]:
+  return HIGHER_RANKED_PLACE_TYPES.get(place_type, ())
 
-def lower_ranked_place_types(place_type: str) -> List[str]:
-  ranks = get_place_ranks()
-  place_rank = next((rank for rank in ranks if place_type in rank['values']), None)
-  if not place_rank:
-    return []
-  return get_ranked_place_types(place_rank['rank_to'] + 1, sys.maxsize)
+def lower_ranked_place_types(place_type: str) -> Tuple[str, ...]:
+  return LOWER_RANKED_PLACE_TYPES.get(place_type, ())
 
 async def get_locations_by_place(code_id: str, place: str) -> List[str]:
   """ See https://wiki.openstreetmap.org/wiki/Key:place for place types."""
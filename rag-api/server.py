@@ -0,0 +1,9 @@
+"""
+  Entry point of the server: python server.py. GLiNER worker processes (GLINER_WORKERS > 0) are
+  spawned, and spawning imports the main module again in each of them as __mp_main__. Started
+  from index.py every worker would load the Flask app, the caches and the providers, so this
+  module imports nothing until it knows it's the server process.
+"""
+if __name__ == '__main__':
+  from index import serve
+  serve()
@@ -0,0 +1,40 @@
+import os
+import re
+import time
+from stubs.nominatim_stub import GAZETTEER
+"""
+  Stand-in for the GLiNER model, selected with GLINER_BACKEND=stub (see prompts/ner_backends.py).
+  Labels the places of the Nominatim stub gazetteer found in each chunk, with the label NER would
+  give their type, and sleeps like inference would: GLINER_STUB_BATCH_MS per batch plus
+  GLINER_STUB_CHUNK_MS per chunk.
+"""
+GLINER_STUB_BATCH_MS = float(os.environ.get("GLINER_STUB_BATCH_MS", 20))
+GLINER_STUB_CHUNK_MS = float(os.environ.get("GLINER_STUB_CHUNK_MS", 10))
+LABELS_BY_DEPTH = ['Pais', 'Estado', 'Ciudad', 'Pueblo']
+
+def gazetteer_labels(gazetteer: dict) -> dict[str, str]:
+  """ Name -> label of every place in <gazetteer> """
+  labels = {}
+  def add(places, depth):
+    for name, children in (places.items() if isinstance(places, dict) else ((name, {}) for name in places)):
+      labels[name] = LABELS_BY_DEPTH[min(depth, len(LABELS_BY_DEPTH) - 1)]
+      add(children, depth + 1)
+  add(gazetteer, 0)
+  return labels
+
+class StubGLiNER:
+  def __init__(self, gazetteer: dict = GAZETTEER) -> None:
+    self.labels = gazetteer_labels(gazetteer)
+    # longest names first so "San Pedro Garza García" wins over a shorter name inside it
+    names = sorted(self.labels, key=len, reverse=True)
+    self.pattern = re.compile(r'\b(?:' + '|'.join(re.escape(name) for name in names) + r')\b')
+
+  def eval(self):
+    return self
+
+  def batch_predict_entities(self, chunks: list[str], labels: list[str], threshold: float = 0.5) -> list[list[dict]]:
+    time.sleep((GLINER_STUB_BATCH_MS + GLINER_STUB_CHUNK_MS * len(chunks)) / 1000)
+    return [[
+      { 'start': match.start(), 'end': match.end(), 'text': match.group(), 'label': self.labels[match.group()], 'score': 0.9 }
+      for match in self.pattern.finditer(chunk) if self.labels[match.group()] in labels
+    ] for chunk in chunks]
@@ -0,0 +1,283 @@
+import json
+import argparse
+import asyncio
+import aiohttp
+from collections import Counter
+from urllib.parse import urlencode
+from aiohttp import web
+from unidecode import unidecode
+"""
+  Minimal stand-in for the Nominatim endpoints used by providers/nominatim_provider.py
+  (/search, /details, /lookup and /reverse). Serves a small synthetic gazetteer with an
+  artificial latency per request so the pipeline can be measured without the full Nominatim
+  container.
+
+  Responses can also be replayed from a fixtures file recorded against a real Nominatim:
+  with --record <url> requests missing from the fixtures are forwarded there and their responses
+  added to the file on exit. Requests missing from the fixtures fall back to the gazetteer.
+
+  Usage: python -m stubs.nominatim_stub --port 8080 --latency 0.02
+         python -m stubs.nominatim_stub --fixtures nominatim.json --record http://localhost:8088
+"""
+FIXTURE_ENDPOINTS = ['search', 'details', 'lookup', 'reverse']
+
+GAZETTEER = {
+  'México': {
+    'Jalisco': {
+      'Guadalajara': ['Tesistán'],
+      'Zapopan': ['Nextipac'],
+      'Tlaquepaque': [],
+      'Puerto Vallarta': ['Las Palmas'],
+    },
+    'Nuevo León': {
+      'Monterrey': [],
+      'San Pedro Garza García': [],
+      'Apodaca': ['Huinalá'],
+    },
+    'Oaxaca': {
+      'Oaxaca de Juárez': [],
+      'Juchitán de Zaragoza': [],
+      'Salina Cruz': [],
+    },
+    'Yucatán': {
+      'Mérida': ['Caucel'],
+      'Valladolid': [],
+      'Progreso': ['Chicxulub Puerto', 'Isla Cerritos'],
+    },
+  }
+}
+# places of the town lists with another type
+PLACE_TYPES = { 'Chicxulub Puerto': 'village', 'Isla Cerritos': 'island' }
+# search rank (place_rank of /search and /lookup) and address rank (rank_address of /details) of
+# each type, they differ like in nominatim for some types
+# https://nominatim.org/release-docs/latest/customize/Ranking/
+PLACE_RANKS = { 'country': 4, 'state': 8, 'city': 16, 'town': 18, 'village': 19, 'island': 17 }
+ADDRESS_RANKS = { 'country': 4, 'state': 8, 'city': 16, 'town': 16, 'village': 16, 'island': 0 }
+SEARCH_PARAMS_ORDER = ['city', 'county', 'state', 'country']
+
+
+def normalize(name: str) -> str:
+  return unidecode(name or '').strip().lower()
+
+def build_places(gazetteer: dict) -> list[dict]:
+  places = []
+  def add(name, type, parent):
+    place_id = len(places) + 1
+    place = {
+      'place_id': place_id,
+      'osm_type': 'relation',
+      'osm_id': 1000 + place_id,
+      'name': name,
+      'type': type,
+      'rank': PLACE_RANKS[type],
+      'rank_address': ADDRESS_RANKS[type],
+      'parent': parent,
+      'lat': f"{19 + place_id / 100:.7f}",
+      'lon': f"{-99 - place_id / 100:.7f}",
+    }
+    places.append(place)
+    return place
+  for country, states in gazetteer.items():
+    country_place = add(country, 'country', None)
+    for state, cities in states.items():
+      state_place = add(state, 'state', country_place)
+      for city, towns in cities.items():
+        city_place = add(city, 'city', state_place)
+        for town in towns:
+          add(town, PLACE_TYPES.get(town, 'town'), city_place)
+  return places
+
+def ancestors(place: dict) -> list[dict]:
+  chain = []
+  while place:
+    chain.append(place)
+    place = place['parent']
+  return chain
+
+def address(place: dict) -> dict:
+  result = { p['type']: p['name'] for p in ancestors(place) }
+  result['country_code'] = 'mx'
+  return result
+
+def place_result(place: dict, address_details: bool) -> dict:
+  result = {
+    'place_id': place['place_id'],
+    'licence': 'Stub data',
+    'osm_type': place['osm_type'],
+    'osm_id': place['osm_id'],
+    'lat': place['lat'],
+    'lon': place['lon'],
+    'class': 'boundary',
+    'type': 'administrative',
+    'place_rank': place['rank'],
+    'addresstype': place['type'],
+    'name': place['name'],
+    'display_name': ', '.join(p['name'] for p in ancestors(place)),
+  }
+  if address_details:
+    result['address'] = address(place)
+  return result
+
+def place_details(place: dict) -> dict:
+  return {
+    'place_id': place['place_id'],
+    'osm_type': place['osm_type'][0].upper(),
+    'osm_id': place['osm_id'],
+    'category': 'boundary',
+    'type': 'administrative',
+    'localname': place['name'],
+    'rank_address': place['rank_address'],
+    'rank_search': place['rank'],
+    'centroid': { 'type': 'Point', 'coordinates': [float(place['lon']), float(place['lat'])] },
+    'address': [{
+      'localname': p['name'],
+      'place_id': p['place_id'],
+      'osm_id': p['osm_id'],
+      'osm_type': p['osm_type'][0].upper(),
+      'class': 'boundary',
+      'type': 'administrative',
+      'rank_address': p['rank_address'],
+      'isaddress': p['rank_address'] > 0,
+      'distance': 0,
+    } for p in ancestors(place)],
+  }
+
+def fixture_key(request: web.Request) -> str:
+  """ Endpoint and query, with the parameters sorted so their order doesn't matter """
+  return f"{request.path.strip('/')}?{urlencode(sorted(request.query.items()))}"
+
+def load_fixtures(path: str) -> dict:
+  try:
+    with open(path, 'r', encoding='utf-8') as file:
+      return json.load(file)
+  except FileNotFoundError:
+    return {}
+
+def save_fixtures(path: str, fixtures: dict) -> None:
+  with open(path, 'w', encoding='utf-8') as file:
+    json.dump(fixtures, file, ensure_ascii=False, indent=1, sort_keys=True)
+
+class NominatimStub:
+  def __init__(self, places: list[dict], latency: float = 0.0, fixtures: dict = None, upstream: str = None) -> None:
+    self.places = places
+    self.latency = latency
+    self.calls = Counter()
+    # fixture key -> { "status", "body" } of the recorded response
+    self.fixtures = fixtures if fixtures is not None else {}
+    self.upstream = upstream.rstrip('/') if upstream else None
+    self.recorded = 0
+
+  async def record(self, request: web.Request) -> dict|None:
+    """ Response of the upstream Nominatim to <request>, None when it can't be reached """
+    try:
+      async with aiohttp.ClientSession() as session:
+        async with session.get(f"{self.upstream}{request.path}", params=request.query) as response:
+          return { 'status': response.status, 'body': await response.json(content_type=None) }
+    except Exception as e:
+      print(f"Could not record {request.path_qs}: {e}")
+      return None
+
+  @web.middleware
+  async def replay(self, request: web.Request, handler):
+    endpoint = request.path.strip('/')
+    if endpoint not in FIXTURE_ENDPOINTS:
+      return await handler(request)
+    key = fixture_key(request)
+    fixture = self.fixtures.get(key)
+    if fixture is None and self.upstream:
+      fixture = await self.record(request)
+      if fixture is not None:
+        self.fixtures[key] = fixture
+        self.recorded += 1
+    if fixture is None:
+      return await handler(request)
+    await self.delay(endpoint)
+    return web.json_response(fixture['body'], status=fixture['status'])
+
+  def find(self, names: list[str]) -> dict|None:
+    """ First place named names[0] whose ancestors include the rest of names """
+    names = [normalize(name) for name in names if name]
+    if not names:
+      return None
+    for place in self.places:
+      chain = [normalize(p['name']) for p in ancestors(place)]
+      if chain[0] == names[0] and all(name in chain[1:] for name in names[1:]):
+        return place
+    return None
+
+  async def delay(self, endpoint: str) -> None:
+    self.calls[endpoint] += 1
+    if self.latency:
+      await asyncio.sleep(self.latency)
+
+  async def search(self, request: web.Request) -> web.Response:
+    await self.delay('search')
+    query = request.query
+    address_details = query.get('addressdetails') == '1'
+    if 'q' in query:
+      place = self.find(query['q'].split(','))
+    else:
+      place = self.find([query.get(key) for key in SEARCH_PARAMS_ORDER if query.get(key)])
+    return web.json_response([place_result(place, address_details)] if place else [])
+
+  async def details(self, request: web.Request) -> web.Response:
+    await self.delay('details')
+    place_id = request.query.get('place_id', '')
+    place = next((p for p in self.places if str(p['place_id']) == place_id), None)
+    if not place:
+      return web.json_response({ 'error': { 'code': 404, 'message': 'No place with that OSM ID found.' } }, status=404)
+    return web.json_response(place_details(place))
+
+  async def lookup(self, request: web.Request) -> web.Response:
+    await self.delay('lookup')
+    address_details = request.query.get('addressdetails', '1') == '1'
+    by_osm_id = { f"{p['osm_type'][0].upper()}{p['osm_id']}": p for p in self.places }
+    osm_ids = [osm_id.strip() for osm_id in request.query.get('osm_ids', '').split(',')]
+    places = [by_osm_id[osm_id] for osm_id in osm_ids if osm_id in by_osm_id]
+    return web.json_response([place_result(place, address_details) for place in places])
+
+  async def reverse(self, request: web.Request) -> web.Response:
+    await self.delay('reverse')
+    lat = float(request.query.get('lat', 0))
+    lon = float(request.query.get('lon', 0))
+    place = min(self.places, key=lambda p: (float(p['lat']) - lat) ** 2 + (float(p['lon']) - lon) ** 2)
+    return web.json_response(place_result(place, True))
+
+  async def stats(self, request: web.Request) -> web.Response:
+    return web.json_response(dict(self.calls))
+
+  def app(self) -> web.Application:
+    app = web.Application(middlewares=[self.replay])
+    app.router.add_get('/search', self.search)
+    app.router.add_get('/details', self.details)
+    app.router.add_get('/lookup', self.lookup)
+    app.router.add_get('/reverse', self.reverse)
+    app.router.add_get('/_stats', self.stats)
+    return app
+
+async def start_stub(port: int, latency: float = 0.0, host: str = '127.0.0.1', fixtures: str = None) -> tuple[NominatimStub, web.AppRunner]:
+  """ Starts the stub inside the running event loop. Call runner.cleanup() to stop it. """
+  stub = NominatimStub(build_places(GAZETTEER), latency, load_fixtures(fixtures) if fixtures else None)
+  runner = web.AppRunner(stub.app())
+  await runner.setup()
+  await web.TCPSite(runner, host, port).start()
+  return stub, runner
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser(description='Nominatim stub server')
+  parser.add_argument('--host', default='0.0.0.0')
+  parser.add_argument('--port', type=int, default=8080)
+  parser.add_argument('--latency', type=float, default=0.0, help='Seconds to wait before answering each request')
+  parser.add_argument('--fixtures', help='JSON file of recorded responses to replay')
+  parser.add_argument('--record', metavar='URL', help='Nominatim to forward the requests missing from --fixtures to, adding them to it')
+  args = parser.parse_args()
+  if args.record and not args.fixtures:
+    parser.error('--record needs --fixtures')
+  stub = NominatimStub(build_places(GAZETTEER), args.latency, load_fixtures(args.fixtures) if args.fixtures else None, args.record)
+  app = stub.app()
+  if args.record:
+    async def write_fixtures(app):
+      save_fixtures(args.fixtures, stub.fixtures)
+      print(f"{stub.recorded} responses recorded, {len(stub.fixtures)} in {args.fixtures}")
+    app.on_cleanup.append(write_fixtures)
+  web.run_app(app, host=args.host, port=args.port)
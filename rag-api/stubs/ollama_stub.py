@@ -0,0 +1,88 @@
+import re
+import json
+import asyncio
+import argparse
+from collections import Counter
+from aiohttp import web
+"""
+  Minimal stand-in for the Ollama generate API used by providers/ollama_provider.py. Answers the
+  prompts of prompts/ollama_geo_tag.py with a short JSON object wrapped in the kind of chatter
+  small models add around it, streamed a few characters at a time with a delay per token, so
+  concurrency, early stopping and timeouts can be measured without a model.
+
+  Usage: python -m stubs.ollama_stub --port 11434 --token-latency 0.01
+"""
+STATES = ['Jalisco', 'Nuevo León', 'Oaxaca', 'Yucatán', 'Colima', 'Sonora']
+TOKEN_CHARS = 4
+EPILOGUE = (
+  "Explicación: el artículo menciona explícitamente el lugar y no hay otras referencias "
+  "geográficas relevantes, por lo que la respuesta anterior es la más adecuada. "
+) * 4
+
+def answer(prompt: str) -> str:
+  """ Model output for <prompt>: the JSON answer between a preamble and an epilogue """
+  content = prompt.split('```')[1] if prompt.count('```') >= 2 else prompt
+  if '"pais"' in prompt:
+    value = { 'pais': 'México' }
+  else:
+    admin_name = re.search(r'extrae el (\w+)', prompt)
+    state = next((state for state in STATES if state in content), None)
+    value = { admin_name.group(1) if admin_name else 'estado': state or 'Desconocido' }
+  return f"Aquí está la respuesta en formato JSON:\n```json\n{json.dumps(value, ensure_ascii=False)}\n```\n{EPILOGUE}"
+
+def tokens(text: str) -> list[str]:
+  return [text[i:i + TOKEN_CHARS] for i in range(0, len(text), TOKEN_CHARS)]
+
+class OllamaStub:
+  def __init__(self, token_latency: float = 0.0, model: str = 'phi3') -> None:
+    self.token_latency = token_latency
+    self.model = model
+    self.calls = Counter()
+
+  async def generate(self, request: web.Request) -> web.Response:
+    self.calls['generate'] += 1
+    body = await request.json()
+    output = answer(body.get('prompt', ''))
+    if not body.get('stream', True):
+      await asyncio.sleep(self.token_latency * len(tokens(output)))
+      self.calls['tokens'] += len(tokens(output))
+      return web.json_response({ 'model': self.model, 'response': output, 'done': True })
+    response = web.StreamResponse(headers={ 'Content-Type': 'application/x-ndjson' })
+    await response.prepare(request)
+    try:
+      for token in tokens(output):
+        if self.token_latency:
+          await asyncio.sleep(self.token_latency)
+        await response.write(json.dumps({ 'model': self.model, 'response': token, 'done': False }).encode() + b'\n')
+        self.calls['tokens'] += 1
+      await response.write(json.dumps({ 'model': self.model, 'response': '', 'done': True }).encode() + b'\n')
+      await response.write_eof()
+    except (ConnectionResetError, asyncio.CancelledError):
+      # the client stopped reading, as ollama does it stops generating
+      self.calls['disconnected'] += 1
+    return response
+
+  async def stats(self, request: web.Request) -> web.Response:
+    return web.json_response(dict(self.calls))
+
+  def app(self) -> web.Application:
+    app = web.Application()
+    app.router.add_post('/api/generate', self.generate)
+    app.router.add_get('/_stats', self.stats)
+    return app
+
+async def start_stub(port: int, token_latency: float = 0.0, host: str = '127.0.0.1') -> tuple[OllamaStub, web.AppRunner]:
+  """ Starts the stub inside the running event loop. Call runner.cleanup() to stop it. """
+  stub = OllamaStub(token_latency)
+  runner = web.AppRunner(stub.app())
+  await runner.setup()
+  await web.TCPSite(runner, host, port).start()
+  return stub, runner
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser(description='Ollama stub server')
+  parser.add_argument('--host', default='0.0.0.0')
+  parser.add_argument('--port', type=int, default=11434)
+  parser.add_argument('--token-latency', type=float, default=0.0, help='Seconds to wait before streaming each token')
+  args = parser.parse_args()
+  web.run_app(OllamaStub(args.token_latency).app(), host=args.host, port=args.port)
@@ -0,0 +1,53 @@
+import socket
+import asyncio
+from base import request
+from providers import nominatim_provider
+from providers.nominatim_provider import search_location
+from providers.nominatim_provider import search_location_details
+from prompts.article_geo_location import geo_locations_from_results
+from prompts.article_geo_location import filter_locations_between_rank
+from prompts.article_geo_location import MIN_LOCATION_RANK
+from prompts.article_geo_location import MAX_LOCATION_RANK
+from stubs.nominatim_stub import start_stub
+
+# a city and places whose search rank isn't their address rank
+QUERIES = ['Guadalajara', 'Tesistán', 'Chicxulub Puerto', 'Isla Cerritos']
+
+def free_port() -> int:
+  with socket.socket() as sock:
+    sock.bind(('127.0.0.1', 0))
+    return sock.getsockname()[1]
+
+def with_stub(monkeypatch, tmp_path, test):
+  """ Runs test(stub) with the provider pointing to a Nominatim stub and empty caches """
+  port = free_port()
+  monkeypatch.setattr(nominatim_provider, 'NOMINATIM_HOST', '127.0.0.1')
+  monkeypatch.setattr(nominatim_provider, 'NOMINATIM_PORT', str(port))
+  monkeypatch.setattr(request, 'CACHE_DIR', str(tmp_path))
+  request.memory_cache.clear()
+  async def run():
+    stub, runner = await start_stub(port)
+    try:
+      return await test(stub)
+    finally:
+      await runner.cleanup()
+  try:
+    return asyncio.run(run())
+  finally:
+    request.memory_cache.clear()
+
+def test_rank_address_from_details(monkeypatch, tmp_path):
+  async def test(stub):
+    results = [await search_location(query) for query in QUERIES]
+    locations = await geo_locations_from_results(results)
+    details = [await search_location_details(result.search('place_id')) for result in results]
+    return results, locations, details, stub.calls['lookup']
+  results, locations, details, lookups = with_stub(monkeypatch, tmp_path, test)
+  assert lookups == 1
+  for query, location, place_details in zip(QUERIES, locations, details):
+    assert location.rank_address == place_details.search('rank_address'), query
+  # the search rank of the town, village and island is not their address rank
+  assert [result.search('place_rank') != location.rank_address for result, location in zip(results, locations)] == [False, True, True, True]
+  # islands have no address rank
+  kept = filter_locations_between_rank(locations, MIN_LOCATION_RANK, MAX_LOCATION_RANK)
+  assert [location.place_id for location in kept] == [result.search('place_id') for result in results[:3]]
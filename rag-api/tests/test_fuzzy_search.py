@@ -0,0 +1,35 @@
+import os
+from thefuzz import fuzz
+from thefuzz import process
+from base.fuzzy_search import FuzzyIndex
+from base.fuzzy_search import PackedStrings
+from base.fuzzy_snapshot import write_snapshot
+from base.fuzzy_snapshot import load_snapshot
+
+NAMES = ['Guadalajara', 'Zapopan', 'San Pedro Garza García', 'García', 'garcia', 'Mérida', '', 'Oaxaca de Juárez', 'Juárez']
+QUERIES = ['guadalajara', 'Garcia', 'GARCÍA', 'Merida', 'Garza Garcia San Pedro', 'Zapopam', 'Oaxaca de Juarez', '', 'Tijuana']
+
+def extract_one(keyword: str, min_score: int):
+  match = process.extractOne(keyword, NAMES, scorer=fuzz.token_sort_ratio)
+  return (match[0], int(match[1])) if match and int(match[1]) >= min_score else None
+
+def test_matches_extract_one():
+  index = FuzzyIndex(NAMES)
+  for min_score in [80, 97]:
+    expected = [extract_one(query, min_score) for query in QUERIES]
+    assert [index.best_match(query, min_score) for query in QUERIES] == expected
+    assert index.best_matches(QUERIES, min_score) == expected
+
+def test_snapshot_shares_strings(tmp_path):
+  path = os.path.join(tmp_path, 'index.snapshot')
+  write_snapshot(path, { 'city': FuzzyIndex(NAMES) }, { 'version': 'test' })
+  metadata, indexes = load_snapshot(path)
+  index = indexes['city']
+  assert metadata == { 'version': 'test' }
+  # read from the mapped arrays, not unpacked into lists
+  assert isinstance(index.items, PackedStrings) and isinstance(index.keys, PackedStrings)
+  assert list(index.items) == NAMES
+  assert index.items[-1] == NAMES[-1]
+  # the first of the names sharing a key wins, as extractOne picks the first
+  assert index.best_match('garcía', 97) == ('García', 100)
+  assert [index.best_match(query, 97) for query in QUERIES] == [extract_one(query, 97) for query in QUERIES]
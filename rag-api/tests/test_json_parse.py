@@ -0,0 +1,109 @@
+import json
+import time
+import random
+import pytest
+from base.json_parse import JSONExtractor
+from base.json_parse import MAX_RESTARTS
+from base.json_parse import try_parse_json
+
+TEXT_CHARS = 'abc xyz ÁÉñü{}[]"\\:,\n\t/'
+PROSE = ['Aquí está la respuesta:', '```json', '```', 'Nota: {placeholder} y [ver abajo]', 'Claro.', '}', ']', 'Espero que ayude.']
+# text before the value that leaves a bracket open, the value is only found at the end of the output
+UNBALANCED_PROSE = ['usa { para abrir', 'lista [ incompleta', 'ver "nota {1}" y [2, 3} más']
+
+def random_value(rand: random.Random, depth: int = 0):
+  kind = rand.randrange(7 if depth < 4 else 5)
+  if kind == 0:
+    return rand.randint(-1000, 1000)
+  if kind == 1:
+    return rand.choice([True, False, None, 1.5])
+  if kind in (2, 3, 4):
+    return ''.join(rand.choice(TEXT_CHARS) for _ in range(rand.randint(0, 12)))
+  if kind == 5:
+    return [random_value(rand, depth + 1) for _ in range(rand.randint(0, 4))]
+  return { random_value(rand, 4) if rand.random() < 0.5 else f"k{i}": random_value(rand, depth + 1) for i in range(rand.randint(0, 4)) }
+
+def random_case(rand: random.Random) -> tuple[str, object, bool, int]:
+  """
+    (output, value, whether the value can be found before the end of the output, where it ends).
+    The value is compared decoded, json.dumps turns non string keys into strings.
+  """
+  value = random_value(rand, 3)
+  if not isinstance(value, (dict, list)):
+    value = { 'valor': value }
+  early = rand.random() < 0.8
+  before = rand.sample(PROSE, rand.randint(0, 3)) if early else rand.sample(UNBALANCED_PROSE, rand.randint(1, 2))
+  encoded = json.dumps(value, ensure_ascii=rand.random() < 0.5, indent=rand.choice([None, 2]))
+  output = '\n'.join(before + [encoded] + rand.sample(PROSE, rand.randint(0, 3)))
+  return output, json.loads(encoded), early, output.index(encoded) + len(encoded)
+
+def random_chunks(text: str, rand: random.Random) -> list[str]:
+  chunks = []
+  pos = 0
+  while pos < len(text):
+    size = rand.randint(1, 8)
+    chunks.append(text[pos:pos + size])
+    pos += size
+  return chunks
+
+@pytest.mark.parametrize('seed', range(4))
+def test_fuzz_streamed(seed):
+  rand = random.Random(seed)
+  for _ in range(2500):
+    output, value, early, end = random_case(rand)
+    extractor = JSONExtractor()
+    fed = 0
+    found_at = None
+    for chunk in random_chunks(output, rand):
+      fed += len(chunk)
+      if extractor.feed(chunk) is not None and found_at is None:
+        found_at = fed
+    assert extractor.finish() == value, output
+    assert try_parse_json(output) == value, output
+    if early:
+      # found as soon as its closing bracket arrived, not before
+      assert found_at is not None and end <= found_at < end + 8, output
+
+@pytest.mark.parametrize('output, value', [
+  ('', None),
+  ('sin json', None),
+  ('{"a": 1}', { 'a': 1 }),
+  ('[1, 2]', [1, 2]),
+  ('Nota: {placeholder} ```json\n{"a": "}"}\n```', { 'a': '}' }),
+  ('{"a": "\\"{[", "b": [1, {"c": null}]}', { 'a': '"{[', 'b': [1, { 'c': None }] }),
+  ('usa { para abrir {"a": 1}', { 'a': 1 }),
+  ('mal [ cerrado } luego {"a": 1}', { 'a': 1 }),
+  ('{"a": 1', None),
+  ('{"a": 1} {"b": 2}', { 'a': 1 }),
+])
+def test_edge_cases(output, value):
+  assert try_parse_json(output) == value
+
+@pytest.mark.parametrize('text', [
+  '{' * 5000 + '{"a": 1}',
+  'usa { para abrir, ' * 2000 + '{"a": 1}',
+  'ver "nota {1}" y [2, 3} más. ' * 2000 + '{"a": 1}',
+  '[' * 5000 + '{"a": 1} } fin',
+], ids=['nested', 'prose', 'quoted prose', 'mismatched'])
+def test_stray_brackets_linear(text):
+  start = time.perf_counter()
+  assert try_parse_json(text) == { 'a': 1 }
+  # quadratic rescans took seconds here
+  assert time.perf_counter() - start < 2
+
+def test_restarts_bounded():
+  extractor = JSONExtractor()
+  extractor.feed('{x} ' * 1000 + '{"a": 1}')
+  assert extractor.finish() == { 'a': 1 }
+  assert extractor.restarts <= MAX_RESTARTS + 1000
+
+def test_large_response():
+  value = [{ 'nombre': f"Lugar {{{i}}}", 'valores': [i, str(i)] } for i in range(50000)]
+  output = 'Aquí está:\n```json\n' + json.dumps(value, ensure_ascii=False) + '\n```'
+  start = time.perf_counter()
+  assert try_parse_json(output) == value
+  extractor = JSONExtractor()
+  for chunk in random_chunks(output, random.Random(1)):
+    extractor.feed(chunk)
+  assert extractor.finish() == value
+  assert time.perf_counter() - start < 10
@@ -0,0 +1,66 @@
+import re
+import random
+import pytest
+from base.aho_corasick import AhoCorasick
+from base.utils import str_in_text
+from base.utils import mentions_in_text
+from entities.location_tags import LocationTags
+
+# accented and unaccented spellings, names inside other names, names that only match across a
+# space or punctuation once normalized, regex metacharacters and an empty name
+NAMES = [
+  'Mérida', 'merida', 'MÉRIDA', 'San Pedro', 'Pedro', 'San Pedro Garza García', 'García', 'Garza',
+  'Oaxaca de Juárez', 'Juárez', 'Ciudad Juárez', 'Nuevo León', 'León', 'Leon.', 'Sanpedro', 'an P',
+  'aa', 'a', 'aba', 'Ñuu Savi', 'St. Louis', 'St Louis', 'Zoé (centro)', 'a.*b', '',
+]
+SEPARATORS = [' ', '  ', ', ', '. ', ':', ';', '\n', '\t', '', '-', '(', ')', '*']
+
+def random_text(rand: random.Random) -> str:
+  """ Names, pieces of names and separators, the names often run into each other """
+  parts = []
+  for _ in range(rand.randint(0, 12)):
+    name = rand.choice(NAMES)
+    kind = rand.random()
+    if kind < 0.5:
+      parts.append(name)
+    elif kind < 0.7:
+      start = rand.randint(0, len(name))
+      parts.append(name[start:rand.randint(start, len(name))])
+    elif kind < 0.85:
+      parts.append(name.upper() if rand.random() < 0.5 else name.lower())
+    else:
+      parts.append(''.join(rand.choice('aábeéiñnoóu PGL') for _ in range(rand.randint(1, 6))))
+    parts.append(rand.choice(SEPARATORS))
+  return ''.join(parts)
+
+@pytest.mark.parametrize('seed', range(4))
+def test_mentions_match_str_in_text(seed):
+  rand = random.Random(seed)
+  for _ in range(1000):
+    names = rand.sample(NAMES, rand.randint(1, len(NAMES)))
+    text = random_text(rand)
+    assert mentions_in_text(names, text) == [str_in_text(name, text) for name in names], (names, text)
+
+@pytest.mark.parametrize('text, counts', [
+  ('aaaa', { 'aa': 2, 'a': 4 }),
+  ('ababa', { 'aba': 1, 'a': 3 }),
+  ('', { 'a': 0, '': 1 }),
+  ('xyz', { '': 4, 'xyz': 1, 'yz': 1, 'zz': 0 }),
+  ('a.*b a.*b', { 'a.*b': 2, '.': 2 }),
+])
+def test_counts_non_overlapping(text, counts):
+  patterns = list(counts)
+  assert AhoCorasick(patterns).counts(text) == [counts[pattern] for pattern in patterns]
+  assert [len(re.findall(re.escape(pattern), text)) for pattern in patterns] == list(counts.values())
+
+def test_with_text_matches_str_in_text():
+  rand = random.Random(7)
+  for _ in range(500):
+    tags = [{ rand.choice(['city', 'state', 'town']): name } for name in rand.sample(NAMES[:-1], rand.randint(1, 8))]
+    location_tags = LocationTags(tags)
+    for text in [rand.choice(NAMES), random_text(rand)]:
+      expected = []
+      for tag in tags:
+        if str_in_text(' '.join(tag.values()), text) > 0:
+          expected += tag
+      assert location_tags.with_text(text) == expected, (tags, text)
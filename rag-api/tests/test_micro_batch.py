@@ -0,0 +1,22 @@
+import pytest
+from base.micro_batch import MicroBatcher
+
+def test_results_in_order():
+  batcher = MicroBatcher(lambda items: [item * 2 for item in items], max_batch_size=4)
+  try:
+    futures = batcher.submit_many(list(range(10)))
+    assert [future.result(timeout=5) for future in futures] == [item * 2 for item in range(10)]
+  finally:
+    batcher.close()
+
+def test_missing_results_fail_every_item():
+  # one result short, the last caller used to wait forever
+  batcher = MicroBatcher(lambda items: items[:-1], max_batch_size=4, max_wait=0.05)
+  try:
+    futures = batcher.submit_many([1, 2, 3])
+    for future in futures:
+      with pytest.raises(ValueError):
+        future.result(timeout=5)
+    assert batcher.stats()['errors'] >= 1
+  finally:
+    batcher.close()
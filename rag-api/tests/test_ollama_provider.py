@@ -0,0 +1,61 @@
+import socket
+import asyncio
+import pytest
+from providers import ollama_provider
+from stubs.ollama_stub import answer
+from stubs.ollama_stub import tokens
+from stubs.ollama_stub import start_stub
+
+PROMPT = 'Devuelve un JSON con la llave "pais" del país mencionado en ```Lluvias en Mérida, Yucatán```'
+
+def free_port() -> int:
+  with socket.socket() as sock:
+    sock.bind(('127.0.0.1', 0))
+    return sock.getsockname()[1]
+
+def with_stub(monkeypatch, token_latency: float, test):
+  """ Runs test(stub) with the provider pointing to an Ollama stub """
+  port = free_port()
+  monkeypatch.setattr(ollama_provider, 'OLLAMA_HOST', '127.0.0.1')
+  monkeypatch.setattr(ollama_provider, 'OLLAMA_PORT', str(port))
+  async def run():
+    stub, runner = await start_stub(port, token_latency)
+    try:
+      return await test(stub)
+    finally:
+      await runner.cleanup()
+  return asyncio.run(run())
+
+def test_generate_streams_whole_answer(monkeypatch):
+  async def test(stub):
+    return await ollama_provider.generate(PROMPT)
+  assert with_stub(monkeypatch, 0, test) == answer(PROMPT)
+
+def test_generate_json_stops_early(monkeypatch):
+  async def test(stub):
+    value = await ollama_provider.generate_json(PROMPT)
+    # let the stub notice the disconnection
+    await asyncio.sleep(0.1)
+    return value, stub.calls
+  value, calls = with_stub(monkeypatch, 0.005, test)
+  assert value == { 'pais': 'México' }
+  assert calls['generate'] == 1
+  assert calls['disconnected'] == 1
+  assert calls['tokens'] < len(tokens(answer(PROMPT))) / 2
+
+def test_generate_timeout(monkeypatch):
+  async def test(stub):
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    with pytest.raises(asyncio.TimeoutError):
+      await ollama_provider.generate(PROMPT, timeout=0.2)
+    return loop.time() - start
+  # the whole answer takes seconds to stream
+  assert with_stub(monkeypatch, 0.05, test) < 1
+
+def test_generate_read_timeout(monkeypatch):
+  monkeypatch.setattr(ollama_provider, 'OLLAMA_READ_TIMEOUT', 0.1)
+  async def test(stub):
+    with pytest.raises(asyncio.TimeoutError):
+      await ollama_provider.generate(PROMPT)
+  with_stub(monkeypatch, 0.3, test)
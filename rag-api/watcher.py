@@ -12,7 +12,7 @@ observer = None
 
 def run():
     log("Starting process...")
-    subprocess.run(["poetry", "run", "python", "index.py"])
+    subprocess.run(["poetry", "run", "python", "server.py"])
 
 @debounce(1)
 def spawn_thread():